@@ -22,6 +22,105 @@ load_dotenv(BASE_DIR / ".env")
 
 OPENCAGE_API_KEY = os.environ.get("OPENCAGE_API_KEY")
 
+# Geocode cache (see home/geocoding.py), TTLs in seconds
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30
+GEOCODE_NEGATIVE_TTL = 60 * 60 * 24
+GEOCODE_MEMORY_CACHE_SIZE = 1024
+
+# Tried in order; local backends first, remote ones only on a miss.
+# Drop OpenCageGeocoder for tests / air-gapped installs.
+GEOCODER_BACKENDS = [
+    "home.gazetteer.GazetteerGeocoder",
+    "home.geocoding.OpenCageGeocoder",
+]
+GAZETTEER_PATH = os.path.join(BASE_DIR, "home/data/gazetteer.tsv")
+
+# OpenCage HTTP client (home/geocoder_client.py). Timeouts are (connect,
+# read) seconds; the breaker fails fast for COOLDOWN seconds after
+# THRESHOLD failed lookups in a row.
+GEOCODER_MAX_IN_FLIGHT = 8
+GEOCODER_QUEUE_TIMEOUT = 1.0
+GEOCODER_TIMEOUT = (2.0, 5.0)
+GEOCODER_RETRIES = 2
+GEOCODER_BREAKER_THRESHOLD = 5
+GEOCODER_BREAKER_COOLDOWN = 30.0
+
+# When True, add_pin / edit_pin don't wait on remote geocoding: the pin is
+# saved as pending (HTTP 202) and `manage.py geocode_worker` fills it in.
+GEOCODE_DEFERRED = False
+
+# Bulk pin import (home/pin_import.py): rows per bulk_create transaction,
+# threads geocoding the places the gazetteer doesn't know, and the most
+# rows the upload API takes in one request (`manage.py import_pins` has no
+# limit). The API queues unknown places for `manage.py geocode_worker`
+# instead of geocoding them in the request.
+PIN_IMPORT_CHUNK_SIZE = 1000
+PIN_IMPORT_GEOCODE_WORKERS = 8
+PIN_IMPORT_MAX_ROWS = 5_000
+
+# Deepest geohash level kept in PinCluster (6 ≈ 1.2 km x 0.6 km cells)
+PIN_CLUSTER_MAX_LEVEL = 6
+
+# Seconds a cached friend graph (home/friend_graph.py) may live. Friendship
+# writes invalidate it; the TTL only matters when CACHES is per-process.
+FRIEND_GRAPH_CACHE_TTL = 300
+
+# Rendered my_pins / user_pins pages (home/response_cache.py). Entries are
+# keyed by a per-user data version that pin writes replace; the old entries
+# just wait to be evicted. Give the alias its own size-bounded backend so
+# they can't push out the geocode and friend caches. The versions live in
+# "default": with per-process LocMemCache a write only reaches its own
+# worker, so other workers may serve pages up to RESPONSE_CACHE_TTL old.
+# Use a shared backend (Redis, Memcached) when that matters.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 2000, "CULL_FREQUENCY": 4},
+    },
+}
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_TTL = 60 * 10
+
+# How friends_pins is built (see home/feed.py): "read" queries friends' pins
+# per request, "write" keeps a FeedEntry table filled as pins are added.
+# After switching to "write", run `manage.py rebuild_feed` once.
+FRIENDS_FEED_STRATEGY = "read"
+
+# Per-request SQL instrumentation (home/instrumentation.py)
+SQL_INSTRUMENTATION = True
+SQL_DUPLICATE_THRESHOLD = 5     # warn when one query shape repeats more often
+SQL_LOG_SAMPLE_RATE = 0.01      # share of requests that log a summary line
+# Max queries per url name (session + user lookups included). Over budget
+# logs a warning, or raises QueryBudgetExceeded when STRICT (tests).
+SQL_QUERY_BUDGETS = {
+    "my_pins": 5,
+    "user_pins": 6,
+    "friends_pins": 5,
+    "friend_list": 4,
+    "my_photos": 4,
+    "get_pin": 4,
+    "react_to_pin": 8,
+    "reactions_batch": 3,
+    "search_location": 5,
+    "pin_clusters": 4,
+    "pin_tile": 6,
+}
+SQL_QUERY_BUDGETS_STRICT = False
+
+# Resized WebP/JPEG copies of uploaded pin images (home/thumbnails.py)
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2       # render processes; 0 renders in the request
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"home": {"handlers": ["console"], "level": "INFO"}},
+}
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -49,6 +148,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'home.instrumentation.SQLInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,6 +170,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'home.textures.globe_textures',
             ],
         },
     },
@@ -124,6 +226,7 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'home/static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Auth redirects
 LOGIN_URL = "/"
@@ -139,4 +242,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Uploads are stored once per distinct content, under hash-derived names
+# (home/storage.py). Static files are served by WhiteNoise under hashed
+# names with gzip (and brotli, when installed) variants made by
+# collectstatic; hashed files are sent as immutable.
+STORAGES = {
+    "default": {"BACKEND": "home.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Media serving (home/media_serving.py). Blobs are cached forever; this is
+# for older, mutable names. MEDIA_ACCEL = "nginx" sends X-Accel-Redirect to
+# MEDIA_ACCEL_PREFIX (an `internal` location aliased to MEDIA_ROOT);
+# "sendfile" sends X-Sendfile for Apache/lighttpd.
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+
 AUTH_PROFILE_MODULE = "home.Profile"
@@ -4,24 +4,31 @@ URL configuration for HelloWorld project.
 The `urlpatterns` list routes URLs to views. For more information please see:
     https://docs.djangoproject.com/en/5.2/topics/http/urls/
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
-from home.views import popularity_dashboard  # ⬅️ import the dashboard view
+from home import media_serving
+from home.views import popularity_dashboard, geocode_stats  # ⬅️ import the dashboard view
 
 
 urlpatterns = [
     # Custom admin analytics dashboard
     path("admin/popularity/", popularity_dashboard, name="admin_popularity"),
+    path("admin/geocode-stats/", geocode_stats, name="admin_geocode_stats"),
 
     # Default Django admin
     path("admin/", admin.site.urls),
 
+    # Uploads: ranges, ETags, cache headers, optional proxy offload
+    re_path(
+        r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")),
+        media_serving.serve,
+        name="media",
+    ),
+
     # Public site URLs
     path("", include("home.urls")),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
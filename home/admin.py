@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import reverse
 from django.shortcuts import redirect
 
-from .models import Pin, Reaction, Friendship
+from .models import Pin, Reaction, Friendship, GeocodeCacheEntry
 
 
 @admin.register(Pin)
@@ -43,3 +43,10 @@ class PopularityAdmin(admin.ModelAdmin):
 
     def changelist_view(self, request, extra_context=None):
         return redirect(reverse("admin_popularity"))
+
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("query", "found", "latitude", "longitude", "expires_at")
+    list_filter = ("found",)
+    search_fields = ("query",)
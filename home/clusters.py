@@ -0,0 +1,178 @@
+# home/clusters.py
+# Multi-level pin clusters for the globe. Every pin with coordinates counts
+# towards one PinCluster per level (its geohash prefix of that length), so a
+# pin write touches MAX_LEVEL rows, and a read for any zoom level is a range
+# scan over precomputed rows instead of shipping every pin to the client.
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import spatial
+from .models import Pin, PinCluster
+
+MAX_LEVEL = getattr(settings, "PIN_CLUSTER_MAX_LEVEL", 6)
+SAMPLE_SIZE = 5
+
+
+def _cells(geohash):
+    return [geohash[:level] for level in range(1, MAX_LEVEL + 1)]
+
+
+# ------------------------------------------------------
+# INCREMENTAL MAINTENANCE
+# ------------------------------------------------------
+
+def _locked(user_id, cells):
+    return {
+        c.cell: c
+        for c in PinCluster.objects.select_for_update().filter(user_id=user_id, cell__in=cells)
+    }
+
+
+def _add_to(rows, pin_id, lat, lon):
+    for c in rows:
+        c.count = F("count") + 1
+        c.lat_sum = F("lat_sum") + lat
+        c.lon_sum = F("lon_sum") + lon
+        if len(c.sample_ids) < SAMPLE_SIZE and pin_id not in c.sample_ids:
+            c.sample_ids = [*c.sample_ids, pin_id]
+    if rows:
+        PinCluster.objects.bulk_update(rows, ["count", "lat_sum", "lon_sum", "sample_ids"])
+
+
+def add_pin(user_id, pin_id, geohash, lat, lon):
+    if not geohash:
+        return
+
+    cells = _cells(geohash)
+    with transaction.atomic():
+        existing = _locked(user_id, cells)
+        _add_to(list(existing.values()), pin_id, lat, lon)
+
+        missing = [
+            PinCluster(
+                user_id=user_id, level=len(cell), cell=cell,
+                count=1, lat_sum=lat, lon_sum=lon, sample_ids=[pin_id],
+            )
+            for cell in cells if cell not in existing
+        ]
+        if missing:
+            try:
+                with transaction.atomic():
+                    PinCluster.objects.bulk_create(missing)
+            except IntegrityError:
+                # A concurrent writer created some of them first; add to theirs
+                taken = _locked(user_id, [c.cell for c in missing])
+                _add_to(list(taken.values()), pin_id, lat, lon)
+                for c in missing:
+                    if c.cell not in taken:
+                        c.save()
+
+
+def remove_pin(user_id, pin_id, geohash, lat, lon):
+    if not geohash:
+        return
+
+    cells = _cells(geohash)
+    with transaction.atomic():
+        rows = list(PinCluster.objects.select_for_update().filter(user_id=user_id, cell__in=cells))
+        if not rows:
+            return
+
+        refill = []
+        for c in rows:
+            c.count = F("count") - 1
+            c.lat_sum = F("lat_sum") - lat
+            c.lon_sum = F("lon_sum") - lon
+            if pin_id in c.sample_ids:
+                c.sample_ids = [i for i in c.sample_ids if i != pin_id]
+                if not c.sample_ids:
+                    refill.append(c)
+        PinCluster.objects.bulk_update(rows, ["count", "lat_sum", "lon_sum", "sample_ids"])
+        PinCluster.objects.filter(user_id=user_id, cell__in=cells, count__lte=0).delete()
+
+        # Last representative went away; pick new ones from the index
+        for c in refill:
+            ids = list(
+                Pin.objects.filter(spatial.cell_filter([c.cell]), user_id=user_id)
+                .exclude(id=pin_id)
+                .values_list("id", flat=True)[:SAMPLE_SIZE]
+            )
+            if ids:
+                PinCluster.objects.filter(pk=c.pk).update(sample_ids=ids)
+
+
+def rebuild_for_user(user_id):
+    """Recomputes every cluster row for one user from their pins."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0, []])
+    pins = Pin.objects.filter(user_id=user_id).exclude(geohash="").values_list(
+        "id", "geohash", "latitude", "longitude"
+    )
+    for pin_id, geohash, lat, lon in pins.iterator(chunk_size=2000):
+        for cell in _cells(geohash):
+            t = totals[cell]
+            t[0] += 1
+            t[1] += lat
+            t[2] += lon
+            if len(t[3]) < SAMPLE_SIZE:
+                t[3].append(pin_id)
+
+    with transaction.atomic():
+        PinCluster.objects.filter(user_id=user_id).delete()
+        PinCluster.objects.bulk_create(
+            [
+                PinCluster(
+                    user_id=user_id, level=len(cell), cell=cell,
+                    count=count, lat_sum=lat_sum, lon_sum=lon_sum, sample_ids=samples,
+                )
+                for cell, (count, lat_sum, lon_sum, samples) in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+# ------------------------------------------------------
+# READS
+# ------------------------------------------------------
+
+def clusters_for(user_ids, level, bbox=None):
+    """
+    Clusters at `level` for the given users, merged per cell (so friends'
+    pins in the same cell come back as one cluster). bbox is
+    (min_lat, max_lat, min_lon, max_lon) in spatial.bounding_box() form.
+    """
+    level = max(1, min(level, MAX_LEVEL))
+    qs = PinCluster.objects.filter(user_id__in=user_ids, level=level)
+
+    if bbox is not None:
+        cells = spatial.bbox_cells(*bbox, max_cells=32, max_precision=level)
+        if cells:
+            qs = qs.filter(spatial.cell_filter(cells, field="cell"))
+
+    merged = {}
+    for cell, count, lat_sum, lon_sum, samples in qs.values_list(
+        "cell", "count", "lat_sum", "lon_sum", "sample_ids"
+    ):
+        m = merged.get(cell)
+        if m is None:
+            merged[cell] = [count, lat_sum, lon_sum, list(samples)]
+        else:
+            m[0] += count
+            m[1] += lat_sum
+            m[2] += lon_sum
+            m[3].extend(samples[: SAMPLE_SIZE - len(m[3])])
+
+    return [
+        {
+            "cell": cell,
+            "count": count,
+            "lat": lat_sum / count,
+            "lon": lon_sum / count,
+            "pinIds": samples,
+        }
+        for cell, (count, lat_sum, lon_sum, samples) in sorted(merged.items())
+    ]
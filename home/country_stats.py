@@ -0,0 +1,82 @@
+# home/country_stats.py
+# Per-country pin / reaction totals (CountryStats) for the popularity
+# dashboard, so it reads a few hundred rows instead of GROUP BY-ing Pin and
+# Reaction on every page view.
+#
+# Counters move with F() expressions in the writer's transaction, from the
+# Pin / Reaction signals (home/signals.py) and from bulk paths that skip
+# them (pin_import). `manage.py rebuild_country_stats` recounts from
+# scratch, or with --verify only reports drift.
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import CountryStats, Pin, PinReactionStats, Reaction
+from .reactions import EMOJIS
+
+
+def key(country):
+    # null and "" are both "Unknown" on the dashboard
+    return country or ""
+
+
+def adjust(country, pins=0, reactions=0):
+    """Adds pins / reactions (either may be negative) to one country's row."""
+    if not (pins or reactions):
+        return
+    country = key(country)
+    changes = {}
+    if pins:
+        changes["pin_count"] = F("pin_count") + pins
+    if reactions:
+        changes["reaction_count"] = F("reaction_count") + reactions
+    if CountryStats.objects.filter(country=country).update(**changes):
+        return
+
+    # First pin for this country; a concurrent first pin may win the insert
+    try:
+        with transaction.atomic():
+            CountryStats.objects.create(
+                country=country, pin_count=max(pins, 0), reaction_count=max(reactions, 0),
+            )
+    except IntegrityError:
+        CountryStats.objects.filter(country=country).update(**changes)
+
+
+def add_pins(countries):
+    """adjust() for a batch of new pins (bulk imports): one call per country."""
+    for country, count in Counter(key(c) for c in countries).items():
+        adjust(country, pins=count)
+
+
+def reaction_total(pin_id):
+    """All reactions on a pin, from its PinReactionStats row."""
+    row = PinReactionStats.objects.filter(pk=pin_id).values_list(*EMOJIS).first()
+    return sum(row) if row else 0
+
+
+def actual():
+    """{country: (pin_count, reaction_count)} counted from Pin and Reaction."""
+    totals = {}
+    for country, n in Pin.objects.values_list("country").annotate(n=Count("id")).order_by():
+        pins, reactions = totals.get(key(country), (0, 0))
+        totals[key(country)] = (pins + n, reactions)
+    for country, n in Reaction.objects.values_list("pin__country").annotate(n=Count("id")).order_by():
+        pins, reactions = totals.get(key(country), (0, 0))
+        totals[key(country)] = (pins, reactions + n)
+    return totals
+
+
+# ------------------------------------------------------
+# READS
+# ------------------------------------------------------
+
+def dashboard(top=10):
+    """(total pins, top countries by pins, countries by reactions) for the dashboard."""
+    rows = list(CountryStats.objects.exclude(pin_count=0, reaction_count=0))
+    total_pins = sum(r.pin_count for r in rows)
+    by_pins = sorted((r for r in rows if r.pin_count), key=lambda r: (-r.pin_count, r.country))[:top]
+    by_reactions = sorted((r for r in rows if r.reaction_count), key=lambda r: (-r.reaction_count, r.country))
+    return total_pins, by_pins, by_reactions
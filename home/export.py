@@ -0,0 +1,121 @@
+# home/export.py
+# Streams all of a user's pins (with their photos) as NDJSON or as a GeoJSON
+# FeatureCollection, for /api/export/pins.ndjson and .geojson.
+#
+# Pins are read oldest first with QuerySet.iterator(chunk_size=CHUNK_SIZE)
+# over the serialization.project() rows, and photos are attached one query
+# per chunk. Output is written chunk by chunk, so memory use doesn't depend
+# on how many pins the account has.
+#
+# Resuming: every record carries a "cursor". Passing the last one seen as
+# ?since= continues after it. ?since= also takes an ISO date or datetime
+# (pins created at or after it). When the client sends Accept-Encoding:
+# gzip, the stream is gzipped on the fly.
+
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import compress_sequence
+
+from . import pagination, serialization
+from .models import Pin
+
+CHUNK_SIZE = 500
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "geojson": "application/geo+json",
+}
+
+
+class InvalidSince(ValueError):
+    pass
+
+
+def since_filter(value):
+    """Q() for pins after ?since= (a cursor, or an ISO date / datetime)."""
+    try:
+        created_at, pk, _ = pagination.decode_cursor(value)
+    except pagination.InvalidCursor:
+        pass
+    else:
+        return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+
+    moment = parse_datetime(value)
+    if moment is None and (day := parse_date(value)) is not None:
+        moment = datetime(day.year, day.month, day.day)
+    if moment is None:
+        raise InvalidSince(f"'since' must be a cursor or an ISO date, not {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return Q(created_at__gte=moment)
+
+
+def _chunks(user, since):
+    queryset = Pin.objects.filter(user=user)
+    if since is not None:
+        queryset = queryset.filter(since_filter(since))
+    rows = serialization.project(queryset.order_by("created_at", "id"))
+
+    chunk = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield serialization.attach_photos(chunk)
+            chunk = []
+    if chunk:
+        yield serialization.attach_photos(chunk)
+
+
+def _records(request, user, since):
+    urls = serialization.MediaUrls(request)
+    for chunk in _chunks(user, since):
+        records = []
+        for row in chunk:
+            record = serialization.pin_payload(row, urls, user.id)
+            record["createdAt"] = row["created_at"]
+            record["cursor"] = pagination.encode_cursor(row["created_at"], row["id"])
+            records.append(record)
+        yield records
+
+
+def ndjson(request, user, since=None):
+    for records in _records(request, user, since):
+        yield b"".join(serialization.dumps(r) + b"\n" for r in records)
+
+
+def geojson(request, user, since=None):
+    yield b'{"type":"FeatureCollection","features":[\n'
+    first = True
+    for records in _records(request, user, since):
+        features = []
+        for record in records:
+            lat, lon = record.pop("lat"), record.pop("lon")
+            features.append(serialization.dumps({
+                "type": "Feature",
+                "id": record["id"],
+                # Pins still waiting on the geocoder have no position yet
+                "geometry": {"type": "Point", "coordinates": [lon, lat]} if lat is not None else None,
+                "properties": record,
+            }))
+        yield (b"" if first else b",\n") + b",\n".join(features)
+        first = False
+    yield b"\n]}\n"
+
+
+def response(request, user, fmt, since=None):
+    """StreamingHttpResponse for `fmt` ("ndjson" / "geojson"), gzipped if accepted."""
+    if since is not None:
+        since_filter(since)  # InvalidSince now, not halfway through the stream
+    stream = (ndjson if fmt == "ndjson" else geojson)(request, user, since)
+
+    headers = {"Content-Disposition": f'attachment; filename="pins.{fmt}"'}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        stream = compress_sequence(stream)
+        headers["Content-Encoding"] = "gzip"
+    result = StreamingHttpResponse(stream, content_type=FORMATS[fmt], headers=headers)
+    patch_vary_headers(result, ["Accept-Encoding"])
+    return result
@@ -0,0 +1,122 @@
+# home/feed.py
+# The two ways friends_pins can build a page, picked by FRIENDS_FEED_STRATEGY:
+#
+#   "read"  (default) fan-out-on-read: query Pin for every friend on each
+#           request. Nothing to maintain, but cost grows with friends x pins.
+#   "write" fan-out-on-write: a new pin is copied into each friend's
+#           FeedEntry rows, so a page is one range scan on
+#           (owner, created_at). Accepting a friendship backfills both feeds;
+#           removing it prunes them.
+#
+# Turning "write" on for an existing database needs `manage.py rebuild_feed`
+# once (and again after any stretch spent on "read").
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import friend_graph, pagination, serialization
+from .models import FeedEntry, Friendship, Pin
+
+BATCH_SIZE = 1000
+
+
+def fanout_enabled():
+    return getattr(settings, "FRIENDS_FEED_STRATEGY", "read") == "write"
+
+
+def _accepted_friend_ids(user_id):
+    # Straight from the DB: the friend graph cache can lag another worker's accept
+    return [
+        b if a == user_id else a
+        for a, b in Friendship.objects.filter(
+            Q(from_user_id=user_id) | Q(to_user_id=user_id), status="accepted"
+        ).values_list("from_user_id", "to_user_id")
+    ]
+
+
+# ------------------------------------------------------
+# WRITES (only called when fanout_enabled())
+# ------------------------------------------------------
+
+def add_pin(pin):
+    """Copies a new pin into every friend's feed."""
+    add_pins(pin.user_id, [pin])
+
+
+def add_pins(author_id, pins):
+    """add_pin() for a batch of new pins by one author (bulk imports)."""
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(owner_id=owner_id, pin_id=pin.id, author_id=author_id, created_at=pin.created_at)
+            for owner_id in _accepted_friend_ids(author_id)
+            for pin in pins
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _backfill(owner_id, author_id):
+    batch = []
+    pins = Pin.objects.filter(user_id=author_id).values_list("id", "created_at")
+    for pin_id, created_at in pins.iterator(chunk_size=BATCH_SIZE):
+        batch.append(FeedEntry(owner_id=owner_id, pin_id=pin_id, author_id=author_id, created_at=created_at))
+        if len(batch) == BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def link(user_a, user_b):
+    """A friendship was accepted: each side's pins go into the other's feed."""
+    with transaction.atomic():
+        _backfill(user_a, user_b)
+        _backfill(user_b, user_a)
+
+
+def unlink(user_a, user_b):
+    FeedEntry.objects.filter(
+        Q(owner_id=user_a, author_id=user_b) | Q(owner_id=user_b, author_id=user_a)
+    ).delete()
+
+
+def rebuild_for_user(owner_id):
+    with transaction.atomic():
+        FeedEntry.objects.filter(owner_id=owner_id).delete()
+        for friend_id in _accepted_friend_ids(owner_id):
+            _backfill(owner_id, friend_id)
+    return FeedEntry.objects.filter(owner_id=owner_id).count()
+
+
+# ------------------------------------------------------
+# READS
+# ------------------------------------------------------
+
+def read_page(user, cursor, limit):
+    """Fan-out-on-read: one page of pins straight from the friends' pins."""
+    pins = Pin.objects.filter(
+        user_id__in=friend_graph.friend_ids(user.id), latitude__isnull=False
+    )
+    return pagination.paginate(serialization.project(pins), cursor, limit)
+
+
+def write_page(user, cursor, limit):
+    """Fan-out-on-write: one page of the user's FeedEntry rows."""
+    # The entry's own id/created_at drive the cursor; pin__* is the payload
+    entries = FeedEntry.objects.filter(owner=user, pin__latitude__isnull=False).values(
+        "id", "created_at", *(f"pin__{f}" for f in serialization.PIN_FIELDS)
+    )
+    entries, next_cursor = pagination.paginate(entries, cursor, limit)
+    return serialization.unprefix(entries, "pin__"), next_cursor
+
+
+def page(user, cursor, limit):
+    """
+    (pin rows, next_cursor) for friends_pins under the configured strategy;
+    rows as serialization.project() returns them, without photos.
+    """
+    if fanout_enabled():
+        return write_page(user, cursor, limit)
+    return read_page(user, cursor, limit)
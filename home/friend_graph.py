@@ -0,0 +1,65 @@
+# home/friend_graph.py
+# Per-user friend adjacency kept in Django's cache. One entry per user holds
+# their accepted friends and pending requests in both directions, so
+# "whose pins can I see" and the friend list are a cache read instead of an
+# OR query over Friendship. Friendship signals drop the entries for both
+# sides once the write commits; the TTL bounds staleness if a process misses
+# an invalidation (e.g. a per-process LocMemCache).
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Friendship
+
+CACHE_TTL = getattr(settings, "FRIEND_GRAPH_CACHE_TTL", 300)
+KEY = "friend-graph:v1:{}"
+
+# pk is the Friendship id; user_id is the other side
+Edge = namedtuple("Edge", "pk user_id created_at")
+
+
+class Graph(namedtuple("Graph", "friends incoming outgoing")):
+    """Each field is a list of Edge, newest first."""
+
+    @property
+    def friend_ids(self):
+        return [e.user_id for e in self.friends]
+
+
+def _build(user_id):
+    friends, incoming, outgoing = [], [], []
+    rows = (
+        Friendship.objects.filter(Q(from_user_id=user_id) | Q(to_user_id=user_id))
+        .order_by("-created_at", "-id")
+        .values_list("id", "from_user_id", "to_user_id", "status", "created_at")
+    )
+    for pk, from_id, to_id, status, created_at in rows:
+        other = to_id if from_id == user_id else from_id
+        edge = Edge(pk, other, created_at)
+        if status == "accepted":
+            friends.append(edge)
+        elif from_id == user_id:
+            outgoing.append(edge)
+        else:
+            incoming.append(edge)
+    return Graph(friends, incoming, outgoing)
+
+
+def get(user_id):
+    key = KEY.format(user_id)
+    graph = cache.get(key)
+    if graph is None:
+        graph = _build(user_id)
+        cache.set(key, graph, CACHE_TTL)
+    return graph
+
+
+def friend_ids(user_id):
+    return get(user_id).friend_ids
+
+
+def invalidate(*user_ids):
+    cache.delete_many([KEY.format(uid) for uid in user_ids])
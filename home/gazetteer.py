@@ -0,0 +1,224 @@
+# home/gazetteer.py
+# Offline geocoding from the bundled GeoNames-style gazetteer
+# (home/data/gazetteer.tsv). The whole file is loaded once per process into
+# flat arrays, with a sorted name index that answers exact and prefix lookups
+# via bisect. Resolving "city, state, country" is a few dict/bisect probes.
+
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+from .geocoding import BaseGeocoder
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.tsv"
+
+PLACE, ADMIN1, COUNTRY = 0, 1, 2
+_KINDS = {"P": PLACE}
+_ADMIN_CODES = {"ADM1": ADMIN1, "PCLI": COUNTRY}
+
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+
+
+def fold(text):
+    """'São  Paulo' -> 'sao paulo', 'St. Louis' -> 'st louis'."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_ALNUM_RE.sub(" ", text.casefold()).strip()
+
+
+class Gazetteer:
+    """
+    Row data lives in parallel arrays (one slot per gazetteer row); country and
+    admin1 codes are interned into self.codes and stored as small ints.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.population = array("q")
+        self.kind = array("B")
+        self.country = array("H")
+        self.admin1 = array("H")
+        self.codes = [""]
+        self._code_ids = {"": 0}
+
+        # Sorted (folded name, row) pairs, split into two arrays for bisect
+        self._keys = []
+        self._rows = array("I")
+
+        # folded country name/code -> country code id
+        self._countries = {}
+        # folded admin1 name/code -> set of (country id, admin1 id)
+        self._admin1 = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    # ------------------------------------------------------
+    # LOADING
+    # ------------------------------------------------------
+
+    @classmethod
+    def from_file(cls, path):
+        gaz = cls()
+        index = []
+
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                (name, ascii_name, alternates, lat, lon,
+                 feature_class, feature_code, cc, admin1, population) = cols[:10]
+
+                kind = _KINDS.get(feature_class, _ADMIN_CODES.get(feature_code))
+                if kind is None:
+                    continue
+
+                row = len(gaz.names)
+                cc_id = gaz._intern(cc)
+                admin1_id = gaz._intern(admin1)
+
+                gaz.names.append(name)
+                gaz.lat.append(float(lat))
+                gaz.lon.append(float(lon))
+                gaz.population.append(int(population or 0))
+                gaz.kind.append(kind)
+                gaz.country.append(cc_id)
+                gaz.admin1.append(admin1_id)
+
+                keys = {fold(n) for n in [name, ascii_name, *alternates.split(",")] if n}
+                keys.discard("")
+                for key in keys:
+                    index.append((key, row))
+
+                if kind == COUNTRY:
+                    for key in keys | {fold(cc)}:
+                        gaz._countries[key] = cc_id
+                elif kind == ADMIN1:
+                    for key in keys | {fold(admin1)}:
+                        gaz._admin1.setdefault(key, set()).add((cc_id, admin1_id))
+
+        index.sort()
+        gaz._keys = [key for key, _ in index]
+        gaz._rows = array("I", (row for _, row in index))
+        return gaz
+
+    def _intern(self, code):
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            code_id = self._code_ids[code] = len(self.codes)
+            self.codes.append(code)
+        return code_id
+
+    # ------------------------------------------------------
+    # INDEX LOOKUPS
+    # ------------------------------------------------------
+
+    def _exact(self, key):
+        i = bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i] == key:
+            yield self._rows[i]
+            i += 1
+
+    def suggest(self, prefix, limit=10):
+        """Rows whose name starts with prefix, most populous first."""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+
+        rows = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            rows.add(self._rows[i])
+            i += 1
+        return sorted(rows, key=lambda r: -self.population[r])[:limit]
+
+    # ------------------------------------------------------
+    # RESOLUTION
+    # ------------------------------------------------------
+
+    def _pick(self, place, cc_id=None, admin1=None):
+        best = None
+        for row in self._exact(place):
+            if cc_id is not None and self.country[row] != cc_id:
+                continue
+            if admin1 is not None and (self.country[row], self.admin1[row]) not in admin1:
+                continue
+            # Prefer real places over regions, then the bigger one
+            rank = (self.kind[row] == PLACE, self.population[row])
+            if best is None or rank > best[0]:
+                best = (rank, row)
+        return best[1] if best else None
+
+    def resolve(self, parts):
+        """
+        Resolves ["city", "state", "country"]-style parts (any may be missing)
+        to a row index, or None. Every qualifier must match something;
+        otherwise we'd rather miss and let the remote provider answer.
+        """
+        parts = [p for p in (fold(p) for p in parts if p) if p]
+        if not parts:
+            return None
+
+        place, qualifiers = parts[0], parts[1:]
+        if not qualifiers:
+            return self._pick(place)
+        if len(qualifiers) > 2:
+            return None
+
+        # "Paris, France" / "Austin, Texas, USA"
+        cc_id = self._countries.get(qualifiers[-1])
+        if cc_id is not None:
+            admin1 = None
+            if len(qualifiers) == 2:
+                admin1 = self._admin1.get(qualifiers[0])
+            if len(qualifiers) == 1 or admin1:
+                row = self._pick(place, cc_id=cc_id, admin1=admin1)
+                if row is not None:
+                    return row
+
+        # "Austin, TX" (where TX might also read as a country code, e.g. CA)
+        if len(qualifiers) == 1:
+            admin1 = self._admin1.get(qualifiers[0])
+            if admin1:
+                return self._pick(place, admin1=admin1)
+        return None
+
+    def coordinates(self, row):
+        return self.lat[row], self.lon[row]
+
+
+# ------------------------------------------------------
+# PROCESS-WIDE INSTANCE
+# ------------------------------------------------------
+
+_gazetteer = None
+_load_lock = threading.Lock()
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _load_lock:
+            if _gazetteer is None:
+                path = getattr(settings, "GAZETTEER_PATH", None) or DEFAULT_PATH
+                _gazetteer = Gazetteer.from_file(path)
+    return _gazetteer
+
+
+class GazetteerGeocoder(BaseGeocoder):
+    local = True
+
+    def geocode(self, query):
+        gaz = get_gazetteer()
+        row = gaz.resolve(query.split(","))
+        if row is None:
+            return None
+        return gaz.coordinates(row)
@@ -0,0 +1,137 @@
+# home/geocode_queue.py
+# DB-backed queue for deferred geocoding (settings.GEOCODE_DEFERRED).
+# add_pin / edit_pin call enqueue(), the import API enqueue_new();
+# `manage.py geocode_worker` drains it.
+#
+# Jobs are claimed by a conditional UPDATE on locked_until, so several workers
+# can run side by side on any database backend without double-processing.
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import response_cache, tiles
+from .geocoding import geocode_location
+from .models import GeocodeJob, Pin
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, "GEOCODE_JOB_MAX_ATTEMPTS", 5)
+LEASE_SECONDS = getattr(settings, "GEOCODE_JOB_LEASE", 60)
+RETRY_BASE_SECONDS = 30
+
+
+def enqueue(pin):
+    """Marks the pin pending and (re)schedules its job to run now."""
+    with transaction.atomic():
+        Pin.objects.filter(pk=pin.pk).update(geocode_status="pending")
+        pin.geocode_status = "pending"
+        # Updates skip the Pin signals; the status shows in lists and tiles
+        tiles.bump(pin.user_id, pin.latitude, pin.longitude)
+        response_cache.bump_on_commit(pin.user_id)
+        GeocodeJob.objects.update_or_create(
+            pin=pin,
+            defaults={
+                "attempts": 0,
+                "run_after": timezone.now(),
+                "locked_until": None,
+                "last_error": "",
+            },
+        )
+
+
+def enqueue_new(pins):
+    """
+    enqueue() for freshly bulk-created pending pins (pin_import): they have
+    no job yet, and the caller refreshes tiles and the response cache.
+    """
+    now = timezone.now()
+    GeocodeJob.objects.bulk_create([GeocodeJob(pin=pin, run_after=now) for pin in pins])
+
+
+def claim_jobs(limit):
+    """Leases up to `limit` due jobs to the calling worker."""
+    now = timezone.now()
+    due = (
+        GeocodeJob.objects
+        .filter(run_after__lte=now)
+        .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+        .order_by("run_after")
+        .values_list("id", "locked_until")[:limit]
+    )
+
+    claimed = []
+    lease = now + timedelta(seconds=LEASE_SECONDS)
+    for job_id, locked_until in due:
+        # Only wins if nobody else re-leased the row since we read it
+        rows = GeocodeJob.objects.filter(id=job_id)
+        if locked_until is None:
+            rows = rows.filter(locked_until__isnull=True)
+        else:
+            rows = rows.filter(locked_until=locked_until)
+        if rows.update(locked_until=lease):
+            claimed.append(job_id)
+
+    return list(GeocodeJob.objects.filter(id__in=claimed).select_related("pin"))
+
+
+def _finish(job, place):
+    """
+    Deletes the job and returns its pin, locked, if the job is still the one
+    this worker leased and the pin still has `place`; else None and nothing
+    changes. enqueue() resets the job (locked_until) when the pin is edited,
+    and the edit itself may commit first: either way the result we hold
+    belongs to the old location.
+    """
+    pin = Pin.objects.select_for_update().filter(pk=job.pin_id).first()
+    if pin is None or (pin.city, pin.state, pin.country) != place:
+        return None
+    deleted, _ = GeocodeJob.objects.filter(pk=job.pk, locked_until=job.locked_until).delete()
+    return pin if deleted else None
+
+
+def process_job(job):
+    """
+    Geocodes the job's pin. Returns the pin's new geocode_status, "retry"
+    when the provider couldn't be reached, or "stale" when the pin was
+    edited meanwhile (its new job is left for the next run).
+    """
+    place = (job.pin.city, job.pin.state, job.pin.country)
+    geo = geocode_location(*place)
+
+    if geo:
+        with transaction.atomic():
+            pin = _finish(job, place)
+            if pin is None:
+                return "stale"
+            pin.latitude, pin.longitude = geo
+            pin.geocode_status = "resolved"
+            pin.save(update_fields=["latitude", "longitude", "geocode_status"])
+        return "resolved"
+
+    job.attempts += 1
+    if job.attempts >= MAX_ATTEMPTS:
+        with transaction.atomic():
+            pin = _finish(job, place)
+            if pin is None:
+                return "stale"
+            Pin.objects.filter(pk=pin.pk).update(geocode_status="failed")
+            tiles.bump(pin.user_id, pin.latitude, pin.longitude)
+            response_cache.bump_on_commit(pin.user_id)
+        logger.warning("Giving up geocoding pin %s after %s attempts", pin.pk, job.attempts)
+        return "failed"
+
+    # geocode_location doesn't tell "not found" from "provider down", so
+    # both back off and retry until MAX_ATTEMPTS. Conditional on the lease,
+    # so a job enqueue() reset meanwhile keeps its fresh schedule.
+    updated = GeocodeJob.objects.filter(pk=job.pk, locked_until=job.locked_until).update(
+        attempts=job.attempts,
+        run_after=timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)),
+        locked_until=None,
+        last_error="Location not found",
+    )
+    return "retry" if updated else "stale"
@@ -0,0 +1,260 @@
+# home/geocoder_client.py
+# The HTTP side of remote geocoding (OpenCageGeocoder in home/geocoding.py).
+#
+#   - One pooled requests.Session per process: keep-alive connections, so a
+#     lookup doesn't pay DNS + TCP + TLS setup every time.
+#   - At most GEOCODER_MAX_IN_FLIGHT requests at once. Callers wait up to
+#     GEOCODER_QUEUE_TIMEOUT for a slot, then get Saturated instead of
+#     piling more threads onto a slow provider.
+#   - Connection errors, timeouts, 429 and 5xx are retried
+#     GEOCODER_RETRIES times with full-jitter exponential backoff.
+#   - A circuit breaker opens after GEOCODER_BREAKER_THRESHOLD failed calls
+#     in a row: for GEOCODER_BREAKER_COOLDOWN seconds calls fail at once
+#     with CircuitOpen, then a single trial call decides whether it closes.
+#   - metrics(): counters, breaker state and p50/p95/p99 latency of recent
+#     attempts (shown by the geocode_stats view).
+#
+# Every failure is a GeocoderUnavailable subclass; the caller treats it as
+# "can't answer right now" (None, never cached). That includes 401/402/403
+# (bad or disabled key, quota used up: AccessDenied) and any other
+# unexpected 4xx. Only 400/422 mean the provider is up and refused this
+# particular query: RequestRejected, which is neither retried nor counted
+# towards the breaker.
+
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+ACCESS_STATUSES = {401, 402, 403}
+QUERY_ERROR_STATUSES = {400, 422}
+LATENCY_WINDOW = 1024
+
+
+class GeocoderUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(GeocoderUnavailable):
+    pass
+
+
+class Saturated(GeocoderUnavailable):
+    pass
+
+
+class UpstreamError(GeocoderUnavailable):
+    pass
+
+
+class AccessDenied(GeocoderUnavailable):
+    """401/402/403: our key or quota, so no query can succeed right now."""
+
+
+class RequestRejected(Exception):
+    """400/422: the query's fault, not the provider's."""
+
+
+# ------------------------------------------------------
+# CIRCUIT BREAKER
+# ------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    closed -> (threshold failures in a row) -> open -> (cooldown) ->
+    half-open: one trial call; success closes, failure opens again.
+    """
+
+    def __init__(self, threshold, cooldown, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """True if a call may go out now (claims the trial when half-open)."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = self.clock()
+            self._trial = False
+
+
+# ------------------------------------------------------
+# CLIENT
+# ------------------------------------------------------
+
+class GeocoderClient:
+
+    def __init__(
+        self, max_in_flight=8, queue_timeout=1.0, timeout=(2.0, 5.0), retries=2,
+        backoff_base=0.2, backoff_cap=2.0, breaker_threshold=5, breaker_cooldown=30.0,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = dict.fromkeys((
+            "calls", "attempts", "retries", "failures", "rejected", "short_circuited", "saturated", "in_flight",
+        ), 0)
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _backoff(self, attempt, response=None):
+        # Full jitter: uniform(0, base * 2^attempt), capped; a 429's
+        # Retry-After (seconds form) is a floor, within the cap
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_cap))
+        return delay
+
+    def get_json(self, url, params=None):
+        """
+        GET url and decode JSON. Raises a GeocoderUnavailable subclass when
+        the provider can't be reached or keeps failing.
+        """
+        self._incr("calls")
+        # Slot first: while the breaker is open nothing holds one, so the
+        # fast fail below stays fast
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._incr("saturated")
+            raise Saturated("too many geocoder requests in flight")
+        if not self.breaker.allow():
+            self._slots.release()
+            self._incr("short_circuited")
+            raise CircuitOpen("geocoder circuit open")
+
+        self._incr("in_flight")
+        try:
+            data = self._attempts(url, params)
+        except GeocoderUnavailable:
+            self._incr("failures")
+            self.breaker.failure()
+            raise
+        except RequestRejected:
+            # The provider answered, so this is a success as far as the
+            # breaker is concerned (and ends a half-open trial)
+            self._incr("rejected")
+            self.breaker.success()
+            raise
+        finally:
+            self._incr("in_flight", -1)
+            self._slots.release()
+        self.breaker.success()
+        return data
+
+    def _attempts(self, url, params):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._incr("retries")
+            self._incr("attempts")
+            response = None
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                error = None if response.status_code not in RETRY_STATUSES else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+
+            if error is None:
+                # 4xx other than 429: retrying won't help
+                status = response.status_code
+                if status in QUERY_ERROR_STATUSES:
+                    raise RequestRejected(f"HTTP {status}")
+                if status in ACCESS_STATUSES:
+                    raise AccessDenied(f"HTTP {status}")
+                if status >= 400:
+                    raise UpstreamError(f"HTTP {status}")
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise UpstreamError(f"Invalid JSON: {e}") from e
+
+            if attempt < self.retries:
+                time.sleep(self._backoff(attempt, response))
+        raise UpstreamError(error)
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._counts)
+            latencies = sorted(self._latencies)
+        data["breaker"] = self.breaker.state
+        for label, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            data[label] = (
+                round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000, 1)
+                if latencies else None
+            )
+        return data
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, configured from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeocoderClient(
+                    max_in_flight=getattr(settings, "GEOCODER_MAX_IN_FLIGHT", 8),
+                    queue_timeout=getattr(settings, "GEOCODER_QUEUE_TIMEOUT", 1.0),
+                    timeout=getattr(settings, "GEOCODER_TIMEOUT", (2.0, 5.0)),
+                    retries=getattr(settings, "GEOCODER_RETRIES", 2),
+                    breaker_threshold=getattr(settings, "GEOCODER_BREAKER_THRESHOLD", 5),
+                    breaker_cooldown=getattr(settings, "GEOCODER_BREAKER_COOLDOWN", 30.0),
+                )
+    return _client
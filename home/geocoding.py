@@ -0,0 +1,402 @@
+# home/geocoding.py
+# Turns "city, state, country" into coordinates for add_pin / edit_pin /
+# search_location. Backends are listed in settings.GEOCODER_BACKENDS:
+#   - local backends (the bundled gazetteer) answer straight from memory
+#   - remote backends (OpenCage) sit behind two cache tiers:
+#       1) a small in-process LRU (per worker)
+#       2) the GeocodeCacheEntry table (shared by every worker)
+# Identical lookups that miss both tiers at the same time are coalesced so only
+# one upstream request is made.
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import geocoder_client
+from .models import GeocodeCacheEntry
+
+logger = logging.getLogger(__name__)
+
+OPENCAGE_URL = getattr(settings, "OPENCAGE_URL", "https://api.opencagedata.com/geocode/v1/json")
+
+CACHE_TTL = getattr(settings, "GEOCODE_CACHE_TTL", 60 * 60 * 24 * 30)
+NEGATIVE_TTL = getattr(settings, "GEOCODE_NEGATIVE_TTL", 60 * 60 * 24)
+MEMORY_CACHE_SIZE = getattr(settings, "GEOCODE_MEMORY_CACHE_SIZE", 1024)
+GEOCODER_BACKENDS = getattr(settings, "GEOCODER_BACKENDS", [
+    "home.gazetteer.GazetteerGeocoder",
+    "home.geocoding.OpenCageGeocoder",
+])
+
+# Sentinel stored for "provider answered, but found nothing"
+NOT_FOUND = "not-found"
+
+
+# ------------------------------------------------------
+# QUERY NORMALIZATION
+# ------------------------------------------------------
+
+_PUNCT_RE = re.compile(r"[^\w\s,-]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(city, state, country):
+    """
+    Builds the cache key for a lookup, e.g.
+    ("  Paris ", None, "FRANCE") -> "paris, france".
+    Returns "" when nothing usable was given.
+    """
+    parts = []
+    for part in (city, state, country):
+        if not part:
+            continue
+        part = unicodedata.normalize("NFKC", str(part)).casefold()
+        part = _PUNCT_RE.sub(" ", part)
+        part = _SPACE_RE.sub(" ", part).strip(" ,")
+        if part:
+            parts.append(part)
+    return ", ".join(parts)
+
+
+# ------------------------------------------------------
+# IN-PROCESS LRU TIER
+# ------------------------------------------------------
+
+class LRUCache:
+    """Thread-safe LRU of key -> (value, expires_at monotonic seconds)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ------------------------------------------------------
+# SINGLE-FLIGHT COALESCING
+# ------------------------------------------------------
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    Runs fn once per key at a time. Callers that arrive while a call for the
+    same key is in flight wait for it and share its result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True for waiting callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            return call.result, True
+
+        try:
+            call.result = fn()
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+# ------------------------------------------------------
+# STATS
+# ------------------------------------------------------
+
+class GeocodeStats:
+    FIELDS = (
+        "local_hits",
+        "memory_hits",
+        "db_hits",
+        "negative_hits",
+        "coalesced",
+        "misses",
+        "upstream_calls",
+        "upstream_errors",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for name in self.FIELDS:
+                setattr(self, name, 0)
+            self.upstream_seconds = 0.0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_upstream(self, seconds, ok):
+        with self._lock:
+            self.upstream_calls += 1
+            self.upstream_seconds += seconds
+            if not ok:
+                self.upstream_errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = {name: getattr(self, name) for name in self.FIELDS}
+            upstream_seconds = self.upstream_seconds
+
+        hits = data["memory_hits"] + data["db_hits"] + data["coalesced"]
+        lookups = hits + data["misses"] + data["local_hits"]
+        avg = upstream_seconds / data["upstream_calls"] if data["upstream_calls"] else 0.0
+
+        data.update({
+            "hits": hits,
+            "lookups": lookups,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "upstream_seconds": round(upstream_seconds, 3),
+            "avg_upstream_ms": round(avg * 1000, 1),
+            # Every hit is one OpenCage request (and its latency) we didn't pay for
+            "saved_upstream_calls": hits + data["local_hits"],
+            "saved_seconds_estimate": round((hits + data["local_hits"]) * avg, 3),
+            "memory_entries": len(_memory),
+        })
+        return data
+
+
+_memory = LRUCache(MEMORY_CACHE_SIZE)
+_inflight = SingleFlight()
+stats = GeocodeStats()
+
+
+# ------------------------------------------------------
+# BACKENDS
+# ------------------------------------------------------
+
+class BaseGeocoder:
+    """
+    geocode(query) gets the normalized "city, state, country" key and returns
+    (lat, lon), NOT_FOUND, or None when it can't answer right now (None is
+    never cached, so the next request retries).
+    """
+    # Local backends answer from memory and are tried before the caches
+    local = False
+
+    def geocode(self, query):
+        raise NotImplementedError
+
+
+class OpenCageGeocoder(BaseGeocoder):
+    """Over the pooled, rate-limited client in home/geocoder_client.py."""
+
+    def __init__(self, client=None, url=None):
+        self.client = client or geocoder_client.get_client()
+        self.url = url or OPENCAGE_URL
+
+    def geocode(self, query):
+        params = {
+            "q": query,
+            "key": settings.OPENCAGE_API_KEY,
+            "limit": 1,
+        }
+
+        start = time.perf_counter()
+        try:
+            data = self.client.get_json(self.url, params=params)
+        except geocoder_client.GeocoderUnavailable as e:
+            stats.record_upstream(time.perf_counter() - start, ok=False)
+            logger.warning("Geocode request failed for %r: %s", query, e)
+            return None
+        except geocoder_client.RequestRejected as e:
+            stats.record_upstream(time.perf_counter() - start, ok=True)
+            logger.warning("Geocode request rejected for %r: %s", query, e)
+            return NOT_FOUND
+        stats.record_upstream(time.perf_counter() - start, ok=True)
+
+        if not data.get("results"):
+            return NOT_FOUND
+
+        g = data["results"][0]["geometry"]
+        return float(g["lat"]), float(g["lng"])
+
+
+_backends = None
+
+
+def get_backends():
+    """Returns (local, remote) lists of backend instances."""
+    global _backends
+    if _backends is None:
+        instances = [import_string(path)() for path in GEOCODER_BACKENDS]
+        _backends = (
+            [b for b in instances if b.local],
+            [b for b in instances if not b.local],
+        )
+    return _backends
+
+
+def _fetch_remote(key, backends):
+    result = NOT_FOUND
+    for backend in backends:
+        value = backend.geocode(key)
+        if value is None:
+            result = None
+        elif value != NOT_FOUND:
+            return value
+    return result
+
+
+# ------------------------------------------------------
+# DB TIER
+# ------------------------------------------------------
+
+def _db_get(key):
+    entry = (
+        GeocodeCacheEntry.objects
+        .filter(query=key, expires_at__gt=timezone.now())
+        .only("latitude", "longitude", "found", "expires_at")
+        .first()
+    )
+    if entry is None:
+        return None, 0
+
+    remaining = (entry.expires_at - timezone.now()).total_seconds()
+    if not entry.found:
+        return NOT_FOUND, remaining
+    return (entry.latitude, entry.longitude), remaining
+
+
+def _db_set(key, value, ttl):
+    found = value != NOT_FOUND
+    GeocodeCacheEntry.objects.update_or_create(
+        query=key,
+        defaults={
+            "found": found,
+            "latitude": value[0] if found else None,
+            "longitude": value[1] if found else None,
+            "expires_at": timezone.now() + timedelta(seconds=ttl),
+        },
+    )
+
+
+# ------------------------------------------------------
+# PUBLIC API
+# ------------------------------------------------------
+
+def _as_result(value):
+    return None if value == NOT_FOUND else value
+
+
+def _lookup_and_store(key, backends):
+    stats.incr("misses")
+    value = _fetch_remote(key, backends)
+    if value is None:
+        return None
+
+    ttl = CACHE_TTL if value != NOT_FOUND else NEGATIVE_TTL
+    _db_set(key, value, ttl)
+    _memory.set(key, value, ttl)
+    return value
+
+
+def geocode_local(city, state, country):
+    """
+    Answers from local backends only (no cache, no network); None on a miss.
+    Lets deferred add_pin skip the queue when the gazetteer knows the place.
+    """
+    key = normalize_query(city, state, country)
+    if not key:
+        return None
+
+    for backend in get_backends()[0]:
+        value = backend.geocode(key)
+        if value is not None and value != NOT_FOUND:
+            stats.incr("local_hits")
+            return value
+    return None
+
+
+def geocode_location(city, state, country):
+    """
+    Returns (lat, lon) for the given place, or None if it can't be found.
+    """
+    key = normalize_query(city, state, country)
+    if not key:
+        return None
+
+    local, remote = get_backends()
+    for backend in local:
+        value = backend.geocode(key)
+        if value is not None and value != NOT_FOUND:
+            stats.incr("local_hits")
+            return value
+
+    if not remote:
+        return None
+
+    value = _memory.get(key)
+    if value is not None:
+        stats.incr("memory_hits")
+        if value == NOT_FOUND:
+            stats.incr("negative_hits")
+        return _as_result(value)
+
+    value, remaining = _db_get(key)
+    if value is not None:
+        stats.incr("db_hits")
+        if value == NOT_FOUND:
+            stats.incr("negative_hits")
+        _memory.set(key, value, remaining)
+        return _as_result(value)
+
+    value, shared = _inflight.do(key, lambda: _lookup_and_store(key, remote))
+    if shared:
+        stats.incr("coalesced")
+    return _as_result(value)
+
+
+def clear_memory_cache():
+    _memory.clear()
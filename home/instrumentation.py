@@ -0,0 +1,153 @@
+# home/instrumentation.py
+# Per-request SQL and timing instrumentation.
+#
+# SQLInstrumentationMiddleware wraps every query run while a request is
+# handled (connection.execute_wrapper) and records count, DB time and a
+# fingerprint of each statement. On the way out it:
+#   - adds a Server-Timing header (db, view, plus any span() a view opened),
+#     so the browser's network panel shows where the time went;
+#   - logs a warning when one fingerprint repeats more than
+#     SQL_DUPLICATE_THRESHOLD times (the usual N+1 signature);
+#   - checks SQL_QUERY_BUDGETS[url_name], raising QueryBudgetExceeded when
+#     SQL_QUERY_BUDGETS_STRICT is on (tests) and logging otherwise;
+#   - logs a one-line summary for SQL_LOG_SAMPLE_RATE of requests.
+
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-list lengths folded, so repeats compare equal."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _LIST_RE.sub("(...)", sql)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.fingerprints = Counter()
+        self.spans = []
+        self.fields = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n > threshold]
+
+
+# ------------------------------------------------------
+# HELPERS FOR VIEWS
+# ------------------------------------------------------
+
+@contextmanager
+def span(request, name):
+    """Times a block of a view; shows up as its own Server-Timing entry."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = getattr(request, "sql_stats", None)
+        if stats is not None:
+            stats.spans.append((name, time.perf_counter() - start))
+
+
+def annotate(request, **fields):
+    """Adds fields to this request's sampled summary log line."""
+    stats = getattr(request, "sql_stats", None)
+    if stats is not None:
+        stats.fields.update(fields)
+
+
+# ------------------------------------------------------
+# MIDDLEWARE
+# ------------------------------------------------------
+
+class SQLInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "SQL_INSTRUMENTATION", True):
+            return self.get_response(request)
+
+        stats = request.sql_stats = RequestStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(stats))
+            response = self.get_response(request)
+        view_seconds = time.perf_counter() - start
+
+        response["Server-Timing"] = self._server_timing(stats, view_seconds)
+        self._report(request, response, stats, view_seconds)
+        return response
+
+    @staticmethod
+    def _server_timing(stats, view_seconds):
+        parts = [
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f"view;dur={view_seconds * 1000:.1f}",
+        ]
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats.spans]
+        return ", ".join(parts)
+
+    def _report(self, request, response, stats, view_seconds):
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match else None
+        summary = {
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "queries": stats.queries,
+            "db_ms": round(stats.db_seconds * 1000, 1),
+            "view_ms": round(view_seconds * 1000, 1),
+            **stats.fields,
+        }
+
+        threshold = getattr(settings, "SQL_DUPLICATE_THRESHOLD", 5)
+        for fp, count in stats.repeated(threshold):
+            logger.warning(
+                "Query repeated %s times in %s: %s", count, view or request.path, fp,
+                extra={**summary, "fingerprint": fp, "repeats": count},
+            )
+
+        budget = getattr(settings, "SQL_QUERY_BUDGETS", {}).get(view)
+        if budget is not None and stats.queries > budget:
+            message = f"{view} ran {stats.queries} queries (budget {budget})"
+            if getattr(settings, "SQL_QUERY_BUDGETS_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={**summary, "budget": budget})
+
+        if random.random() < getattr(settings, "SQL_LOG_SAMPLE_RATE", 0.01):
+            logger.info(
+                "%s %s %s queries=%s db=%.1fms view=%.1fms",
+                request.method, request.path, response.status_code,
+                stats.queries, summary["db_ms"], summary["view_ms"],
+                extra=summary,
+            )
@@ -0,0 +1,258 @@
+# home/management/commands/bench_api.py
+# Drives the main endpoints through the Django test client as a sample of
+# seeded users (see seed_scale) and reports latency percentiles, query
+# counts and peak Python memory per endpoint as JSON. Writes (reactions,
+# sessions) happen inside a transaction that is rolled back, so write
+# endpoints' query counts include the SAVEPOINTs their atomic blocks become.
+# Endpoints behind the response cache are timed cold (the target user's data
+# version is bumped before each request) and again warm, reported as "warm".
+#   python manage.py bench_api --requests 200 --output bench/$(git rev-parse --short HEAD).json
+#   python manage.py bench_api --compare bench/abc1234.json
+
+import json
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+
+from home import friend_graph, response_cache
+from home.management.commands.seed_scale import CITIES
+from home.models import Friendship, Pin, PinPhoto, Reaction
+
+User = get_user_model()
+
+# name -> (method, url(ctx), body(ctx) or None)
+ENDPOINTS = {
+    "my_pins": ("get", lambda c: "/api/my-pins/", None),
+    "user_pins": ("get", lambda c: f"/api/pins/{c.friend.username}/", None),
+    "friends_pins": ("get", lambda c: "/api/friends-pins/", None),
+    "friend_list": ("get", lambda c: "/api/friends/", None),
+    "get_pin": ("get", lambda c: f"/api/pin/{c.pin_id()}/", None),
+    "react_to_pin_get": ("get", lambda c: f"/api/react/{c.pin_id()}/", None),
+    "react_to_pin_post": (
+        "post", lambda c: f"/api/react/{c.pin_id()}/",
+        lambda c: {"emoji": c.rng.choice(["like", "love", "laugh", "wow"])},
+    ),
+    "reactions_batch": (
+        "get", lambda c: "/api/reactions/batch/?ids=" + ",".join(map(str, c.pin_ids[:100])), None,
+    ),
+    "my_photos": ("get", lambda c: "/api/my-photos/", None),
+    "search_location": (
+        "get", lambda c: "/api/search/?q=" + ", ".join(c.rng.choice(CITIES)), None,
+    ),
+    "pin_clusters": ("get", lambda c: "/api/pin-clusters/?level=3&scope=friends", None),
+    "popularity_dashboard": ("get", lambda c: "/admin/popularity/", None),
+}
+STAFF_ONLY = {"popularity_dashboard"}
+# name -> whose data version keys the cached response (see home/response_cache.py)
+RESPONSE_CACHED = {
+    "my_pins": lambda c: c.user.id,
+    "user_pins": lambda c: c.friend.id,
+}
+
+
+class UserContext:
+    """One benchmark user: a logged-in client plus pins they can look at."""
+
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        self.client = Client()
+        self.client.force_login(user)
+
+        visible = friend_graph.friend_ids(user.id) + [user.id]
+        self.friend = User.objects.filter(id__in=visible[:-1]).order_by("id").first() or user
+        self.pin_ids = list(
+            Pin.objects.filter(user_id__in=visible).order_by("?").values_list("id", flat=True)[:200]
+        ) or list(Pin.objects.order_by("?").values_list("id", flat=True)[:200])
+
+    def pin_id(self):
+        return self.rng.choice(self.pin_ids)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark API endpoints (latency, queries, memory) and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=100, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--memory-requests", type=int, default=5,
+                            help="Extra requests per endpoint run under tracemalloc.")
+        parser.add_argument("--users", type=int, default=20, help="How many seeded users to rotate through.")
+        parser.add_argument("--prefix", default="seed_", help="Username prefix used by seed_scale.")
+        parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS),
+                            help="Only these endpoints (repeatable).")
+        parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+        parser.add_argument("--compare", help="Earlier JSON result to print deltas against.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        names = options["endpoint"] or list(ENDPOINTS)
+
+        users = list(User.objects.filter(username__startswith=options["prefix"]).order_by("id"))
+        if not users:
+            raise CommandError("No seeded users found; run `manage.py seed_scale` first.")
+        users = rng.sample(users, min(options["users"], len(users)))
+
+        # The report has the query counts; skip per-request budget warnings
+        logging.getLogger("home.instrumentation").setLevel(logging.ERROR)
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                staff = User.objects.create(username="__bench_api_staff__", is_staff=True)
+                contexts = [UserContext(u, rng) for u in users]
+                staff_context = UserContext(staff, rng)
+
+                results = {}
+                for name in names:
+                    pool = [staff_context] if name in STAFF_ONLY else contexts
+                    results[name] = self._bench(name, pool, options)
+                    self.stderr.write(
+                        f"{name:>22}: p50 {results[name]['p50_ms']:8.1f} ms  "
+                        f"p95 {results[name]['p95_ms']:8.1f} ms  "
+                        f"queries {results[name]['queries_p50']}"
+                        + (f"  warm p50 {results[name]['warm']['p50_ms']:.1f} ms" if "warm" in results[name] else "")
+                    )
+
+                meta = self._meta(options, len(users))
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        report = {"meta": meta, "endpoints": results}
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload + "\n")
+        else:
+            self.stdout.write(payload)
+
+        if options["compare"]:
+            with open(options["compare"]) as fh:
+                self._compare(json.load(fh), report)
+
+    def _request(self, name, ctx):
+        method, url, body = ENDPOINTS[name]
+        kwargs = {"data": body(ctx), "content_type": "application/json"} if body else {}
+        return getattr(ctx.client, method)(url(ctx), **kwargs)
+
+    def _bench(self, name, pool, options):
+        for i in range(options["warmup"]):
+            self._request(name, pool[i % len(pool)])
+
+        cached = RESPONSE_CACHED.get(name)
+        timings, queries, statuses = [], [], Counter()
+        for i in range(options["requests"]):
+            ctx = pool[i % len(pool)]
+            if cached:
+                # Cold: the warm-up (or the previous round) filled the cache
+                response_cache.bump(cached(ctx))
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = self._request(name, ctx)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses[str(response.status_code)] += 1
+
+        warm = []
+        if cached:
+            for i in range(options["requests"]):
+                start = time.perf_counter()
+                self._request(name, pool[i % len(pool)])
+                warm.append((time.perf_counter() - start) * 1000)
+            warm.sort()
+
+        # Separate pass: tracemalloc slows everything down too much to time under
+        peak = 0
+        tracemalloc.start()
+        try:
+            for i in range(options["memory_requests"]):
+                tracemalloc.reset_peak()
+                self._request(name, pool[i % len(pool)])
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        queries.sort()
+        result = {
+            "requests": len(timings),
+            "mean_ms": round(statistics.mean(timings), 2),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "queries_p50": percentile(queries, 50),
+            "queries_max": queries[-1],
+            "peak_memory_kb": round(peak / 1024, 1),
+            "statuses": dict(statuses),
+        }
+        if warm:
+            result["warm"] = {
+                "p50_ms": round(percentile(warm, 50), 2),
+                "p95_ms": round(percentile(warm, 95), 2),
+            }
+        return result
+
+    @staticmethod
+    def _meta(options, user_count):
+        return {
+            "commit": git_commit(),
+            "timestamp": timezone.now().isoformat(),
+            "python": sys.version.split()[0],
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "users_sampled": user_count,
+            "requests_per_endpoint": options["requests"],
+            "rows": {
+                "users": User.objects.count(),
+                "friendships": Friendship.objects.count(),
+                "pins": Pin.objects.count(),
+                "photos": PinPhoto.objects.count(),
+                "reactions": Reaction.objects.count(),
+            },
+        }
+
+    def _compare(self, before, after):
+        self.stderr.write(f"\nvs {before['meta'].get('commit')} ({before['meta'].get('timestamp')})")
+        for name, new in after["endpoints"].items():
+            old = before["endpoints"].get(name)
+            if not old:
+                continue
+            deltas = [
+                f"{key[:-3]} {old[key]:.1f} -> {new[key]:.1f} ms ({(new[key] - old[key]) / old[key] * 100:+.0f}%)"
+                for key in ("p50_ms", "p95_ms") if old[key]
+            ]
+            deltas.append(f"queries {old['queries_p50']} -> {new['queries_p50']}")
+            self.stderr.write(f"{name:>22}: " + ", ".join(deltas))
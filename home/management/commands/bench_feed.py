@@ -0,0 +1,120 @@
+# home/management/commands/bench_feed.py
+# Compares the two FRIENDS_FEED_STRATEGY options for friends_pins: the
+# per-request friends x pins query ("read") against the FeedEntry scan
+# ("write"), plus what "write" costs when a pin is added. Everything runs
+# inside a transaction that is rolled back:
+#   python manage.py bench_feed --friends 200 --pins-per-friend 500
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from home import feed, friend_graph, pagination
+from home.models import Friendship, Pin
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Benchmark fan-out-on-read vs fan-out-on-write for friends_pins."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--friends", type=int, default=200)
+        parser.add_argument("--pins-per-friend", type=int, default=500)
+        parser.add_argument("--pages", type=int, default=5, help="Pages walked per run.")
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            me, friends = self._seed(options["friends"], options["pins_per_friend"], rng)
+            friend_graph.invalidate(me.id)
+
+            start = time.perf_counter()
+            for friend in friends:
+                feed.link(me.id, friend.id)
+            self.stdout.write(f"Backfilled feeds in {time.perf_counter() - start:.1f}s")
+
+            pages, runs, limit = options["pages"], options["runs"], options["limit"]
+            read = [self._time(self._walk, feed.read_page, me, pages, limit) for _ in range(runs)]
+            write = [self._time(self._walk, feed.write_page, me, pages, limit) for _ in range(runs)]
+
+            # Cost of one add_pin under "write": fan out to every friend of a poster
+            poster = friends[0]
+            for friend in friends[1:]:
+                Friendship.objects.create(from_user=poster, to_user=friend, status="accepted")
+            fanout = []
+            for _ in range(runs):
+                pin = Pin.objects.create(user=poster, latitude=0.0, longitude=0.0, caption="bench")
+                fanout.append(self._time(lambda: feed.add_pin(pin) or [pin]))
+
+            friend_graph.invalidate(me.id, *(f.id for f in friends))
+            transaction.set_rollback(True)
+
+        self._report(f"read, {pages} pages", read)
+        self._report(f"write, {pages} pages", write)
+        self._report("write, add_pin fan-out", fanout)
+
+    def _seed(self, friend_count, pins_per_friend, rng):
+        start = time.perf_counter()
+        me = User.objects.create(username="__bench_feed__")
+        friends = User.objects.bulk_create(
+            [User(username=f"__bench_feed_{i}__") for i in range(friend_count)]
+        )
+        Friendship.objects.bulk_create(
+            [Friendship(from_user=me, to_user=f, status="accepted") for f in friends]
+        )
+
+        now = timezone.now()
+        pins = [
+            Pin(user=friend, latitude=rng.uniform(-85, 85), longitude=rng.uniform(-180, 180), caption="bench")
+            for friend in friends
+            for _ in range(pins_per_friend)
+        ]
+        Pin.objects.bulk_create(pins, batch_size=10_000)
+
+        # auto_now_add stamps every row with ~now; spread them over a year so
+        # paging looks like real data (bulk_update skips auto_now_add)
+        for pin in pins:
+            pin.created_at = now - timedelta(minutes=rng.randrange(525_600))
+        Pin.objects.bulk_update(pins, ["created_at"], batch_size=1000)
+
+        self.stdout.write(
+            f"Seeded {friend_count} friends x {pins_per_friend} pins in {time.perf_counter() - start:.1f}s"
+        )
+        return me, friends
+
+    @staticmethod
+    def _walk(page_fn, user, pages, limit):
+        rows, cursor = [], None
+        for _ in range(pages):
+            pins, token = page_fn(user, cursor, limit)
+            rows.extend((p.id, p.user.username, len(p.photos.all())) for p in pins)
+            if token is None:
+                break
+            cursor = pagination.decode_cursor(token)
+        return rows
+
+    @staticmethod
+    def _time(fn, *args):
+        start = time.perf_counter()
+        rows = fn(*args)
+        return (time.perf_counter() - start) * 1000, len(rows)
+
+    def _report(self, label, runs):
+        ms = sorted(t for t, _ in runs)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        rows = statistics.mean(n for _, n in runs)
+        self.stdout.write(
+            f"{label:>24}: p50 {statistics.median(ms):8.1f} ms  "
+            f"p95 {p95:8.1f} ms  avg rows {rows:8.1f}"
+        )
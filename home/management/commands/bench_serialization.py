@@ -0,0 +1,100 @@
+# home/management/commands/bench_serialization.py
+# Objects/sec for the pin list payload: the old per-view code (Pin
+# instances, select_related + prefetch_related, build_absolute_uri per
+# image, JsonResponse) against home/serialization.py (values() projection,
+# one photo query, prefix-joined URLs, orjson when installed). Both run on
+# the same page of pins; the payloads are checked to agree on the fields
+# the old code produced.
+#   python manage.py bench_serialization --pins 500 --rounds 20
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from home import serialization
+from home.models import Pin
+
+User = get_user_model()
+
+LEGACY_FIELDS = ["id", "lat", "lon", "caption", "imageUrl", "photos", "photoCount", "user"]
+
+
+def legacy(request, queryset):
+    pins = queryset.select_related("user").prefetch_related("photos")
+    data = []
+    for pin in pins:
+        cover = request.build_absolute_uri(pin.image.url) if pin.image else None
+        extra = [request.build_absolute_uri(p.image.url) for p in pin.photos.all()]
+        data.append({
+            "id": pin.id,
+            "lat": pin.latitude,
+            "lon": pin.longitude,
+            "caption": pin.caption or "",
+            "imageUrl": cover,
+            "photos": extra,
+            "photoCount": (1 if cover else 0) + len(extra),
+            "user": pin.user.username,
+            "city": pin.city,
+            "state": pin.state,
+            "country": pin.country,
+            "geocodeStatus": pin.geocode_status,
+        })
+    return JsonResponse({"pins": data}), data
+
+
+def projected(request, queryset):
+    data = serialization.pins_payload(request, serialization.project(queryset))
+    return serialization.json_response({"pins": data}), data
+
+
+class Command(BaseCommand):
+    help = "Compare pin serialization throughput: old view code vs home/serialization.py."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pins", type=int, default=500, help="Pins per round.")
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()  # RequestFactory's host must pass ALLOWED_HOSTS
+        try:
+            self._run(options)
+        finally:
+            teardown_test_environment()
+
+    def _run(self, options):
+        user = User.objects.first()
+        if user is None or not Pin.objects.exists():
+            raise CommandError("No pins to serialize; run `manage.py seed_scale` first.")
+
+        request = RequestFactory().get("/api/my-pins/")
+        request.user = user
+        ids = list(Pin.objects.order_by("-created_at", "-id").values_list("id", flat=True)[: options["pins"]])
+        queryset = Pin.objects.filter(id__in=ids).order_by("-created_at", "-id")
+
+        _, old = legacy(request, queryset)
+        _, new = projected(request, queryset)
+        for a, b in zip(old, new):
+            if any(a[f] != b[f] for f in LEGACY_FIELDS):
+                raise CommandError(f"Payloads differ for pin {a['id']}:\n{a}\n{b}")
+
+        encoder = "orjson" if serialization.orjson else "json"
+        self.stdout.write(f"{len(ids)} pins x {options['rounds']} rounds (encoder: {encoder})")
+        results = {}
+        for name, fn in (("legacy", legacy), ("projected", projected)):
+            timings = []
+            for _ in range(options["rounds"]):
+                start = time.perf_counter()
+                fn(request, queryset)
+                timings.append(time.perf_counter() - start)
+            median = statistics.median(timings)
+            results[name] = len(ids) / median
+            self.stdout.write(f"{name:>10}: {median * 1000:8.1f} ms/page  {results[name]:10.0f} objects/s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"projected is {results['projected'] / results['legacy']:.1f}x the legacy throughput"
+        ))
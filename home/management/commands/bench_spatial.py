@@ -0,0 +1,110 @@
+# home/management/commands/bench_spatial.py
+# Compares search_location's old lat/lon box scan with the geohash index.
+# Everything runs inside a transaction that is rolled back, so the synthetic
+# pins never outlive the benchmark:
+#   python manage.py bench_spatial --pins 1000000
+
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home import spatial
+from home.models import Pin
+
+User = get_user_model()
+
+# Pins cluster around cities in real data; mix clusters with uniform noise
+HOTSPOTS = [
+    (40.71, -74.01), (51.51, -0.13), (48.85, 2.35), (35.69, 139.69),
+    (-33.87, 151.21), (37.77, -122.42), (19.43, -99.13), (-23.55, -46.64),
+    (52.52, 13.41), (1.29, 103.85), (-36.85, 174.76), (64.14, -21.90),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark search_location's spatial query against N synthetic pins."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pins", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--radius", type=float, default=550.0, help="Search radius in km.")
+        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            user = User.objects.create(username="__bench_spatial__")
+            self._seed(user, options["pins"], rng)
+
+            centers = [self._random_point(rng) for _ in range(options["queries"])]
+            radius, limit = options["radius"], options["limit"]
+
+            old = [self._time(self._box_scan, lat, lon) for lat, lon in centers]
+            new = [self._time(self._nearest, lat, lon, radius, limit) for lat, lon in centers]
+
+            transaction.set_rollback(True)
+
+        self._report("box scan (old)", old)
+        self._report("geohash k-nearest", new)
+
+    def _seed(self, user, count, rng):
+        start = time.perf_counter()
+        batch = []
+        for _ in range(count):
+            lat, lon = self._random_point(rng)
+            batch.append(Pin(
+                user=user, latitude=lat, longitude=lon,
+                geohash=spatial.encode(lat, lon), caption="bench",
+            ))
+            if len(batch) == 10_000:
+                Pin.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Pin.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {count} pins in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def _random_point(rng):
+        if rng.random() < 0.7:
+            lat, lon = rng.choice(HOTSPOTS)
+            return (
+                max(-90.0, min(90.0, rng.gauss(lat, 2.0))),
+                (rng.gauss(lon, 2.0) + 180) % 360 - 180,
+            )
+        return rng.uniform(-85, 85), rng.uniform(-180, 180)
+
+    @staticmethod
+    def _box_scan(lat, lon):
+        # The pre-index search_location query, including its per-row user lookup
+        pins = Pin.objects.filter(
+            latitude__gte=lat - 5, latitude__lte=lat + 5,
+            longitude__gte=lon - 5, longitude__lte=lon + 5,
+        )
+        return [(p.id, p.user.username) for p in pins]
+
+    @staticmethod
+    def _nearest(lat, lon, radius, limit):
+        ranked = spatial.nearest(Pin.objects.all(), lat, lon, radius, limit)
+        pins = Pin.objects.select_related("user").in_bulk([pin_id for pin_id, _ in ranked])
+        return [(p.id, p.user.username) for p in pins.values()]
+
+    @staticmethod
+    def _time(fn, *args):
+        start = time.perf_counter()
+        rows = fn(*args)
+        return (time.perf_counter() - start) * 1000, len(rows)
+
+    def _report(self, label, runs):
+        ms = sorted(t for t, _ in runs)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        rows = statistics.mean(n for _, n in runs)
+        self.stdout.write(
+            f"{label:>20}: p50 {statistics.median(ms):8.1f} ms  "
+            f"p95 {p95:8.1f} ms  avg rows {rows:8.1f}"
+        )
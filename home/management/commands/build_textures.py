@@ -0,0 +1,25 @@
+# home/management/commands/build_textures.py
+# Renders the globe texture tiers (home/textures.py) into the app's static
+# directory. Re-run after replacing a source texture, then collectstatic.
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home import textures
+
+
+class Command(BaseCommand):
+    help = "Generate WebP/JPEG resolution tiers of the globe textures."
+
+    def handle(self, *args, **options):
+        static_root = settings.STATICFILES_DIRS[0]
+        for source in textures.SOURCES:
+            original = os.path.getsize(os.path.join(static_root, textures.SOURCE_DIR, source))
+            for path in textures.render_tiers(static_root, source):
+                self.stdout.write(
+                    f"{os.path.relpath(path, static_root)}: {os.path.getsize(path) / 1024:.0f} KB "
+                    f"(source {original / 1024:.0f} KB)"
+                )
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,59 @@
+# home/management/commands/build_thumbnails.py
+# Renders WebP/JPEG variants (home/thumbnails.py) for pin covers and photos
+# that don't have any yet: images uploaded before variants existed, or
+# covers set through the admin. --force redoes all of them, e.g. after
+# IMAGE_VARIANT_WIDTHS changed.
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from home import storage, thumbnails
+from home.models import Pin, PinPhoto
+
+BATCH_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for existing pin images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true",
+                            help="Re-render images that already have variants.")
+
+    def handle(self, *args, **options):
+        covers = Pin.objects.exclude(image="").exclude(image__isnull=True)
+        photos = PinPhoto.objects.all()
+        if not options["force"]:
+            covers = covers.filter(image_variants={})
+            photos = photos.filter(image_variants={})
+
+        for label, qs in (("covers", covers), ("photos", photos)):
+            done = missing = 0
+            batch = []
+            for obj in qs.only("id", "image", "image_variants").order_by("id").iterator():
+                # Seeded rows and deleted uploads point at files that aren't there
+                if not default_storage.exists(obj.image.name):
+                    missing += 1
+                    continue
+                batch.append(obj)
+                if len(batch) == BATCH_SIZE:
+                    done += self._render(qs.model, batch)
+                    batch = []
+            if batch:
+                done += self._render(qs.model, batch)
+            self.stdout.write(f"{label}: {done} rendered, {missing} missing files")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    @staticmethod
+    def _render(model, objs):
+        rendered = 0
+        for obj, variants in zip(objs, thumbnails.build_many([o.image for o in objs])):
+            if variants:
+                # update(), not save(): no signals, no auto fields touched
+                model.objects.filter(pk=obj.pk).update(image_variants=variants)
+                # ... so drop the replaced variants' references here (--force).
+                # Unchanged names were just re-referenced by build_many.
+                storage.release(*storage.variant_names(obj.image_variants))
+                rendered += 1
+        return rendered
@@ -0,0 +1,37 @@
+# home/management/commands/geocode_cache.py
+# Housekeeping for the GeocodeCacheEntry table.
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from home.models import GeocodeCacheEntry
+
+
+class Command(BaseCommand):
+    help = "Show geocode cache size, purge expired entries, or clear the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purge-expired", action="store_true",
+                            help="Delete entries whose TTL has passed.")
+        parser.add_argument("--clear", action="store_true",
+                            help="Delete every cached entry.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        entries = GeocodeCacheEntry.objects
+
+        if options["clear"]:
+            deleted, _ = entries.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached geocodes."))
+            return
+
+        if options["purge_expired"]:
+            deleted, _ = entries.filter(expires_at__lte=now).delete()
+            self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired geocodes."))
+
+        live = entries.filter(expires_at__gt=now)
+        self.stdout.write(
+            f"{live.filter(found=True).count()} positive, "
+            f"{live.filter(found=False).count()} negative, "
+            f"{entries.filter(expires_at__lte=now).count()} expired"
+        )
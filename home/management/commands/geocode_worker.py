@@ -0,0 +1,35 @@
+# home/management/commands/geocode_worker.py
+# Background process that fills in coordinates for pins created with
+# GEOCODE_DEFERRED = True. Run one (or several) alongside the web workers:
+#   python manage.py geocode_worker
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.geocode_queue import claim_jobs, process_job
+
+
+class Command(BaseCommand):
+    help = "Resolve coordinates for pins waiting in the geocode queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Drain the queue once and exit instead of polling.")
+        parser.add_argument("--batch", type=int, default=20,
+                            help="Jobs to claim per poll.")
+        parser.add_argument("--sleep", type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = claim_jobs(options["batch"])
+
+            for job in jobs:
+                outcome = process_job(job)
+                self.stdout.write(f"Pin {job.pin_id}: {outcome}")
+
+            if not jobs:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
@@ -0,0 +1,64 @@
+# home/management/commands/import_pins.py
+# Bulk-imports pins for one user from a CSV or GeoJSON file (see
+# home/pin_import.py for the columns / properties read).
+#   python manage.py import_pins alice trips.csv
+#   python manage.py import_pins alice trips.geojson --workers 16
+
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from home import pin_import
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import pins for a user from a CSV or GeoJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=pin_import.FORMATS,
+                            help="Defaults to the file extension.")
+        parser.add_argument("--workers", type=int, default=pin_import.GEOCODE_WORKERS,
+                            help="Threads geocoding places the gazetteer doesn't know.")
+        parser.add_argument("--chunk-size", type=int, default=pin_import.CHUNK_SIZE,
+                            help="Pins per bulk_create transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+
+        path = options["path"]
+        fmt = options["format"] or pin_import.guess_format(path)
+        if fmt is None:
+            raise CommandError("Can't tell the format from the file name; pass --format")
+
+        fh = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        try:
+            summary = pin_import.import_pins(
+                user, fh, fmt, workers=options["workers"], chunk_size=options["chunk_size"],
+                progress=self._progress,
+            )
+        except pin_import.ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+        for error in summary["errors"]:
+            self.stderr.write(f"  row {error['row']}: {error['error']}")
+        if summary["invalid"] + summary["unresolved"] > len(summary["errors"]):
+            self.stderr.write("  ...")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} of {summary['rows']} rows in {summary['seconds']}s "
+            f"({summary['places']} distinct places geocoded, {summary['invalid']} invalid, "
+            f"{summary['unresolved']} unresolved)"
+        ))
+
+    def _progress(self, stage, done, total):
+        self.stdout.write(f"{stage}: {done}" + (f"/{total}" if total else ""))
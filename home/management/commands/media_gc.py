@@ -0,0 +1,129 @@
+# home/management/commands/media_gc.py
+# Finds files under MEDIA_ROOT that no row points at any more: photos
+# removed through edit_pin, pins deleted by cascade, replaced avatars,
+# variants of images that are gone. Reports them (count, bytes) and, with
+# --delete, removes them. Files younger than --min-age are left alone, since
+# an upload is written to disk before its row is committed, and so are
+# blobs whose MediaBlob row still counts references.
+#   python manage.py media_gc                  # dry run
+#   python manage.py media_gc --delete -v 2    # delete, listing each file
+#   python manage.py media_gc --backfill       # also render missing variants
+#
+# Referenced names are streamed from the DB in chunks into one set of
+# strings; the media tree is then walked with os.scandir, so neither side
+# is loaded as model instances.
+
+import io
+import os
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from home import storage
+from home.models import MediaBlob, Pin, PinPhoto, Profile
+
+CHUNK_SIZE = 2000
+
+
+def referenced_names():
+    """Every media-relative path the DB refers to."""
+    names = set()
+    for model, field in ((Pin, "image"), (PinPhoto, "image"), (Profile, "avatar_upload")):
+        for name in (
+            model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            .values_list(field, flat=True).iterator(chunk_size=CHUNK_SIZE)
+        ):
+            names.add(os.path.normpath(name))
+
+    for model in (Pin, PinPhoto):
+        for variants in (
+            model.objects.exclude(image_variants={})
+            .values_list("image_variants", flat=True).iterator(chunk_size=CHUNK_SIZE)
+        ):
+            for formats in variants.values():
+                names.update(os.path.normpath(name) for name in formats.values())
+
+    # Counted by an upload whose row may not be committed (or visible) yet
+    for name in (
+        MediaBlob.objects.filter(refs__gt=0)
+        .values_list("name", flat=True).iterator(chunk_size=CHUNK_SIZE)
+    ):
+        names.add(os.path.normpath(name))
+    return names
+
+
+def walk(root):
+    """(relative path, DirEntry) for every file below root."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root), entry
+
+
+class Command(BaseCommand):
+    help = "Report (and optionally delete) media files no longer referenced by the DB."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Delete orphaned files.")
+        parser.add_argument("--min-age", type=float, default=24.0,
+                            help="Hours; younger files are never treated as orphans.")
+        parser.add_argument("--backfill", action="store_true",
+                            help="Afterwards, render variants for images missing them (build_thumbnails).")
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        if not os.path.isdir(root):
+            raise CommandError(f"MEDIA_ROOT {root!r} is not a directory.")
+
+        start = time.perf_counter()
+        refs = referenced_names()
+        self.stdout.write(f"{len(refs)} referenced files ({time.perf_counter() - start:.1f}s)")
+
+        cutoff = time.time() - options["min_age"] * 3600
+        scanned = orphans = orphan_bytes = young = 0
+        for name, entry in walk(root):
+            scanned += 1
+            if name in refs:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                young += 1
+                continue
+
+            orphans += 1
+            orphan_bytes += stat.st_size
+            if options["verbosity"] >= 2:
+                self.stdout.write(name)
+            if options["delete"]:
+                os.remove(entry.path)
+                if storage.is_blob(name):
+                    MediaBlob.objects.filter(name=name).delete()
+
+        if options["delete"]:
+            self._prune_empty_dirs(root)
+
+        verb = "Deleted" if options["delete"] else "Found"
+        self.stdout.write(
+            f"Scanned {scanned} files; {young} too new to judge. "
+            f"{verb} {orphans} orphans ({orphan_bytes / 1024 / 1024:.1f} MB)."
+        )
+
+        if options["backfill"]:
+            out = io.StringIO()
+            call_command("build_thumbnails", stdout=out)
+            self.stdout.write(out.getvalue().rstrip())
+
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    @staticmethod
+    def _prune_empty_dirs(root):
+        # Deepest first, so emptied shard directories (blobs/ab/cd/) go too
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if dirpath != root and not os.listdir(dirpath):
+                os.rmdir(dirpath)
@@ -0,0 +1,35 @@
+# home/management/commands/rebuild_clusters.py
+# Recomputes PinCluster rows from scratch. Needed once after deploying
+# clustering, and after any write path that bypasses Pin signals
+# (bulk_create, queryset.update).
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from home import clusters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the globe's pin clusters for every user (or just --user)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this username.")
+
+    def handle(self, *args, **options):
+        # Users with stale clusters but no pins left get emptied too
+        users = User.objects.filter(
+            Q(pins__isnull=False) | Q(pin_clusters__isnull=False)
+        ).distinct()
+        if options["user"]:
+            users = User.objects.filter(username=options["user"])
+
+        total = 0
+        for user_id, username in users.values_list("id", "username").iterator():
+            cells = clusters.rebuild_for_user(user_id)
+            total += cells
+            self.stdout.write(f"{username}: {cells} cells")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} cluster cells."))
@@ -0,0 +1,51 @@
+# home/management/commands/rebuild_country_stats.py
+# Recounts CountryStats from Pin and Reaction: the backfill after bulk
+# loads that skip signals (seed_scale, raw SQL), and a drift check.
+#   python manage.py rebuild_country_stats
+#   python manage.py rebuild_country_stats --verify   # exit 1 on drift
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from home import country_stats
+from home.models import CountryStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or with --verify, check) the per-country dashboard counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Report drift without writing; fail if there is any.")
+
+    def handle(self, *args, **options):
+        want = country_stats.actual()
+        have = {
+            country: (pins, reactions)
+            for country, pins, reactions in CountryStats.objects.values_list(
+                "country", "pin_count", "reaction_count"
+            )
+        }
+
+        drifted = 0
+        for country in sorted(want.keys() | have.keys()):
+            expected, stored = want.get(country, (0, 0)), have.get(country, (0, 0))
+            if expected != stored:
+                drifted += 1
+                self.stdout.write(f"{country or 'Unknown'}: {stored} -> {expected}")
+        self.stdout.write(f"{len(want)} countries, {drifted} drifted.")
+
+        if options["verify"]:
+            if drifted:
+                raise CommandError(f"{drifted} countries drifted; run without --verify to fix.")
+            return
+        if not drifted:
+            return
+
+        with transaction.atomic():
+            CountryStats.objects.all().delete()
+            CountryStats.objects.bulk_create(
+                [CountryStats(country=c, pin_count=p, reaction_count=r) for c, (p, r) in want.items()],
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS("Country stats rebuilt."))
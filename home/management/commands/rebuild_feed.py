@@ -0,0 +1,37 @@
+# home/management/commands/rebuild_feed.py
+# Recomputes FeedEntry rows from pins and accepted friendships. Run once
+# after switching FRIENDS_FEED_STRATEGY to "write", and after any write
+# path that bypasses Pin / Friendship signals (bulk_create, queryset.update).
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from home import feed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the fan-out-on-write friends feed for every user (or just --user)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this username.")
+
+    def handle(self, *args, **options):
+        # Users with stale entries but no friends left get emptied too
+        users = User.objects.filter(
+            Q(friendships_sent__status="accepted")
+            | Q(friendships_received__status="accepted")
+            | Q(feed_entries__isnull=False)
+        ).distinct()
+        if options["user"]:
+            users = User.objects.filter(username=options["user"])
+
+        total = 0
+        for user_id, username in users.values_list("id", "username").iterator():
+            entries = feed.rebuild_for_user(user_id)
+            total += entries
+            self.stdout.write(f"{username}: {entries} entries")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} feed entries."))
@@ -0,0 +1,49 @@
+# home/management/commands/reconcile_reactions.py
+# Recounts Reaction rows and repairs PinReactionStats wherever the
+# denormalized counters have drifted (admin edits, raw SQL, crashes).
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from home.models import Pin, PinReactionStats, Reaction
+from home.reactions import EMOJIS
+
+
+class Command(BaseCommand):
+    help = "Check PinReactionStats against Reaction and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        actual = {}
+        rows = Reaction.objects.values("pin_id", "emoji").annotate(c=Count("id")).order_by()
+        for row in rows.iterator():
+            actual.setdefault(row["pin_id"], dict.fromkeys(EMOJIS, 0))[row["emoji"]] = row["c"]
+
+        stored = {
+            row["pin_id"]: row
+            for row in PinReactionStats.objects.values("pin_id", *EMOJIS).iterator()
+        }
+
+        to_create, to_update = [], []
+        for pin_id in Pin.objects.values_list("id", flat=True).iterator():
+            want = actual.get(pin_id, dict.fromkeys(EMOJIS, 0))
+            have = stored.get(pin_id)
+            if have is None:
+                if any(want.values()):
+                    to_create.append(PinReactionStats(pin_id=pin_id, **want))
+            elif any(have[e] != want[e] for e in EMOJIS):
+                self.stdout.write(f"Pin {pin_id}: {[have[e] for e in EMOJIS]} -> {[want[e] for e in EMOJIS]}")
+                to_update.append(PinReactionStats(pin_id=pin_id, **want))
+
+        self.stdout.write(f"{len(to_create)} missing rows, {len(to_update)} drifted rows.")
+        if options["dry_run"] or not (to_create or to_update):
+            return
+
+        with transaction.atomic():
+            PinReactionStats.objects.bulk_create(to_create, batch_size=1000)
+            PinReactionStats.objects.bulk_update(to_update, EMOJIS, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS("Reaction counters repaired."))
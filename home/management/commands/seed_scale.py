@@ -0,0 +1,225 @@
+# home/management/commands/seed_scale.py
+# Bulk-creates a synthetic population for benchmarking (see bench_api):
+# users with profiles, a scale-free friendship graph, pins clustered around
+# real cities, extra photos and reactions. Everything goes through
+# bulk_create, so derived tables (clusters, reaction and country counters,
+# feed) are rebuilt at the end by their own commands.
+#   python manage.py seed_scale --users 2000 --pins-per-user 40
+#   python manage.py seed_scale --clear
+
+import io
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from home import clusters, feed, friend_graph, spatial
+from home.gazetteer import get_gazetteer
+from home.models import Friendship, Pin, PinPhoto, Profile, Reaction
+
+User = get_user_model()
+
+# Pins land around these (resolved through the bundled gazetteer), so
+# search_location queries for them find real neighbourhoods of pins
+CITIES = [
+    ("Paris", "France"), ("London", "United Kingdom"), ("Tokyo", "Japan"),
+    ("New York", "United States"), ("Sydney", "Australia"), ("Berlin", "Germany"),
+    ("Singapore", "Singapore"), ("Mexico City", "Mexico"), ("São Paulo", "Brazil"),
+    ("Reykjavik", "Iceland"), ("Auckland", "New Zealand"), ("San Francisco", "United States"),
+    ("Nairobi", "Kenya"), ("Cairo", "Egypt"), ("Mumbai", "India"),
+]
+EMOJIS = [key for key, _ in Reaction.EMOJI_CHOICES]
+BATCH_SIZE = 5000
+
+
+def resolve_cities():
+    gaz = get_gazetteer()
+    cities = []
+    for city, country in CITIES:
+        row = gaz.resolve([city, country])
+        if row is not None:
+            cities.append((city, country, *gaz.coordinates(row)))
+    return cities
+
+
+class Command(BaseCommand):
+    help = "Seed users, friendships, pins, photos and reactions at benchmark scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--mean-degree", type=int, default=20,
+                            help="Average number of friends (preferential attachment).")
+        parser.add_argument("--pending-share", type=float, default=0.1,
+                            help="Share of friendships left as pending requests.")
+        parser.add_argument("--pins-per-user", type=float, default=30.0, help="Mean; exponential.")
+        parser.add_argument("--photos-per-pin", type=float, default=0.5, help="Mean; Poisson.")
+        parser.add_argument("--reactions-per-pin", type=float, default=2.0, help="Mean; Poisson.")
+        parser.add_argument("--days", type=int, default=365, help="Spread created_at over this many days.")
+        parser.add_argument("--prefix", default="seed_", help="Username prefix for seeded users.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true",
+                            help="Delete previously seeded users (and everything they own) and exit.")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["clear"]:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} rows."))
+            return
+
+        rng = random.Random(options["seed"])
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            users = self._users(options["users"], prefix)
+            friends = self._friendships(users, options["mean_degree"], options["pending_share"], rng)
+            pins = self._pins(users, options["pins_per_user"], options["days"], rng)
+            self._photos(pins, options["photos_per_pin"], rng)
+            self._reactions(pins, friends, users, options["reactions_per_pin"], rng)
+        self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+        # bulk_create skipped every signal; rebuild what they would have maintained
+        start = time.perf_counter()
+        for user_id in users:
+            clusters.rebuild_for_user(user_id)
+            if feed.fanout_enabled():
+                feed.rebuild_for_user(user_id)
+        friend_graph.invalidate(*users)
+        call_command("reconcile_reactions", stdout=io.StringIO())
+        call_command("rebuild_country_stats", stdout=io.StringIO())
+        self.stdout.write(
+            f"Rebuilt clusters/reaction counters/country stats/feed in {time.perf_counter() - start:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _users(self, count, prefix):
+        password = make_password("seed")  # hashing is slow; every seeded user shares one
+        existing = User.objects.filter(username__startswith=prefix).count()
+        created = User.objects.bulk_create(
+            [User(username=f"{prefix}{existing + i}", password=password) for i in range(count)],
+            batch_size=BATCH_SIZE,
+        )
+        Profile.objects.bulk_create(
+            [Profile(user=u, avatar_seed=u.username, avatar_style="pixel-art") for u in created],
+            batch_size=BATCH_SIZE,
+        )
+        self.stdout.write(f"{len(created)} users")
+        return [u.id for u in created]
+
+    def _friendships(self, users, mean_degree, pending_share, rng):
+        """
+        Preferential attachment (Barabási–Albert): each new user links to m
+        existing users picked in proportion to their degree, which gives the
+        long-tailed degree distribution real social graphs have.
+        """
+        m = max(1, mean_degree // 2)
+        accepted = {u: [] for u in users}
+        endpoints = users[:1]
+        rows = []
+
+        for i, user in enumerate(users[1:], start=1):
+            chosen = set()
+            while len(chosen) < min(m, i):
+                other = rng.choice(endpoints)
+                if other != user:
+                    chosen.add(other)
+
+            for other in chosen:
+                status = "pending" if rng.random() < pending_share else "accepted"
+                a, b = (user, other) if rng.random() < 0.5 else (other, user)
+                rows.append(Friendship(from_user_id=a, to_user_id=b, status=status))
+                if status == "accepted":
+                    accepted[user].append(other)
+                    accepted[other].append(user)
+                endpoints += (user, other)
+
+        Friendship.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        degrees = sorted(len(f) for f in accepted.values())
+        self.stdout.write(
+            f"{len(rows)} friendships (friends per user: median {degrees[len(degrees) // 2]}, "
+            f"max {degrees[-1]})"
+        )
+        return accepted
+
+    def _pins(self, users, mean, days, rng):
+        cities = resolve_cities()
+        now = timezone.now()
+        minutes = days * 24 * 60
+        pins = []
+
+        def flush(batch):
+            Pin.objects.bulk_create(batch)
+            # auto_now_add stamped them all "now"; spread them out (bulk_update skips it)
+            for pin in batch:
+                pin.created_at = now - timedelta(minutes=rng.randrange(minutes))
+            Pin.objects.bulk_update(batch, ["created_at"], batch_size=1000)
+            pins.extend((pin.id, pin.user_id) for pin in batch)
+
+        batch = []
+        for user_id in users:
+            for _ in range(round(rng.expovariate(1 / mean)) if mean > 0 else 0):
+                city, country, lat, lon = rng.choice(cities)
+                lat = max(-90.0, min(90.0, rng.gauss(lat, 0.5)))
+                lon = (rng.gauss(lon, 0.5) + 180) % 360 - 180
+                batch.append(Pin(
+                    user_id=user_id, city=city, country=country,
+                    latitude=lat, longitude=lon, geohash=spatial.encode(lat, lon),
+                    caption="seeded", image="pins/seed.jpg" if rng.random() < 0.3 else "",
+                ))
+                if len(batch) == BATCH_SIZE:
+                    flush(batch)
+                    batch = []
+        if batch:
+            flush(batch)
+
+        self.stdout.write(f"{len(pins)} pins")
+        return pins
+
+    def _photos(self, pins, mean, rng):
+        batch, total = [], 0
+        for pin_id, _ in pins:
+            for _ in range(_poisson(rng, mean)):
+                batch.append(PinPhoto(pin_id=pin_id, image="pin_photos/seed.jpg"))
+            if len(batch) >= BATCH_SIZE:
+                PinPhoto.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        PinPhoto.objects.bulk_create(batch)
+        self.stdout.write(f"{total + len(batch)} photos")
+
+    def _reactions(self, pins, friends, users, mean, rng):
+        # Mostly friends react, and 👍 is the common one
+        weights = [5, 3, 2, 1][: len(EMOJIS)]
+        batch, total = [], 0
+        for pin_id, author in pins:
+            pool = friends.get(author) or users
+            k = min(_poisson(rng, mean), len(pool))
+            for user_id in rng.sample(pool, k):
+                batch.append(Reaction(
+                    pin_id=pin_id, user_id=user_id, emoji=rng.choices(EMOJIS, weights)[0],
+                ))
+            if len(batch) >= BATCH_SIZE:
+                Reaction.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+        Reaction.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write(f"{total + len(batch)} reactions")
+
+
+def _poisson(rng, lam):
+    # Knuth's method; fine for the small means used here
+    if lam <= 0:
+        return 0
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
@@ -0,0 +1,157 @@
+# home/media_serving.py
+# Serves MEDIA_ROOT (uploads) in production, replacing
+# django.conf.urls.static.static, which is DEBUG-only in spirit and ignores
+# ranges and caching.
+#
+#   - Strong ETags. Blobs (home/storage.py) use their content hash; older
+#     files use size + mtime. Last-Modified is the mtime. If-None-Match /
+#     If-Modified-Since answer 304 after a single stat() call.
+#   - Cache-Control: blobs never change, so "immutable" for a year; other
+#     files get MEDIA_CACHE_MAX_AGE.
+#   - Single byte ranges (206 / 416), honouring If-Range. Multi-range
+#     requests get the whole file, which RFC 9110 allows.
+#   - MEDIA_ACCEL = "nginx" | "sendfile": after the checks above, hand the
+#     file to the proxy (X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path, or
+#     X-Sendfile with the absolute path). The proxy streams it, ranges
+#     included, without holding a Python worker.
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from . import storage
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_BLOB_HASH_RE = re.compile(r"([0-9a-f]{64})\.[^/]*$")
+
+
+def _etag(name, st):
+    match = _BLOB_HASH_RE.search(name) if storage.is_blob(name) else None
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _cache_control(name):
+    if storage.is_blob(name):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (absent, malformed, multi-range), or "unsatisfiable".
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and int(mtime) <= date
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(full_path)
+    except (OSError, SuspiciousFileOperation):  # missing, or ../ out of MEDIA_ROOT
+        raise Http404("No such file")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("No such file")
+
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, "/")
+    etag = _etag(name, st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": _cache_control(name),
+        "Accept-Ranges": "bytes",
+    }
+
+    # Returns the template untouched unless it's a 304 / 412
+    template = HttpResponse(headers=headers)
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(st.st_mtime), response=template,
+    )
+    if conditional is not template:
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+
+    accel = getattr(settings, "MEDIA_ACCEL", None)
+    if accel:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if accel == "nginx":
+            prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix + name
+        else:
+            response["X-Sendfile"] = full_path
+        return response
+
+    byte_range = parse_range(request.headers.get("Range"), st.st_size)
+    if byte_range is not None and not _if_range_matches(request, etag, st.st_mtime):
+        byte_range = None
+
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416, headers=headers)
+        response["Content-Range"] = f"bytes */{st.st_size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type, headers=headers)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, length), status=206,
+            content_type=content_type, headers=headers,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        response["Content-Length"] = str(length)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='geocode_status',
+            field=models.CharField(choices=[('resolved', 'Resolved'), ('pending', 'Pending'), ('failed', 'Failed')], default='resolved', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='pin',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pin',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='GeocodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(db_index=True)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pin', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='geocode_job', to='home.pin')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:51
+
+from django.db import migrations, models
+
+from home import spatial
+
+
+def backfill_geohash(apps, schema_editor):
+    # Historical models don't run Pin.save(), so compute the hash here
+    Pin = apps.get_model("home", "Pin")
+    batch = []
+    pins = Pin.objects.filter(latitude__isnull=False, longitude__isnull=False).only(
+        "id", "latitude", "longitude"
+    )
+    for pin in pins.iterator(chunk_size=2000):
+        pin.geohash = spatial.encode(pin.latitude, pin.longitude)
+        batch.append(pin)
+        if len(batch) >= 2000:
+            Pin.objects.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        Pin.objects.bulk_update(batch, ["geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_pin_geocode_status_geocodejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
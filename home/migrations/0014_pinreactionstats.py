@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reaction_stats(apps, schema_editor):
+    Reaction = apps.get_model("home", "Reaction")
+    PinReactionStats = apps.get_model("home", "PinReactionStats")
+
+    stats = {}
+    rows = Reaction.objects.values("pin_id", "emoji").annotate(c=Count("id")).order_by()
+    for row in rows.iterator():
+        entry = stats.setdefault(row["pin_id"], PinReactionStats(pin_id=row["pin_id"]))
+        if row["emoji"] in ("like", "love", "laugh", "wow"):
+            setattr(entry, row["emoji"], row["c"])
+    PinReactionStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_tileversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PinReactionStats',
+            fields=[
+                ('pin', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reaction_stats', serialize=False, to='home.pin')),
+                ('like', models.PositiveIntegerField(default=0)),
+                ('love', models.PositiveIntegerField(default=0)),
+                ('laugh', models.PositiveIntegerField(default=0)),
+                ('wow', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_reaction_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_pinreactionstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('pin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='home.pin')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at', '-id'], name='feedentry_owner_recent'), models.Index(fields=['owner', 'author'], name='feedentry_owner_author')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'pin'), name='unique_feed_entry')],
+            },
+        ),
+    ]
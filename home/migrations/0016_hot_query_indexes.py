@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_feedentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['to_user', 'status'], name='friendship_to_status'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['from_user', 'status'], name='friendship_from_status'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='pin_user_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='pinphoto',
+            index=models.Index(fields=['pin', '-created_at', '-id'], name='pinphoto_pin_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['pin', 'emoji'], name='reaction_pin_emoji'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0016_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='pinphoto',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_country_stats(apps, schema_editor):
+    Pin = apps.get_model("home", "Pin")
+    Reaction = apps.get_model("home", "Reaction")
+    CountryStats = apps.get_model("home", "CountryStats")
+
+    stats = {}
+    for row in Pin.objects.values("country").annotate(c=Count("id")).order_by():
+        entry = stats.setdefault(row["country"] or "", CountryStats(country=row["country"] or ""))
+        entry.pin_count += row["c"]
+    for row in Reaction.objects.values("pin__country").annotate(c=Count("id")).order_by():
+        entry = stats.setdefault(row["pin__country"] or "", CountryStats(country=row["pin__country"] or ""))
+        entry.reaction_count += row["c"]
+    CountryStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0018_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryStats',
+            fields=[
+                ('country', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('pin_count', models.PositiveIntegerField(default=0)),
+                ('reaction_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'country stats',
+            },
+        ),
+        migrations.RunPython(backfill_country_stats, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,8 @@ from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from . import spatial
+
 
 User = get_user_model()
 
@@ -26,18 +28,50 @@ class Pin(models.Model):
     state = models.CharField(max_length=120, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
 
-    latitude = models.FloatField()
-    longitude = models.FloatField()
+    GEOCODE_STATUS_CHOICES = [
+        ("resolved", "Resolved"),
+        ("pending", "Pending"),
+        ("failed", "Failed"),
+    ]
+
+    # Null only while a freshly added pin waits on the geocode worker
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geocode_status = models.CharField(
+        max_length=10, choices=GEOCODE_STATUS_CHOICES, default="resolved"
+    )
+    # Derived from latitude/longitude in save(); see home/spatial.py
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True)
 
     caption = models.CharField(max_length=280, blank=True)
     image = models.ImageField(upload_to="pins/", blank=True, null=True)
+    # Resized copies of image; see home/thumbnails.py
+    image_variants = models.JSONField(default=dict, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # my_pins / user_pins / my_photos: one user's pins, newest first
+            models.Index(fields=["user", "-created_at", "-id"], name="pin_user_recent"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ""
+        else:
+            self.geohash = spatial.encode(self.latitude, self.longitude)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+
+        super().save(*args, **kwargs)
 
     def __str__(self):
+        if self.latitude is None or self.longitude is None:
+            return f"{self.user} @ {self.city}, {self.country} ({self.geocode_status})"
         return f"{self.user} @ {self.city}, {self.country} ({self.latitude:.3f}, {self.longitude:.3f})"
 
 
@@ -49,9 +83,15 @@ class PinPhoto(models.Model):
     )
 
     image = models.ImageField(upload_to="pin_photos/")
+    image_variants = models.JSONField(default=dict, blank=True)
     caption = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["pin", "-created_at", "-id"], name="pinphoto_pin_recent"),
+        ]
+
     def __str__(self):
         return f"Photo {self.id} for Pin {self.pin_id}"
 
@@ -74,6 +114,46 @@ class Reaction(models.Model):
 
     class Meta:
         unique_together = ("pin", "user")
+        indexes = [
+            # Per-pin emoji counts (reconcile_reactions, PinReactionStats backfill)
+            models.Index(fields=["pin", "emoji"], name="reaction_pin_emoji"),
+        ]
+
+
+class PinReactionStats(models.Model):
+    """
+    Denormalized per-pin reaction counts, one column per emoji key. Kept in
+    step with Reaction by home.reactions (writes) and a Reaction post_delete
+    signal; `manage.py reconcile_reactions` repairs any drift.
+    """
+    pin = models.OneToOneField(
+        Pin, on_delete=models.CASCADE, primary_key=True, related_name="reaction_stats"
+    )
+    like = models.PositiveIntegerField(default=0)
+    love = models.PositiveIntegerField(default=0)
+    laugh = models.PositiveIntegerField(default=0)
+    wow = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Reactions for Pin {self.pin_id}"
+
+
+class CountryStats(models.Model):
+    """
+    Pin and reaction totals per Pin.country ("" for pins without one), for
+    the popularity dashboard. Kept in step by home.country_stats from Pin
+    and Reaction signals; `manage.py rebuild_country_stats` backfills and
+    verifies.
+    """
+    country = models.CharField(max_length=100, primary_key=True)
+    pin_count = models.PositiveIntegerField(default=0)
+    reaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "country stats"
+
+    def __str__(self):
+        return f"{self.country or 'Unknown'}: {self.pin_count} pins, {self.reaction_count} reactions"
 
 
 # ------------------------------------------------------
@@ -113,11 +193,41 @@ class Friendship(models.Model):
                 name="unique_friendship_request"
             )
         ]
+        indexes = [
+            # Pending requests in either direction, accepted friends of a user
+            models.Index(fields=["to_user", "status"], name="friendship_to_status"),
+            models.Index(fields=["from_user", "status"], name="friendship_from_status"),
+        ]
 
     def __str__(self):
         return f"{self.from_user} → {self.to_user} ({self.status})"
 
 
+class FeedEntry(models.Model):
+    """
+    One friend's pin in `owner`'s friends feed (fan-out-on-write, see
+    home/feed.py). Only maintained when FRIENDS_FEED_STRATEGY = "write".
+    `author` and `created_at` are copied from the pin so the feed page and
+    unfriend pruning never join Pin.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feed_entries")
+    pin = models.ForeignKey(Pin, on_delete=models.CASCADE, related_name="feed_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "pin"], name="unique_feed_entry")
+        ]
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-id"], name="feedentry_owner_recent"),
+            models.Index(fields=["owner", "author"], name="feedentry_owner_author"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} ← Pin {self.pin_id}"
+
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
@@ -143,3 +253,117 @@ def create_profile_for_new_user(sender, instance, created, **kwargs):
             avatar_seed=instance.username or "",
             avatar_style="pixel-art",
         )
+
+
+# ------------------------------------------------------
+# GEOCODE CACHE
+# ------------------------------------------------------
+
+class GeocodeCacheEntry(models.Model):
+    """
+    Shared cache of geocoding results, keyed by the normalized query
+    (see home.geocoding.normalize_query). found=False rows are negative
+    results ("provider has no idea where this is") and get a shorter TTL.
+    """
+    query = models.CharField(max_length=400, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    found = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        if not self.found:
+            return f"{self.query} (not found)"
+        return f"{self.query} ({self.latitude:.3f}, {self.longitude:.3f})"
+
+
+class GeocodeJob(models.Model):
+    """
+    Queue row for a pin whose coordinates are resolved in the background by
+    `manage.py geocode_worker`. The worker reads the pin's current
+    city/state/country when it runs, so re-editing a pending pin just reuses
+    its job. Rows are deleted once the pin is resolved or marked failed.
+    """
+    pin = models.OneToOneField(Pin, on_delete=models.CASCADE, related_name="geocode_job")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(db_index=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Geocode job for Pin {self.pin_id} (attempt {self.attempts})"
+
+
+# ------------------------------------------------------
+# PIN CLUSTERS (GLOBE LEVEL-OF-DETAIL)
+# ------------------------------------------------------
+
+class PinCluster(models.Model):
+    """
+    Per-user pin aggregate for one geohash cell. `level` is the geohash
+    precision (len(cell)), so level 1 is a handful of continent-sized cells
+    and each level below splits them 32 ways. Maintained incrementally by
+    home.clusters from Pin signals; `manage.py rebuild_clusters` recomputes.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="pin_clusters")
+    level = models.PositiveSmallIntegerField()
+    cell = models.CharField(max_length=12)
+    count = models.PositiveIntegerField(default=0)
+    # Sums rather than means so adds/removes are single F() updates
+    lat_sum = models.FloatField(default=0)
+    lon_sum = models.FloatField(default=0)
+    sample_ids = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "cell"], name="unique_user_cluster_cell")
+        ]
+        indexes = [
+            models.Index(fields=["user", "level", "cell"], name="pincluster_user_level_cell"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.cell} ({self.count} pins)"
+
+
+class TileVersion(models.Model):
+    """
+    Change counter for one user's pins inside one map tile (see
+    home/tiles.py). Bumped on every pin / pin photo write in the tile; tile
+    ETags are built from these, so unchanged tiles revalidate with a 304.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tile_versions")
+    z = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "z", "x", "y"], name="unique_user_tile")
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.z}/{self.x}/{self.y} v{self.version}"
+
+
+# ------------------------------------------------------
+# CONTENT-ADDRESSED MEDIA
+# ------------------------------------------------------
+
+class MediaBlob(models.Model):
+    """
+    Reference count for one file written by home.storage
+    (ContentAddressedStorage). Each save of the same bytes adds a reference;
+    deleting or replacing a row that pointed at it drops one, and the file
+    is removed with the last reference.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
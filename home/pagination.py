@@ -0,0 +1,106 @@
+# home/pagination.py
+# Keyset ("cursor") pagination on (created_at, id), newest first.
+#
+# A cursor is an opaque, URL-safe token naming the last row of the previous
+# page; the next page is "rows strictly older than that", which is one index
+# range scan no matter how deep the client has scrolled (unlike OFFSET).
+
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk, rank=0):
+    raw = json.dumps([created_at.isoformat(), pk, rank], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Returns (created_at, pk, rank); raises InvalidCursor on garbage."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, pk, rank = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(pk), int(rank)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def page_params(request, default=DEFAULT_PAGE_SIZE):
+    """
+    Reads ?cursor= and ?limit= from the request.
+    Returns (cursor or None, limit); raises InvalidCursor on bad input.
+    """
+    try:
+        limit = int(request.GET.get("limit", default))
+    except ValueError as e:
+        raise InvalidCursor("limit must be an integer") from e
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    token = request.GET.get("cursor")
+    return (decode_cursor(token) if token else None), limit
+
+
+def after(cursor, rank=0, field="created_at"):
+    """
+    Q() for rows that sort after `cursor` in (created_at desc, rank asc,
+    id desc) order. `rank` lets two querysets share one cursor space (see my_photos);
+    single-source lists just leave it at 0.
+    """
+    created_at, pk, cursor_rank = cursor
+    older = Q(**{f"{field}__lt": created_at})
+    same_time = Q(**{field: created_at})
+    if rank > cursor_rank:
+        return older | same_time
+    if rank < cursor_rank:
+        return older
+    return older | (same_time & Q(pk__lt=pk))
+
+
+def _cursor_for(row, field):
+    # Model instances, or dicts from .values() (which must include field and "id")
+    if isinstance(row, dict):
+        return encode_cursor(row[field], row["id"])
+    return encode_cursor(getattr(row, field), row.pk)
+
+
+def paginate(queryset, cursor, limit, field="created_at"):
+    """
+    Returns (rows, next_cursor) for one page of queryset, newest first.
+    next_cursor is None on the last page. Works on .values() querysets too.
+    """
+    queryset = queryset.order_by(f"-{field}", "-pk")
+    if cursor is not None:
+        queryset = queryset.filter(after(cursor, field=field))
+
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, _cursor_for(rows[-1], field)
+
+
+def paginate_list(rows, cursor, limit):
+    """
+    paginate() for rows already in memory, sorted (created_at desc, pk
+    desc); each row needs .created_at and .pk. Same cursors as paginate().
+    """
+    if cursor is not None:
+        created_at, pk, _ = cursor
+        rows = [r for r in rows if (r.created_at, r.pk) < (created_at, pk)]
+
+    if len(rows) <= limit:
+        return list(rows), None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.pk)
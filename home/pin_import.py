@@ -0,0 +1,356 @@
+# home/pin_import.py
+# Bulk pin import from CSV or GeoJSON, for the import_pins view and
+# `manage.py import_pins`.
+#
+#   1) parse: the file is read incrementally (csv module / a streaming
+#      decoder over the FeatureCollection's "features" array) into small
+#      tuples; bad rows are reported by line / feature number and skipped
+#   2) geocode: rows without coordinates are grouped by normalized place
+#      (geocoding.normalize_query), so each place is looked up once. The
+#      gazetteer answers what it can inline; the rest go to
+#      geocode_location in parallel batches, GEOCODE_WORKERS threads. With
+#      defer (the upload API) they aren't looked up here at all: those pins
+#      are saved pending and queued for `manage.py geocode_worker`, as
+#      add_pin does under GEOCODE_DEFERRED
+#   3) insert: Pin.objects.bulk_create in CHUNK_SIZE chunks, one
+#      transaction each, with the friends feed fanned out per chunk
+#
+# bulk_create skips save() and the signals, so geohashes and country
+# stats are filled in here and clusters, tiles and the response cache are
+# refreshed once at the end (also when a later chunk fails, for the chunks
+# already committed). Without defer, places that can't be geocoded are
+# reported as unresolved, not imported (add_pin refuses them too).
+#
+# CSV columns (header row, any order, case-insensitive): city, state,
+# country, caption, latitude/lat, longitude/lon/lng, created_at/date.
+# GeoJSON: a FeatureCollection of Point features (or null geometry plus a
+# place) with the same names as properties.
+
+import csv
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import clusters, country_stats, feed, geocode_queue, geocoding, response_cache, spatial, tiles
+from .models import Pin
+
+CHUNK_SIZE = getattr(settings, "PIN_IMPORT_CHUNK_SIZE", 1000)
+GEOCODE_WORKERS = getattr(settings, "PIN_IMPORT_GEOCODE_WORKERS", 8)
+MAX_ERRORS_REPORTED = 50
+READ_SIZE = 64 * 1024
+
+_ALIASES = {
+    "lat": "latitude", "lon": "longitude", "lng": "longitude", "date": "created_at",
+    "createdat": "created_at",  # what home/export.py writes
+}
+_PLACE_FIELDS = ("city", "state", "country")
+_MAX_LENGTHS = {
+    name: Pin._meta.get_field(name).max_length for name in (*_PLACE_FIELDS, "caption")
+}
+FORMATS = ("csv", "geojson")
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def guess_format(filename):
+    name = (filename or "").lower()
+    if name.endswith((".geojson", ".json")):
+        return "geojson"
+    if name.endswith(".csv"):
+        return "csv"
+    return None
+
+
+# ------------------------------------------------------
+# PARSING
+# ------------------------------------------------------
+
+def _clean(record):
+    """
+    Dict of raw values -> (city, state, country, caption, lat, lon,
+    created_at). Raises InvalidRow.
+    """
+    values = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        key = _ALIASES.get(key, key)
+        values[key] = value.strip() if isinstance(value, str) else value
+
+    for name, limit in _MAX_LENGTHS.items():
+        if values.get(name) and len(str(values[name])) > limit:
+            raise InvalidRow(f"{name} is longer than {limit} characters")
+
+    lat, lon = values.get("latitude"), values.get("longitude")
+    if lat in ("", None) and lon in ("", None):
+        lat = lon = None
+    else:
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            raise InvalidRow("latitude/longitude must both be numbers")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise InvalidRow("latitude/longitude out of range")
+
+    place = tuple(str(values[f]) if values.get(f) else None for f in _PLACE_FIELDS)
+    if lat is None and not any(place):
+        raise InvalidRow("needs coordinates or a city/state/country")
+
+    created_at = None
+    if values.get("created_at"):
+        raw = str(values["created_at"])
+        created_at = parse_datetime(raw)
+        if created_at is None and (day := parse_date(raw)) is not None:
+            created_at = datetime(day.year, day.month, day.day)
+        if created_at is None:
+            raise InvalidRow(f"unreadable created_at {raw!r}")
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at, timezone.get_default_timezone())
+
+    return (*place, str(values.get("caption") or ""), lat, lon, created_at)
+
+
+def _csv_records(fh):
+    reader = csv.DictReader(fh)
+    if not reader.fieldnames:
+        raise ImportFormatError("CSV has no header row")
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _json_items(fh, key):
+    """Yields the items of the first `key` array in a JSON document, one by one."""
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = fh.read(READ_SIZE)
+        if not chunk:
+            raise ImportFormatError(f"Unexpected end of file in {key!r}")
+        buf, pos = buf[pos:] + chunk, 0
+
+    marker = f'"{key}"'
+    while True:
+        start = buf.find(marker)
+        bracket = buf.find("[", start) if start >= 0 else -1
+        if bracket >= 0:
+            pos = bracket + 1
+            break
+        try:
+            more()
+        except ImportFormatError:
+            raise ImportFormatError(f"No {key!r} array found") from None
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buf):
+            more()
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buf, pos)
+        except ValueError:
+            # Most likely cut off at the end of the buffer
+            more()
+            continue
+        yield item
+
+
+def _geojson_records(fh):
+    for number, feature in enumerate(_json_items(fh, "features"), start=1):
+        if not isinstance(feature, dict):
+            yield number, None
+            continue
+        record = dict(feature.get("properties") or {})
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Point":
+            coords = geometry.get("coordinates") or []
+            if len(coords) >= 2:
+                record["longitude"], record["latitude"] = coords[0], coords[1]
+        yield number, record
+
+
+def parse(fh, fmt):
+    """Yields (line or feature number, cleaned row or InvalidRow)."""
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    records = _csv_records(fh) if fmt == "csv" else _geojson_records(fh)
+    for number, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise InvalidRow("not an object")
+            yield number, _clean(record)
+        except InvalidRow as e:
+            yield number, e
+
+
+# ------------------------------------------------------
+# GEOCODING
+# ------------------------------------------------------
+
+def _geocode_slice(places):
+    try:
+        return [geocoding.geocode_location(*place) for place in places]
+    finally:
+        # Worker threads get their own DB connections (the geocode cache)
+        connections.close_all()
+
+
+def geocode_places(places, workers=GEOCODE_WORKERS, progress=None):
+    """
+    {key: (city, state, country)} -> {key: (lat, lon) or None}. Local
+    backends first, inline; the remainder in parallel batches.
+    """
+    found = {}
+    remote = []
+    for key, place in places.items():
+        value = geocoding.geocode_local(*place)
+        if value is not None:
+            found[key] = value
+        else:
+            remote.append(key)
+    if progress:
+        progress("geocode", len(found), len(places))
+
+    if workers <= 1:
+        for key in remote:
+            found[key] = geocoding.geocode_location(*places[key])
+        if progress and remote:
+            progress("geocode", len(places), len(places))
+        return found
+
+    batch_size = workers * 25
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pin-import") as pool:
+        for start in range(0, len(remote), batch_size):
+            batch = remote[start:start + batch_size]
+            slices = [batch[i::workers] for i in range(workers)]
+            for keys, values in zip(slices, pool.map(_geocode_slice, [[places[k] for k in s] for s in slices])):
+                found.update(zip(keys, values))
+            if progress:
+                progress("geocode", len(found), len(places))
+    return found
+
+
+# ------------------------------------------------------
+# IMPORT
+# ------------------------------------------------------
+
+def import_pins(
+    user, fh, fmt, max_rows=None, workers=GEOCODE_WORKERS, chunk_size=CHUNK_SIZE, progress=None,
+    defer=False,
+):
+    """
+    Imports every valid row of fh as a pin of `user`. Returns a summary
+    dict; `progress(stage, done, total)` is called as each stage advances.
+    With defer, only the gazetteer is asked; pins for the other places are
+    queued for the geocode worker (counted as "queued").
+    """
+    started = time.perf_counter()
+    rows, errors, invalid = [], [], 0
+
+    def reject(number, message):
+        nonlocal invalid
+        invalid += 1
+        if len(errors) < MAX_ERRORS_REPORTED:
+            errors.append({"row": number, "error": message})
+
+    for number, row in parse(fh, fmt):
+        if isinstance(row, InvalidRow):
+            reject(number, str(row))
+            continue
+        rows.append((number, row))
+        if max_rows is not None and len(rows) + invalid > max_rows:
+            raise ImportFormatError(f"More than {max_rows} rows; use `manage.py import_pins`")
+        if progress and len(rows) % chunk_size == 0:
+            progress("parse", len(rows), None)
+
+    # Spellings of a place -> its normalized key -> the place to geocode
+    keys, places = {}, {}
+    for _, (city, state, country, _, lat, _, _) in rows:
+        if lat is None and (city, state, country) not in keys:
+            key = keys[city, state, country] = geocoding.normalize_query(city, state, country)
+            places.setdefault(key, (city, state, country))
+    if defer:
+        coords = {key: geocoding.geocode_local(*place) for key, place in places.items()}
+    else:
+        coords = geocode_places(places, workers=workers, progress=progress)
+
+    pins, unresolved = [], 0
+    for number, (city, state, country, caption, lat, lon, created_at) in rows:
+        if lat is None:
+            found = coords.get(keys[city, state, country])
+            if found is None and not defer:
+                unresolved += 1
+                reject(number, "location not found")
+                continue
+            lat, lon = found or (None, None)
+        pin = Pin(
+            user=user, city=city, state=state, country=country, caption=caption,
+            latitude=lat, longitude=lon,
+        )
+        if lat is None:
+            pin.geocode_status = "pending"
+        else:
+            pin.geohash = spatial.encode(lat, lon)
+        pin._imported_created_at = created_at
+        pins.append(pin)
+
+    created = queued = 0
+    try:
+        for start in range(0, len(pins), chunk_size):
+            chunk = pins[start:start + chunk_size]
+            with transaction.atomic():
+                Pin.objects.bulk_create(chunk)
+                # auto_now_add stamped them "now"; restore dates from the file.
+                # One UPDATE per distinct date: travel logs repeat dates a lot,
+                # and bulk_update's CASE per row is slower than the inserts.
+                by_date = defaultdict(list)
+                for pin in chunk:
+                    if pin._imported_created_at is not None:
+                        pin.created_at = pin._imported_created_at
+                        by_date[pin.created_at].append(pin.id)
+                for created_at, ids in by_date.items():
+                    Pin.objects.filter(id__in=ids).update(created_at=created_at)
+                country_stats.add_pins(p.country for p in chunk)
+                pending = [p for p in chunk if p.latitude is None]
+                geocode_queue.enqueue_new(pending)
+                if feed.fanout_enabled():
+                    feed.add_pins(user.id, chunk)
+            created += len(chunk)
+            queued += len(pending)
+            if progress:
+                progress("insert", created, len(pins))
+    finally:
+        # What the Pin signals would have maintained row by row
+        if created:
+            clusters.rebuild_for_user(user.id)
+            tiles.bump_many(user.id, {(p.latitude, p.longitude) for p in pins[:created]})
+            response_cache.bump_on_commit(user.id)
+
+    return {
+        "rows": len(rows) + invalid - unresolved,
+        "created": created,
+        "queued": queued,
+        "invalid": invalid - unresolved,
+        "unresolved": unresolved,
+        "places": len(places),
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
@@ -0,0 +1,83 @@
+# home/reactions.py
+# Reaction writes and reads on top of PinReactionStats, so showing a pin's
+# counts never aggregates over Reaction. Every change to Reaction goes
+# through set_reaction() (or the Reaction post_delete signal), which adjusts
+# the counters with F() expressions in the same transaction.
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Pin, PinReactionStats, Reaction
+
+EMOJIS = [key for key, _ in Reaction.EMOJI_CHOICES]
+
+
+def with_reactions(queryset, user):
+    """
+    Adds the pin's counters (select_related) and the user's own emoji
+    (`my_reaction` subquery), so one query answers both.
+    """
+    mine = Reaction.objects.filter(pin=OuterRef("pk"), user=user).values("emoji")[:1]
+    return queryset.select_related("reaction_stats").annotate(my_reaction=Subquery(mine))
+
+
+def counts_for(pin):
+    """{emoji: count} for a pin loaded via with_reactions()."""
+    stats = getattr(pin, "reaction_stats", None)
+    return {emoji: getattr(stats, emoji, 0) for emoji in EMOJIS}
+
+
+def stats_counts(pin_id):
+    """{emoji: count} by primary key, for when the pin isn't loaded."""
+    stats = PinReactionStats.objects.filter(pk=pin_id).first()
+    return {emoji: getattr(stats, emoji, 0) for emoji in EMOJIS}
+
+
+def set_reaction(pin, user, emoji):
+    """Sets (or changes) user's reaction to pin and updates the counters."""
+    with transaction.atomic():
+        mine = Reaction.objects.filter(pin=pin, user=user)
+        previous = mine.select_for_update().values_list("emoji", flat=True).first()
+        if previous == emoji:
+            return
+
+        if previous is None:
+            Reaction.objects.create(pin=pin, user=user, emoji=emoji)
+        else:
+            mine.update(emoji=emoji)
+
+        changes = {emoji: F(emoji) + 1}
+        if previous in EMOJIS:
+            changes[previous] = F(previous) - 1
+        if not PinReactionStats.objects.filter(pk=pin.pk).update(**changes):
+            _create_stats(pin, emoji)
+
+
+def _create_stats(pin, emoji):
+    # First reaction on this pin; a concurrent first reaction may win the insert
+    try:
+        with transaction.atomic():
+            PinReactionStats.objects.create(pin=pin, **{emoji: 1})
+    except IntegrityError:
+        PinReactionStats.objects.filter(pk=pin.pk).update(**{emoji: F(emoji) + 1})
+
+
+def remove_from_counts(reaction):
+    """Called from the Reaction post_delete signal."""
+    if reaction.emoji in EMOJIS:
+        PinReactionStats.objects.filter(pk=reaction.pin_id, **{f"{reaction.emoji}__gt": 0}).update(
+            **{reaction.emoji: F(reaction.emoji) - 1}
+        )
+
+
+def batch(pin_ids, user):
+    """
+    {pin_id: {"reaction_counts": ..., "user_reaction": ...}} for every
+    existing pin in pin_ids. One query regardless of how many ids.
+    """
+    fields = ["id", *(f"reaction_stats__{emoji}" for emoji in EMOJIS)]
+    pins = with_reactions(Pin.objects.filter(id__in=pin_ids), user).only(*fields).order_by()
+    return {
+        pin.id: {"reaction_counts": counts_for(pin), "user_reaction": pin.my_reaction}
+        for pin in pins
+    }
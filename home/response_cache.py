@@ -0,0 +1,105 @@
+# home/response_cache.py
+# Whole-response cache for per-user pin lists (my_pins, user_pins).
+#
+# Each user has a data version: an opaque token in the default cache that
+# Pin / PinPhoto / Profile signals replace once a write commits (bump()).
+# A cached response is keyed by endpoint, target user, that version and
+# everything else the body depends on (viewer is owner?, host, cursor,
+# limit). A write therefore orphans every entry for the user. Nothing is
+# deleted; the orphans age out of the RESPONSE_CACHE_ALIAS backend, which
+# should be size-bounded (LocMemCache MAX_ENTRIES, Redis maxmemory, ...).
+#
+# The ETag is derived from the key, so a client revalidating an unchanged
+# list gets a 304 after one cache read (the version) and no queries.
+#
+# Writes that skip signals (bulk_create, queryset.update) must call bump()
+# themselves.
+#
+# bump() can only reach the cache it runs against. With a shared default
+# cache (Redis, Memcached, database) every worker sees it at once; with a
+# per-process LocMemCache the other workers keep their own version. So
+# versions expire with the entries (RESPONSE_CACHE_TTL): at worst a
+# per-process cache serves a page, or a 304, that is that old.
+
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+VERSION_KEY = "pin-data-version:v1:{}"
+ENTRY_KEY = "pin-response:v1:{}"
+
+
+def _store():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "RESPONSE_CACHE_TTL", 600)
+
+
+def _new_token():
+    # Never reuses an old value, even after the version entry is evicted
+    return f"{time.time_ns():x}"
+
+
+def data_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_token()
+        # add(): if a concurrent request set one first, use theirs
+        if not cache.add(key, version, timeout=_ttl()):
+            version = cache.get(key, version)
+    return version
+
+
+def bump(*user_ids):
+    cache.set_many({VERSION_KEY.format(uid): _new_token() for uid in user_ids}, timeout=_ttl())
+
+
+def bump_on_commit(*user_ids):
+    # After commit, so a concurrent reader can't cache pre-write rows under
+    # the new version
+    transaction.on_commit(partial(bump, *user_ids))
+
+
+def cached_json(request, endpoint, target_id, build):
+    """
+    Serves build()'s JSON response from the cache when the target user's
+    data hasn't changed, with ETag / 304 support. Only 200s are cached.
+    """
+    params = sorted((k, v) for k, v in request.GET.items() if k in ("cursor", "limit"))
+    raw = repr((
+        endpoint, target_id, data_version(target_id), request.user.id == target_id,
+        request.get_host(), request.is_secure(), params,
+    ))
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    etag = f'"{digest}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["Cache-Control"] = "private, no-cache"
+        return not_modified
+
+    store = _store()
+    key = ENTRY_KEY.format(digest)
+    body = store.get(key)
+    if body is not None:
+        response = HttpResponse(body, content_type="application/json")
+        response["X-Response-Cache"] = "hit"
+    else:
+        response = build()
+        if response.status_code == 200:
+            store.set(key, response.content, timeout=_ttl())
+        response["X-Response-Cache"] = "miss"
+
+    response["ETag"] = etag
+    # Per-user data: browsers may keep it but must revalidate (cheap 304s)
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,148 @@
+# home/serialization.py
+# The one pin payload shared by my_pins, user_pins, friends_pins, pin_tile,
+# search_location, add_pin and edit_pin.
+#
+# Before this, each view loaded full Pin instances (select_related user,
+# prefetch photos) and called request.build_absolute_uri for every image.
+# Here the rows come from .values() projections (project()); photos
+# (attach_photos) are loaded with one extra query for the whole page;
+# media URLs are concatenated onto a base prefix worked out once per
+# request (MediaUrls). `manage.py bench_serialization` measures the
+# difference. Reaction counts stay out of list payloads: the client asks
+# /api/reactions/batch/ for them, so other users' reactions don't
+# invalidate cached lists.
+#
+# json_response() / dumps() encode with orjson when it is installed, else
+# with Django's JSON encoder.
+
+import json
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.encoding import filepath_to_uri
+
+from .models import PinPhoto
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+PIN_FIELDS = (
+    "id", "user_id", "user__username", "latitude", "longitude", "caption",
+    "image", "image_variants", "city", "state", "country", "geocode_status", "created_at",
+)
+
+
+class MediaUrls:
+    """Absolute media URLs for one request, without per-file URL building."""
+
+    def __init__(self, request):
+        self.base = request.build_absolute_uri(default_storage.base_url)
+
+    def url(self, name):
+        return self.base + filepath_to_uri(name) if name else None
+
+    def srcsets(self, variants):
+        """{"webp": "url 320w, …", "jpeg": …} for image_variants, or None."""
+        if not variants:
+            return None
+        out = {}
+        for width in sorted(variants, key=int):
+            for fmt, name in variants[width].items():
+                out.setdefault(fmt, []).append(f"{self.base}{filepath_to_uri(name)} {width}w")
+        return {fmt: ", ".join(parts) for fmt, parts in out.items()}
+
+
+# ------------------------------------------------------
+# LOADING
+# ------------------------------------------------------
+
+def project(queryset):
+    """Pin queryset -> .values() with everything the payload needs."""
+    return queryset.values(*PIN_FIELDS)
+
+
+def unprefix(rows, prefix):
+    """Rows that read the pin through a relation (FeedEntry: "pin__...")."""
+    return [{f: row[prefix + f] for f in PIN_FIELDS} for row in rows]
+
+
+def row_from_instance(pin):
+    """The project() row for a Pin already in memory (add_pin, edit_pin)."""
+    row = {f: getattr(pin, f) for f in PIN_FIELDS if "__" not in f}
+    row["user__username"] = pin.user.username
+    row["image"] = pin.image.name or None
+    return row
+
+
+def attach_photos(rows, photos=None):
+    """
+    Sets row["photos"] to [(image name, image_variants)], oldest first.
+    One query for all rows, unless `photos` (PinPhoto instances of a single
+    row) are already in hand.
+    """
+    if photos is not None:
+        rows[0]["photos"] = [(p.image.name, p.image_variants) for p in photos]
+        return rows
+
+    by_pin = defaultdict(list)
+    if rows:
+        for pin_id, name, variants in (
+            PinPhoto.objects.filter(pin_id__in=[r["id"] for r in rows])
+            .order_by("pin_id", "id")
+            .values_list("pin_id", "image", "image_variants")
+        ):
+            by_pin[pin_id].append((name, variants))
+    for row in rows:
+        row["photos"] = by_pin.get(row["id"], [])
+    return rows
+
+
+# ------------------------------------------------------
+# OUTPUT
+# ------------------------------------------------------
+
+def pin_payload(row, urls, viewer_id):
+    cover = urls.url(row["image"])
+    photos = row.get("photos", [])
+    return {
+        "id": row["id"],
+        "lat": row["latitude"],
+        "lon": row["longitude"],
+        "caption": row["caption"] or "",
+        "imageUrl": cover,
+        "photos": [urls.url(name) for name, _ in photos],
+        "imageSrcset": urls.srcsets(row["image_variants"]) if cover else None,
+        "photoSrcsets": [urls.srcsets(variants) for _, variants in photos],
+        "photoCount": (1 if cover else 0) + len(photos),
+        "user": row["user__username"],
+        "city": row["city"],
+        "state": row["state"],
+        "country": row["country"],
+        "geocodeStatus": row["geocode_status"],
+        "isOwner": row["user_id"] == viewer_id,
+    }
+
+
+def pins_payload(request, rows):
+    """Payload dicts for project() rows, photos attached here."""
+    rows = list(rows)
+    attach_photos(rows)
+    urls = MediaUrls(request)
+    return [pin_payload(row, urls, request.user.id) for row in rows]
+
+
+def dumps(data):
+    """JSON bytes for data (datetimes included), with orjson when installed."""
+    if orjson is None:
+        return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+    return orjson.dumps(data)
+
+
+def json_response(data, status=200):
+    if orjson is None:
+        return JsonResponse(data, status=status)
+    return HttpResponse(orjson.dumps(data), status=status, content_type="application/json")
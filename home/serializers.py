@@ -11,8 +11,8 @@
 
 
 from rest_framework import serializers
-from django.db.models import Count
 
+from . import reactions
 from .models import Reaction, Pin
 
 class ReactionSerializer(serializers.ModelSerializer):
@@ -27,6 +27,13 @@ class ReactionSerializer(serializers.ModelSerializer):
     
 
 class PinSerializer(serializers.ModelSerializer):
+    """
+    Expects pins from reactions.with_reactions(), which loads the counters
+    and the user's emoji in the same query, so nothing here queries per
+    object. The JSON views use home/serialization.py instead.
+    """
+    lat = serializers.FloatField(source="latitude", read_only=True)
+    lon = serializers.FloatField(source="longitude", read_only=True)
     imageUrl = serializers.SerializerMethodField()
     reaction_counts = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
@@ -50,9 +57,8 @@ class PinSerializer(serializers.ModelSerializer):
         return None
 
     def get_reaction_counts(self, obj):
-        counts = obj.reactions.values("emoji").annotate(count=Count("emoji"))
-        return {item["emoji"]: item["count"] for item in counts}
+        return reactions.counts_for(obj)
 
     def get_user_reaction(self, obj):
-        reaction = obj.reactions.filter(user=self.context["request"].user).first()
-        return reaction.emoji if reaction else None
\ No newline at end of file
+        # Annotated by reactions.with_reactions; None when not reacted
+        return getattr(obj, "my_reaction", None)
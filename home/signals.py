@@ -1,7 +1,11 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Profile
+from . import clusters, country_stats, feed, friend_graph, reactions, response_cache, storage, thumbnails, tiles
+from .models import Friendship, Pin, PinPhoto, Profile, Reaction
 
 User = get_user_model()
 
@@ -15,3 +19,249 @@ def create_profile(sender, instance, created, **kwargs):
                 "avatar_style": "pixel-art",
             }
         )
+
+
+# ------------------------------------------------------
+# PIN CLUSTERS — keep PinCluster rows in step with pin writes
+# ------------------------------------------------------
+
+@receiver(pre_save, sender=Pin)
+def remember_pin_location(sender, instance, raw, update_fields=None, **kwargs):
+    # Also remembers the stored image names, for release_replaced_pin_media,
+    # and the country, for move_country_stats
+    instance._old_location = instance._old_media = instance._old_country = None
+    if raw or instance.pk is None:
+        return
+    row = (
+        Pin.objects.filter(pk=instance.pk)
+        .values_list("geohash", "latitude", "longitude", "image", "image_variants", "country")
+        .first()
+    )
+    if row:
+        instance._old_location = row[:3]
+        instance._old_media = {row[3], *storage.variant_names(row[4])}
+        instance._old_country = country_stats.key(row[5])
+        if (instance.image.name or "") != (row[3] or "") and instance.image_variants == row[4]:
+            _rebuild_cover_variants(instance, update_fields)
+
+
+def _rebuild_cover_variants(instance, update_fields):
+    # A cover replaced without new renditions (the admin form) would keep
+    # serving the old ones in imageSrcset; release_replaced_pin_media then
+    # frees them along with the old image
+    instance.image_variants = thumbnails.build_many([instance.image])[0] if instance.image else {}
+    if update_fields is not None and "image_variants" not in update_fields:
+        Pin.objects.filter(pk=instance.pk).update(image_variants=instance.image_variants)
+
+
+@receiver(post_save, sender=Pin)
+def update_clusters_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    old = getattr(instance, "_old_location", None)
+    new = (instance.geohash, instance.latitude, instance.longitude)
+
+    # Any save can change what the tile shows (caption, image, ...)
+    tiles.bump(instance.user_id, instance.latitude, instance.longitude)
+    if old == new:
+        return
+
+    if old:
+        clusters.remove_pin(instance.user_id, instance.id, *old)
+        tiles.bump(instance.user_id, old[1], old[2])
+    clusters.add_pin(instance.user_id, instance.id, *new)
+
+
+@receiver(post_delete, sender=Pin)
+def update_clusters_on_delete(sender, instance, **kwargs):
+    clusters.remove_pin(
+        instance.user_id, instance.id, instance.geohash, instance.latitude, instance.longitude
+    )
+    transaction.on_commit(
+        partial(_bump_after_delete, instance.user_id, instance.latitude, instance.longitude)
+    )
+
+
+def _bump_after_delete(user_id, lat, lon):
+    # Deferred to commit so a user deleted in the same cascade is already gone
+    if User.objects.filter(pk=user_id).exists():
+        tiles.bump(user_id, lat, lon)
+
+
+@receiver(post_save, sender=PinPhoto)
+@receiver(post_delete, sender=PinPhoto)
+def bump_tiles_on_photo_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Pin may already be gone when this is part of a cascade delete
+    pin = Pin.objects.filter(pk=instance.pin_id).values_list("user_id", "latitude", "longitude").first()
+    if not pin:
+        return
+    response_cache.bump_on_commit(pin[0])
+    if "created" in kwargs:
+        tiles.bump(*pin)
+    else:
+        transaction.on_commit(partial(_bump_after_delete, *pin))
+
+
+# ------------------------------------------------------
+# RESPONSE CACHE — a user's pin lists change when their pins or profile do
+# ------------------------------------------------------
+
+@receiver(post_save, sender=Pin)
+@receiver(post_delete, sender=Pin)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_response_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.bump_on_commit(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw, update_fields=None, **kwargs):
+    instance._old_username = None
+    if raw or instance.pk is None or (update_fields is not None and "username" not in update_fields):
+        return
+    instance._old_username = User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_response_cache_on_rename(sender, instance, raw, update_fields=None, **kwargs):
+    # Payloads carry the username; login's last_login save doesn't matter
+    if not raw and update_fields != frozenset({"last_login"}):
+        response_cache.bump_on_commit(instance.pk)
+    # So do tiles, but those are only worth touching on an actual rename
+    old = getattr(instance, "_old_username", None)
+    if old is not None and old != instance.username:
+        tiles.bump_user(instance.pk)
+
+
+# ------------------------------------------------------
+# REACTION COUNTERS
+# ------------------------------------------------------
+
+@receiver(post_delete, sender=Reaction)
+def update_reaction_stats_on_delete(sender, instance, **kwargs):
+    reactions.remove_from_counts(instance)
+
+
+# ------------------------------------------------------
+# COUNTRY STATS — per-country totals for the popularity dashboard
+# ------------------------------------------------------
+
+@receiver(post_save, sender=Pin)
+def move_country_stats(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        country_stats.adjust(instance.country, pins=1)
+        return
+
+    old = getattr(instance, "_old_country", None)
+    if old is not None and old != country_stats.key(instance.country):
+        # The pin's reactions move with it
+        moved = country_stats.reaction_total(instance.pk)
+        country_stats.adjust(old, pins=-1, reactions=-moved)
+        country_stats.adjust(instance.country, pins=1, reactions=moved)
+
+
+@receiver(post_delete, sender=Pin)
+def remove_pin_from_country_stats(sender, instance, **kwargs):
+    # Its reactions are deleted first (cascade), each through the handler below
+    country_stats.adjust(instance.country, pins=-1)
+
+
+@receiver(post_save, sender=Reaction)
+def add_reaction_to_country_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        country_stats.adjust(instance.pin.country, reactions=1)
+
+
+@receiver(post_delete, sender=Reaction)
+def remove_reaction_from_country_stats(sender, instance, **kwargs):
+    row = Pin.objects.filter(pk=instance.pin_id).values_list("country").first()
+    if row:
+        country_stats.adjust(row[0], reactions=-1)
+
+
+# ------------------------------------------------------
+# FRIEND GRAPH CACHE
+# ------------------------------------------------------
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    # After commit, so a concurrent reader can't re-cache the old rows
+    transaction.on_commit(
+        partial(friend_graph.invalidate, instance.from_user_id, instance.to_user_id)
+    )
+
+
+# ------------------------------------------------------
+# FRIENDS FEED (FRIENDS_FEED_STRATEGY = "write")
+# ------------------------------------------------------
+
+@receiver(post_save, sender=Pin)
+def fan_out_new_pin(sender, instance, created, raw, **kwargs):
+    if created and not raw and feed.fanout_enabled():
+        transaction.on_commit(partial(feed.add_pin, instance))
+
+
+@receiver(post_save, sender=Friendship)
+def backfill_feeds_on_accept(sender, instance, raw, **kwargs):
+    if instance.status == "accepted" and not raw and feed.fanout_enabled():
+        transaction.on_commit(partial(feed.link, instance.from_user_id, instance.to_user_id))
+
+
+@receiver(post_delete, sender=Friendship)
+def prune_feeds_on_remove(sender, instance, **kwargs):
+    if instance.status == "accepted" and feed.fanout_enabled():
+        transaction.on_commit(partial(feed.unlink, instance.from_user_id, instance.to_user_id))
+
+
+# ------------------------------------------------------
+# MEDIA REFERENCES — see home/storage.py
+# Deleting or replacing a row's file drops its reference after commit, so a
+# rolled-back delete never loses a file.
+# ------------------------------------------------------
+
+def _release_after_commit(names):
+    names = [n for n in names if storage.is_blob(n)]
+    if names:
+        transaction.on_commit(partial(storage.release, *names))
+
+
+@receiver(post_save, sender=Pin)
+def release_replaced_pin_media(sender, instance, raw, **kwargs):
+    old = getattr(instance, "_old_media", None)
+    if old and not raw:
+        current = {instance.image.name, *storage.variant_names(instance.image_variants)}
+        _release_after_commit(old - current)
+
+
+@receiver(post_delete, sender=Pin)
+@receiver(post_delete, sender=PinPhoto)
+def release_image_on_delete(sender, instance, **kwargs):
+    _release_after_commit([instance.image.name, *storage.variant_names(instance.image_variants)])
+
+
+@receiver(pre_save, sender=Profile)
+def remember_avatar(sender, instance, raw, **kwargs):
+    instance._old_avatar = None
+    if not raw and instance.pk is not None:
+        instance._old_avatar = (
+            Profile.objects.filter(pk=instance.pk).values_list("avatar_upload", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Profile)
+def release_replaced_avatar(sender, instance, raw, **kwargs):
+    old = getattr(instance, "_old_avatar", None)
+    if old and not raw and old != instance.avatar_upload.name:
+        _release_after_commit([old])
+
+
+@receiver(post_delete, sender=Profile)
+def release_avatar_on_delete(sender, instance, **kwargs):
+    _release_after_commit([instance.avatar_upload.name])
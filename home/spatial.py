@@ -0,0 +1,167 @@
+# home/spatial.py
+# Geohash helpers behind Pin.geohash, and the k-nearest search used by
+# search_location.
+#
+# A geohash prefix is a lat/lon cell, so "pins in this cell" is a plain range
+# scan on the indexed geohash column. A search covers its radius with a small
+# set of cells, ranks the candidates by haversine distance and keeps the k
+# nearest.
+
+import heapq
+import math
+
+from django.db.models import Q
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9          # ~4.8m x 4.8m cells
+EARTH_RADIUS_KM = 6371.0088
+
+# Upper bound for a prefix range: sorts after every geohash character
+_RANGE_END = "{"
+
+
+def encode(lat, lon, precision=PRECISION):
+    """Standard geohash of (lat, lon); lon is wrapped into [-180, 180)."""
+    lon = (lon + 180.0) % 360.0 - 180.0
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = ch * 2 + 1
+                lon_lo = mid
+            else:
+                ch *= 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = ch * 2 + 1
+                lat_lo = mid
+            else:
+                ch *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell at this precision."""
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    (min_lat, max_lat, min_lon, max_lon) around a point. Longitudes are NOT
+    wrapped, so min_lon < -180 or max_lon > 180 means the box crosses the
+    antimeridian. A box touching a pole spans every longitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM  # radians of arc
+    dlat = math.degrees(angle)
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    # The circle's widest point is not on the centre's parallel but nearer
+    # the pole, where meridians converge: asin(sin(r/R) / cos(lat)). When
+    # that ratio reaches 1 the circle wraps a pole.
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = math.degrees(math.asin(ratio))
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+def covering_cells(lat, lon, radius_km, max_cells=16):
+    """
+    Geohash prefixes that together cover the search circle, using the finest
+    precision that needs at most max_cells cells. Returns [] when the circle
+    is too big for the index to help (caller should scan everything).
+    """
+    return bbox_cells(*bounding_box(lat, lon, radius_km), max_cells=max_cells)
+
+
+def bbox_cells(min_lat, max_lat, min_lon, max_lon, max_cells=16, max_precision=PRECISION):
+    """
+    Same as covering_cells for a lat/lon box. Longitudes follow
+    bounding_box(): max_lon may exceed 180 when the box crosses the
+    antimeridian.
+    """
+    best = None
+    for precision in range(1, max_precision + 1):
+        h, w = cell_size(precision)
+        rows = range(int((min_lat + 90) // h), int(min((max_lat + 90) // h, 180 / h - 1)) + 1)
+        total_cols = round(360 / w)
+        first_col = int((min_lon + 180) // w)
+        last_col = int((max_lon + 180) // w)
+        cols = min(last_col - first_col + 1, total_cols)
+        if len(rows) * cols > max_cells:
+            break
+        best = (precision, h, w, rows, first_col, cols, total_cols)
+
+    if best is None:
+        return []
+
+    precision, h, w, rows, first_col, cols, total_cols = best
+    cells = set()
+    for row in rows:
+        cell_lat = (row + 0.5) * h - 90
+        for col in range(first_col, first_col + cols):
+            cell_lon = (col % total_cols + 0.5) * w - 180
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def cell_filter(cells, field="geohash"):
+    """Q() matching rows whose `field` falls under any of the given prefixes."""
+    q = Q()
+    for cell in cells:
+        # Range rather than startswith so every backend can use the B-tree index
+        q |= Q(**{f"{field}__gte": cell, f"{field}__lt": cell + _RANGE_END})
+    return q
+
+
+def nearest(queryset, lat, lon, radius_km, limit):
+    """
+    Returns [(pin_id, distance_km)] for the `limit` pins in queryset nearest to
+    (lat, lon) and within radius_km, nearest first.
+    """
+    cells = covering_cells(lat, lon, radius_km)
+    if cells:
+        queryset = queryset.filter(cell_filter(cells))
+
+    # order_by(): ranking happens here, so skip Pin's default sort
+    candidates = (
+        queryset.filter(latitude__isnull=False)
+        .order_by()
+        .values_list("id", "latitude", "longitude")
+    )
+
+    in_range = (
+        (haversine_km(lat, lon, p_lat, p_lon), pin_id)
+        for pin_id, p_lat, p_lon in candidates.iterator(chunk_size=2000)
+    )
+    in_range = ((d, pin_id) for d, pin_id in in_range if d <= radius_km)
+    return [(pin_id, d) for d, pin_id in heapq.nsmallest(limit, in_range)]
@@ -38,7 +38,7 @@ if (closeFriendsBtn) {
 // ===============================
 async function loadFriendCountOnly() {
   try {
-    const res = await fetch("/api/friends/", { credentials: "same-origin" });
+    const res = await fetch("/api/friends/?limit=1", { credentials: "same-origin" });
     const data = await res.json();
 
     // Only update the pill + modal count text
@@ -56,12 +56,19 @@ async function loadFriendCountOnly() {
 
 async function loadFriendData() {
   try {
-    const res = await fetch("/api/friends/", { credentials: "same-origin" });
-    const data = await res.json();
-
-    renderFriendSummary(data.friend_count);
-    renderIncomingRequests(data.incoming_requests);
-    renderFriendsList(data.friends);
+    // Pending requests and the count come with the first page; friends
+    // accumulate page by page
+    const friends = [];
+    let first = true;
+    await window.fetchPages("/api/friends/", "friends", (page, data) => {
+      if (first) {
+        renderFriendSummary(data.friend_count);
+        renderIncomingRequests(data.incoming_requests);
+        first = false;
+      }
+      friends.push(...page);
+      renderFriendsList(friends);
+    });
 
   } catch (err) {
     console.error("Error loading friends:", err);
@@ -230,28 +237,21 @@ async function viewFriendPins(username) {
   friendsModal.classList.remove("show");
 
   try {
-    const res = await fetch(`/api/pins/${username}/`, {
-      credentials: "same-origin",
+    let first = true;
+    await window.fetchPages(`/api/pins/${username}/`, "pins", (pins) => {
+      // Show pins on globe
+      if (window.showPins) {
+        showPins(pins, { append: !first });
+      }
+
+      // Focus map on first pin
+      if (first && pins.length > 0 && window.moveCameraTo) {
+        const p = pins[0];
+        moveCameraTo(p.lat, p.lon);
+      }
+      first = false;
     });
 
-    if (!res.ok) {
-      console.error("Error loading friend's pins");
-      return;
-    }
-
-    const data = await res.json();
-
-    // Show pins on globe
-    if (window.showPins) {
-      showPins(data.pins);
-    }
-
-    // Focus map on first pin
-    if (data.pins.length > 0 && window.moveCameraTo) {
-      const p = data.pins[0];
-      moveCameraTo(p.lat, p.lon);
-    }
-
   } catch (err) {
     console.error("Error viewing friend pins:", err);
   }
@@ -14,6 +14,8 @@ document.addEventListener("DOMContentLoaded", () => {
   const lbCloseBtn = document.getElementById("lightboxCloseBtn");
 
   let allPhotos = [];
+  let nextCursor = null;
+  let loadingMore = false;
 
   function applyFiltersAndRender() {
     if (!grid) return;
@@ -92,12 +94,20 @@ document.addEventListener("DOMContentLoaded", () => {
     renderPhotos(filtered);
   }
 
+  // Resized variants ({webp, jpeg} srcset strings, or null) so the grid
+  // doesn't download full-size originals
+  function srcsetFor(sets) {
+    return sets ? sets.webp || sets.jpeg || "" : "";
+  }
+
   // Open the lightbox with the given photo object
   function openLightbox(photo) {
     if (!lightbox) return;
 
     // Large image
     if (lbImg) {
+      lbImg.srcset = srcsetFor(photo.srcset);
+      lbImg.sizes = "90vw";
       lbImg.src = photo.imageUrl;
       lbImg.alt = photo.caption || "Pin photo";
     }
@@ -160,28 +170,67 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
-  async function fetchPhotos() {
+  // /api/my-photos/ is paginated; pass the previous page's `next` cursor
+  // to get the following page (null = first page)
+  async function fetchPhotos(cursor = null) {
     try {
-      const res = await fetch("/api/my-photos/", {
+      const url = cursor
+        ? `/api/my-photos/?cursor=${encodeURIComponent(cursor)}`
+        : "/api/my-photos/";
+      const res = await fetch(url, {
         credentials: "same-origin",
       });
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const data = await res.json();
 
       // Normalize photos and precompute Date objects for createdAt
-      allPhotos = (data.photos || []).map((p) => ({
+      const page = (data.photos || []).map((p) => ({
         ...p,
         _createdAtDate: p.createdAt ? new Date(p.createdAt) : null,
       }));
+      allPhotos = cursor ? allPhotos.concat(page) : page;
+      nextCursor = data.next || null;
 
       buildCountryFilter(allPhotos);
       applyFiltersAndRender();
     } catch (err) {
       console.error("Failed to load gallery photos:", err);
-      grid.innerHTML = "<p style='color:#e5e7eb;'>Could not load photos.</p>";
+      if (!cursor) {
+        grid.innerHTML = "<p style='color:#e5e7eb;'>Could not load photos.</p>";
+      }
+    }
+  }
+
+  // Lazy loading: fetch the next page when the end of the grid scrolls into view
+  let moreObserver = null;
+  const sentinel = document.createElement("div");
+  sentinel.style.height = "1px";
+
+  async function loadMorePhotos() {
+    if (!nextCursor || loadingMore) return;
+    loadingMore = true;
+    await fetchPhotos(nextCursor);
+    loadingMore = false;
+
+    // Re-observing fires again right away if the sentinel is still visible
+    // (e.g. a short page on a tall screen)
+    if (moreObserver) {
+      moreObserver.unobserve(sentinel);
+      moreObserver.observe(sentinel);
     }
   }
 
+  if (grid && "IntersectionObserver" in window) {
+    grid.after(sentinel);
+    moreObserver = new IntersectionObserver(
+      (entries) => {
+        if (entries.some((e) => e.isIntersecting)) loadMorePhotos();
+      },
+      { rootMargin: "600px" }
+    );
+    moreObserver.observe(sentinel);
+  }
+
   function buildCountryFilter(photos) {
     if (!countryFilter) return;
     const countries = new Set();
@@ -190,7 +239,9 @@ document.addEventListener("DOMContentLoaded", () => {
       if (p.country) countries.add(p.country);
     });
 
-    // Clear existing options except "All"
+    // Clear existing options except "All" (keeping the current choice,
+    // since this re-runs as more pages load)
+    const selected = countryFilter.value;
     countryFilter.innerHTML = '<option value="">All countries</option>';
 
     Array.from(countries)
@@ -201,6 +252,7 @@ document.addEventListener("DOMContentLoaded", () => {
         opt.textContent = c;
         countryFilter.appendChild(opt);
       });
+    countryFilter.value = selected;
   }
 
   function renderPhotos(photos) {
@@ -239,6 +291,8 @@ document.addEventListener("DOMContentLoaded", () => {
       });
 
       const img = document.createElement("img");
+      img.srcset = srcsetFor(p.srcset);
+      img.sizes = "(max-width: 768px) 50vw, 280px";
       img.src = p.imageUrl;
       img.alt = p.caption || "Pin photo";
       img.style.width = "100%";
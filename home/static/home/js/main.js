@@ -36,14 +36,54 @@ renderer.setClearColor(new THREE.Color(0x000000), 0);
 renderer.setPixelRatio(window.devicePixelRatio);
 renderer.setSize(window.innerWidth, window.innerHeight);
 
+// --- TEXTURE URLS (hashed names + resolution tiers, see home/textures.py) ---
+const GLOBE_TEXTURES = JSON.parse(
+  document.getElementById("globe-textures")?.textContent || "null"
+) || {
+  earth: { original: "/static/home/textures/FINALGLOBE.jpeg", tiers: [] },
+  pinSprite: "/static/home/textures/pin_sprite.png",
+};
+
+const SUPPORTS_WEBP = document
+  .createElement("canvas")
+  .toDataURL("image/webp")
+  .startsWith("data:image/webp");
+
+function tierUrl(tier) {
+  return SUPPORTS_WEBP ? tier.webp : tier.jpeg;
+}
+
+// Smallest tier whose width covers the globe's on-screen circumference,
+// capped by what the GPU can hold; small tier only on Save-Data
+function pickTier(tiers) {
+  const maxSize = renderer.capabilities.maxTextureSize || 4096;
+  const usable = tiers.filter((t) => t.width <= maxSize);
+  if (!usable.length) return null;
+  if (navigator.connection?.saveData) return usable[0];
+
+  const needed =
+    Math.min(window.innerWidth, window.innerHeight) * window.devicePixelRatio * Math.PI;
+  return usable.find((t) => t.width >= needed) || usable[usable.length - 1];
+}
+
 // --- EARTH ---
 const textureLoader = new THREE.TextureLoader();
+const earthTiers = GLOBE_TEXTURES.earth.tiers;
+// Small tier first so the globe shows up quickly, then upgrade in place
 const earthTexture = textureLoader.load(
-  "/static/home/textures/FINALGLOBE.jpeg?v=" + Date.now()
+  earthTiers.length ? tierUrl(earthTiers[0]) : GLOBE_TEXTURES.earth.original
 );
+const targetTier = pickTier(earthTiers);
+if (targetTier && targetTier !== earthTiers[0]) {
+  textureLoader.load(tierUrl(targetTier), (sharper) => {
+    earthMat.map = sharper;
+    earthMat.needsUpdate = true;
+    earthTexture.dispose();
+  });
+}
 
 // --- PIN SPRITE TEXTURE ---
-const pinSpriteTex = textureLoader.load("/static/home/textures/pin_sprite.png");
+const pinSpriteTex = textureLoader.load(GLOBE_TEXTURES.pinSprite);
 const pinSpriteMat = new THREE.SpriteMaterial({
   map: pinSpriteTex,
   transparent: true,
@@ -269,6 +309,12 @@ function createPinMesh(data) {
   return s;
 }
 
+// Resized variants from the API ({webp, jpeg} srcset strings, or null);
+// browsers pick the smallest one that fills the slot
+function srcsetFor(sets) {
+  return sets ? sets.webp || sets.jpeg || "" : "";
+}
+
 function showPopup(screenX, screenY, d) {
   if (
     document.getElementById("pinDetailsModal")?.classList.contains("show") ||
@@ -286,7 +332,7 @@ function showPopup(screenX, screenY, d) {
     <div style="display:flex; gap:10px; align-items:flex-start; max-width:260px;">
       ${
         d.imageUrl
-          ? `<img src="${d.imageUrl}"
+          ? `<img src="${d.imageUrl}" srcset="${srcsetFor(d.imageSrcset)}" sizes="64px"
                  style="width:64px;height:64px;object-fit:cover;border-radius:10px;flex-shrink:0;">`
           : ""
       }
@@ -369,19 +415,22 @@ async function openPinDetails(data) {
   // From here down, use the refreshed payload
   const d = fresh;
 
+  // { url, srcset } per image; list payloads send photo srcsets alongside
   const allImages = [];
   if (d.imageUrl) {
-    allImages.push(d.imageUrl);
+    allImages.push({ url: d.imageUrl, srcset: srcsetFor(d.imageSrcset) });
   }
   if (Array.isArray(d.photos)) {
-    d.photos.forEach((item) => {
+    d.photos.forEach((item, idx) => {
       let url = null;
+      let srcset = srcsetFor((d.photoSrcsets || [])[idx]);
       if (typeof item === "string") {
         url = item;
       } else if (item && typeof item === "object" && "url" in item) {
         url = item.url;
+        srcset = srcsetFor(item.srcset);
       }
-      if (url) allImages.push(url);
+      if (url) allImages.push({ url, srcset });
     });
   }
 
@@ -411,19 +460,24 @@ async function openPinDetails(data) {
   }
   document.getElementById("detailLocation").textContent = prettyLocation;
 
+  mainImg.sizes = "(max-width: 768px) 100vw, 640px";
   if (allImages.length > 0) {
-    mainImg.src = allImages[0];
+    mainImg.srcset = allImages[0].srcset;
+    mainImg.src = allImages[0].url;
     mainImg.style.display = "block";
   } else {
+    mainImg.srcset = "";
     mainImg.src = "";
     mainImg.style.display = "none";
   }
 
   if (thumbsRow) {
     thumbsRow.innerHTML = "";
-    allImages.forEach((url, idx) => {
+    allImages.forEach((image, idx) => {
       const thumb = document.createElement("img");
-      thumb.src = url;
+      thumb.srcset = image.srcset;
+      thumb.sizes = "54px";
+      thumb.src = image.url;
       thumb.style.width = "54px";
       thumb.style.height = "54px";
       thumb.style.objectFit = "cover";
@@ -437,7 +491,8 @@ async function openPinDetails(data) {
       thumb.style.opacity = idx === 0 ? "1" : "0.6";
 
       thumb.onclick = () => {
-        mainImg.src = url;
+        mainImg.srcset = image.srcset;
+        mainImg.src = image.url;
         thumbsRow.querySelectorAll("img").forEach((imgEl) => {
           if (imgEl === thumb) {
             imgEl.style.opacity = "1";
@@ -476,101 +531,187 @@ async function openPinDetails(data) {
   modal.classList.add("show");
 }
 
-async function loadReactions(pinId) {
-  try {
-    const res = await fetch(`/api/pin/${pinId}/`, {
-      credentials: "same-origin",
-    });
-    if (!res.ok) return;
-
-    const data = await res.json();
+// pinId -> { reaction_counts, user_reaction }, filled in bulk by
+// prefetchReactions() whenever pins are drawn on the globe.
+const reactionCache = new Map();
+const REACTION_BATCH_SIZE = 200;
 
-    const trigger = document.getElementById("reactionTrigger");
-    const compact = document.getElementById("reactionCompact");
-    const compactIcons = document.getElementById("reactionCompactIcons");
-    const totalEl = document.getElementById("reactionTotalCount");
-
-    const userReactionEl = document.getElementById("userReaction");
-    const summaryEl = document.getElementById("reactionSummary");
-
-    if (
-      !trigger ||
-      !compact ||
-      !compactIcons ||
-      !totalEl ||
-      !userReactionEl ||
-      !summaryEl
-    ) {
+async function prefetchReactions(pinIds) {
+  const ids = pinIds.filter((id) => id != null && !reactionCache.has(String(id)));
+  for (let i = 0; i < ids.length; i += REACTION_BATCH_SIZE) {
+    const chunk = ids.slice(i, i + REACTION_BATCH_SIZE);
+    try {
+      const res = await fetch(`/api/reactions/batch/?ids=${chunk.join(",")}`, {
+        credentials: "same-origin",
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      Object.entries(data.reactions || {}).forEach(([id, r]) =>
+        reactionCache.set(id, r)
+      );
+    } catch (err) {
+      console.error("Failed to prefetch reactions", err);
       return;
     }
+  }
+}
 
-    const icons = { like: "👍", love: "❤️", laugh: "😂", wow: "😮" };
-    const counts = data.reaction_counts || {};
+async function loadReactions(pinId) {
+  try {
+    let data = reactionCache.get(String(pinId));
+    if (!data) {
+      const res = await fetch(`/api/react/${pinId}/`, {
+        credentials: "same-origin",
+      });
+      if (!res.ok) return;
+      data = await res.json();
+      reactionCache.set(String(pinId), data);
+    }
+    renderReactions(data);
+  } catch (err) {
+    console.error("Failed to load reactions", err);
+  }
+}
 
-    const like = counts.like || 0;
-    const love = counts.love || 0;
-    const laugh = counts.laugh || 0;
-    const wow = counts.wow || 0;
+function renderReactions(data) {
+  const trigger = document.getElementById("reactionTrigger");
+  const compact = document.getElementById("reactionCompact");
+  const compactIcons = document.getElementById("reactionCompactIcons");
+  const totalEl = document.getElementById("reactionTotalCount");
 
-    const total = like + love + laugh + wow;
+  const userReactionEl = document.getElementById("userReaction");
+  const summaryEl = document.getElementById("reactionSummary");
 
-    // Update user's personal reaction label/icon
-    if (data.user_reaction && icons[data.user_reaction]) {
-      userReactionEl.textContent = icons[data.user_reaction];
-      summaryEl.textContent = "Reacted";
-    } else {
-      userReactionEl.textContent = "👍";
-      summaryEl.textContent = "React";
-    }
+  if (
+    !trigger ||
+    !compact ||
+    !compactIcons ||
+    !totalEl ||
+    !userReactionEl ||
+    !summaryEl
+  ) {
+    return;
+  }
 
-    // If no reactions yet => show pill, hide compact
-    if (total === 0) {
-      trigger.classList.remove("hidden");
-      compact.classList.add("hidden");
-      compactIcons.innerHTML = "";
-      totalEl.textContent = "";
-      return;
-    }
+  const icons = { like: "👍", love: "❤️", laugh: "😂", wow: "😮" };
+  const counts = data.reaction_counts || {};
 
-    // If reactions exist => hide pill, show compact
-    trigger.classList.add("hidden");
-    compact.classList.remove("hidden");
+  const like = counts.like || 0;
+  const love = counts.love || 0;
+  const laugh = counts.laugh || 0;
+  const wow = counts.wow || 0;
 
-    // Build compact emoji stack in a nice order
-    const stack = [];
-    if (like > 0) stack.push("like");
-    if (love > 0) stack.push("love");
-    if (laugh > 0) stack.push("laugh");
-    if (wow > 0) stack.push("wow");
+  const total = like + love + laugh + wow;
 
-    compactIcons.innerHTML = stack
-      .map((k) => `<span title="${k}">${icons[k]}</span>`)
-      .join("");
+  // Update user's personal reaction label/icon
+  if (data.user_reaction && icons[data.user_reaction]) {
+    userReactionEl.textContent = icons[data.user_reaction];
+    summaryEl.textContent = "Reacted";
+  } else {
+    userReactionEl.textContent = "👍";
+    summaryEl.textContent = "React";
+  }
 
-    totalEl.textContent = `${total}`;
-  } catch (err) {
-    console.error("Failed to load reactions", err);
+  // If no reactions yet => show pill, hide compact
+  if (total === 0) {
+    trigger.classList.remove("hidden");
+    compact.classList.add("hidden");
+    compactIcons.innerHTML = "";
+    totalEl.textContent = "";
+    return;
   }
+
+  // If reactions exist => hide pill, show compact
+  trigger.classList.add("hidden");
+  compact.classList.remove("hidden");
+
+  // Build compact emoji stack in a nice order
+  const stack = [];
+  if (like > 0) stack.push("like");
+  if (love > 0) stack.push("love");
+  if (laugh > 0) stack.push("laugh");
+  if (wow > 0) stack.push("wow");
+
+  compactIcons.innerHTML = stack
+    .map((k) => `<span title="${k}">${icons[k]}</span>`)
+    .join("");
+
+  totalEl.textContent = `${total}`;
 }
 
+// List endpoints are paginated: follow `next` cursors and hand each page to
+// onPage as soon as it arrives, so the globe fills in progressively.
+async function fetchPages(url, key, onPage) {
+  let cursor = null;
+  do {
+    const sep = url.includes("?") ? "&" : "?";
+    const pageUrl = cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url;
+    const res = await fetch(pageUrl, { credentials: "same-origin" });
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const data = await res.json();
+    onPage(data[key] || [], data);
+    cursor = data.next;
+  } while (cursor);
+}
+window.fetchPages = fetchPages;
+
 async function loadMyPins() {
   try {
-    const res = await fetch("/api/my-pins/", { credentials: "same-origin" });
-    if (!res.ok) throw new Error(`HTTP ${res.status}`);
-    const { pins } = await res.json();
     pinGroup.clear();
-    pins.forEach((p) => {
-      p.isOwner = true;
-      pinGroup.add(createPinMesh(p));
+    await fetchPages("/api/my-pins/", "pins", (pins) => {
+      pins.forEach((p) => {
+        p.isOwner = true;
+        if (p.geocodeStatus === "pending") window.trackPendingPin(p);
+        if (p.lat == null || p.lon == null) return;
+        pinGroup.add(createPinMesh(p));
+      });
     });
   } catch (err) {
     console.error("Failed to load pins:", err);
   }
 }
 
+// Pins saved with deferred geocoding come back as 202 without coordinates
+// (or with their old ones, after an edit). Poll until the worker resolves them.
+const pendingPins = new Set();
+
+window.trackPendingPin = function (pin, delay = 1500) {
+  if (pendingPins.has(pin.id)) return;
+  pendingPins.add(pin.id);
+
+  const poll = async (wait) => {
+    try {
+      const res = await fetch(`/api/pin/${pin.id}/geocode-status/`, {
+        credentials: "same-origin",
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const status = await res.json();
+
+      if (status.geocodeStatus === "resolved") {
+        pendingPins.delete(pin.id);
+        window.addPinToGlobe({ ...pin, ...status });
+        return;
+      }
+      if (status.geocodeStatus === "failed") {
+        pendingPins.delete(pin.id);
+        alert(`Couldn't find "${pin.city || "that location"}" — edit the pin to fix it.`);
+        return;
+      }
+    } catch (err) {
+      console.error("Failed to poll pin status:", err);
+    }
+    setTimeout(() => poll(Math.min(wait * 2, 30000)), wait);
+  };
+
+  setTimeout(() => poll(delay * 2), delay);
+};
+
 window.addPinToGlobe = function (pin) {
   pin.isOwner = true;
 
+  if (pin.geocodeStatus === "pending") window.trackPendingPin(pin);
+  if (pin.lat == null || pin.lon == null) return;
+
   const existing = pinGroup.children.find(
     (obj) => obj.userData && obj.userData.id === pin.id
   );
@@ -888,12 +1029,14 @@ function moveCameraTo(lat, lon) {
   requestAnimationFrame(animateMove);
 }
 
-function showPins(pins) {
-  pinGroup.clear();
+function showPins(pins, { append = false } = {}) {
+  if (!append) pinGroup.clear();
   pins.forEach((p) => {
     p.isOwner = p.user === window.CURRENT_USER;
+    if (p.lat == null || p.lon == null) return;
     pinGroup.add(createPinMesh(p));
   });
+  prefetchReactions(pins.map((p) => p.id));
 }
 
 // 👉 EXPOSE FOR friends.js
@@ -1009,8 +1152,10 @@ document.addEventListener("DOMContentLoaded", () => {
         body: JSON.stringify({ emoji: emojiType }),
       });
 
-      if (res.ok && typeof loadReactions === "function") {
-        loadReactions(pinId);
+      if (res.ok) {
+        const data = await res.json();
+        reactionCache.set(String(pinId), data);
+        renderReactions(data);
       }
     });
   });
@@ -1065,19 +1210,17 @@ let currentMode = "friends";
 async function loadPinsForMode(mode) {
   const url = mode === "friends" ? FRIENDS_PINS_URL : MY_PINS_URL;
 
-  const res = await fetch(url, { credentials: "same-origin" });
-  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  let first = true;
+  await fetchPages(url, "pins", (pins) => {
+    showPins(pins, { append: !first });
 
-  const data = await res.json();
-
-  if (window.showPins) {
-    showPins(data.pins || []);
-  }
-
-  if ((data.pins || []).length > 0 && window.moveCameraTo) {
-    const p = data.pins[0];
-    moveCameraTo(p.lat, p.lon);
-  }
+    // Focus on the newest pin as soon as the first page lands
+    const p = pins.find((pin) => pin.lat != null);
+    if (first && p && window.moveCameraTo) {
+      moveCameraTo(p.lat, p.lon);
+    }
+    first = false;
+  });
 }
 
 if (pinsToggleBtn) {
@@ -0,0 +1,122 @@
+# home/storage.py
+# Content-addressed, deduplicated media storage.
+#
+# ContentAddressedStorage hashes each upload (SHA-256) while streaming it to
+# a temp file under MEDIA_ROOT, then moves it to
+# blobs/<h[:2]>/<h[2:4]>/<h><ext>. If that file already exists, the copy is
+# dropped. The same photo used as a cover, as an extra photo and on
+# several pins is therefore stored once. Its name never changes for
+# different bytes, so its URL can be cached forever.
+#
+# MediaBlob rows count references: every save adds one, and release()
+# (called from signals when a row is deleted or its file replaced) drops
+# one. The file is deleted together with its last reference. Names from
+# before this storage (pins/…, pin_photos/…) aren't counted; media_gc
+# handles those.
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaBlob
+
+BLOB_PREFIX = "blobs/"
+
+
+def blob_name(digest, ext):
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def _retain(name, size):
+    if MediaBlob.objects.filter(name=name).update(refs=F("refs") + 1):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refs=1)
+    except IntegrityError:
+        # Same bytes saved concurrently; theirs created the row
+        MediaBlob.objects.filter(name=name).update(refs=F("refs") + 1)
+
+
+def release(*names):
+    """Drops one reference per name; deletes files nobody refers to any more."""
+    for name in names:
+        if not is_blob(name):
+            continue
+        with transaction.atomic():
+            # The update takes the row (and on SQLite the DB) write lock first,
+            # so a concurrent save of the same bytes can't slip in between
+            # deleting the row and deleting the file
+            MediaBlob.objects.filter(name=name, refs__gt=0).update(refs=F("refs") - 1)
+            if MediaBlob.objects.filter(name=name, refs=0).delete()[0]:
+                default_storage.delete_file(name)
+
+
+def variant_names(variants):
+    """Every file name in an image_variants dict (see home/thumbnails.py)."""
+    return [name for formats in (variants or {}).values() for name in formats.values()]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save; nothing to avoid
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+
+            final = blob_name(digest.hexdigest(), ext)
+            with transaction.atomic():
+                _retain(final, size)
+                path = self.path(final)
+                try:
+                    # Already stored: keep it, but make it look new to
+                    # media_gc's --min-age until our row is committed
+                    os.utime(path)
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                    os.replace(tmp_path, path)
+                else:
+                    os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return final
+
+    def delete(self, name):
+        # FieldFile.delete() means "this row no longer uses the file"
+        if is_blob(name):
+            release(name)
+        else:
+            super().delete(name)
+
+    def delete_file(self, name):
+        """Unconditional removal; release() calls this for the last reference."""
+        super().delete(name)
@@ -1,3 +1,1527 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    clusters, export, friend_graph, gazetteer, geocode_queue, geocoder_client, geocoding,
+    instrumentation, media_serving, pagination, pin_import, reactions, response_cache,
+    serialization, spatial, storage, thumbnails,
+)
+from .models import (
+    CountryStats, FeedEntry, Friendship, GeocodeCacheEntry, GeocodeJob, MediaBlob, Pin, PinCluster, PinPhoto,
+    PinReactionStats, Reaction, TileVersion,
+)
+
+
+# ------------------------------------------------------
+# QUERY PLANS
+# Runs each hot endpoint against a seeded DB and EXPLAINs every SELECT it
+# issues against the app's tables. A plain "SCAN <table>" (no index) means a
+# missing or unusable index, so the test fails before it shows up in prod.
+# ------------------------------------------------------
+
+_FULL_SCAN_RE = re.compile(r"^SCAN (?!CONSTANT ROW)(\S+)(?!.*USING (COVERING )?INDEX)")
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite's")
+@override_settings(SQL_QUERY_BUDGETS_STRICT=True)
+class QueryPlanTests(TestCase):
+    USERS = 8
+    PINS_PER_USER = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"plan{i}", password="x") for i in range(cls.USERS)]
+        cls.me = cls.users[0]
+
+        for i, user in enumerate(cls.users):
+            for j in range(cls.PINS_PER_USER):
+                pin = Pin.objects.create(
+                    user=user, city="Paris", country="France",
+                    latitude=48.0 + i * 0.1 + j * 0.01, longitude=2.3 + j * 0.01,
+                    image="pins/plan.jpg" if j % 3 == 0 else "",
+                )
+                if j % 2 == 0:
+                    PinPhoto.objects.create(pin=pin, image="pin_photos/plan.jpg")
+
+        for friend in cls.users[1:5]:
+            Friendship.objects.create(from_user=cls.me, to_user=friend, status="accepted")
+        Friendship.objects.create(from_user=cls.users[6], to_user=cls.me)
+        Friendship.objects.create(from_user=cls.me, to_user=cls.users[7])
+
+        cls.pin_ids = list(Pin.objects.order_by("id").values_list("id", flat=True))
+        for pin in Pin.objects.filter(id__in=cls.pin_ids[:40]):
+            reactions.set_reaction(pin, cls.users[1], "love")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.me)
+
+    def assertNoFullScans(self, method, url, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, url)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or '"home_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [row[3] for row in cursor.fetchall()]
+            scans = [step for step in plan if _FULL_SCAN_RE.match(step)]
+            self.assertFalse(scans, f"{url} scans a whole table:\n{sql}\n" + "\n".join(plan))
+            checked += 1
+
+        self.assertGreater(checked, 0, f"{url} issued no queries against home tables")
+        return response
+
+    def test_my_pins(self):
+        first = self.assertNoFullScans("get", "/api/my-pins/?limit=10").json()
+        self.assertNoFullScans("get", f"/api/my-pins/?limit=10&cursor={first['next']}")
+
+    def test_user_pins(self):
+        self.assertNoFullScans("get", f"/api/pins/{self.users[2].username}/?limit=10")
+
+    def test_friends_pins_read(self):
+        self.assertNoFullScans("get", "/api/friends-pins/?limit=10")
+
+    @override_settings(FRIENDS_FEED_STRATEGY="write")
+    def test_friends_pins_write(self):
+        from . import feed
+        feed.rebuild_for_user(self.me.id)
+        first = self.assertNoFullScans("get", "/api/friends-pins/?limit=10").json()
+        self.assertNoFullScans("get", f"/api/friends-pins/?limit=10&cursor={first['next']}")
+
+    def test_friend_list(self):
+        self.assertNoFullScans("get", "/api/friends/")
+
+    def test_friend_request(self):
+        self.assertNoFullScans("post", f"/api/friend-request/{self.users[5].username}/")
+
+    def test_my_photos(self):
+        first = self.assertNoFullScans("get", "/api/my-photos/?limit=5").json()
+        self.assertNoFullScans("get", f"/api/my-photos/?limit=5&cursor={first['next']}")
+
+    def test_get_pin(self):
+        self.assertNoFullScans("get", f"/api/pin/{self.pin_ids[0]}/")
+
+    def test_react_to_pin(self):
+        self.assertNoFullScans("get", f"/api/react/{self.pin_ids[0]}/")
+
+    def test_reactions_batch(self):
+        ids = ",".join(map(str, self.pin_ids[:50]))
+        self.assertNoFullScans("get", f"/api/reactions/batch/?ids={ids}")
+
+    def test_pin_clusters(self):
+        self.assertNoFullScans("get", "/api/pin-clusters/?level=4&scope=friends")
+        self.assertNoFullScans("get", "/api/pin-clusters/?level=6&bbox=2,47,4,50")
+
+    def test_pin_tile(self):
+        self.assertNoFullScans("get", "/api/pin-tiles/6/32/16/?scope=friends")
+
+    def test_search_location(self):
+        self.assertNoFullScans("get", "/api/search/?q=Paris, France")
+
+
+# ------------------------------------------------------
+# GEOCODE QUEUE
+# ------------------------------------------------------
+
+class GeocodeQueueTests(TestCase):
+    def setUp(self):
+        self.pin = Pin.objects.create(user=User.objects.create_user("queued", password="x"), city="Paris")
+        geocode_queue.enqueue(self.pin)
+
+    def claim(self):
+        (job,) = geocode_queue.claim_jobs(1)
+        return job
+
+    def edit(self, city):
+        self.pin.city = city
+        self.pin.save()
+        geocode_queue.enqueue(self.pin)
+
+    def test_resolves(self):
+        job = self.claim()
+        with mock.patch.object(geocode_queue, "geocode_location", return_value=(48.8, 2.3)):
+            self.assertEqual(geocode_queue.process_job(job), "resolved")
+        self.pin.refresh_from_db()
+        self.assertEqual((self.pin.latitude, self.pin.geocode_status), (48.8, "resolved"))
+        self.assertFalse(GeocodeJob.objects.exists())
+
+    def test_edit_while_leased_keeps_the_new_job(self):
+        job = self.claim()
+        self.edit("Lyon")
+        with mock.patch.object(geocode_queue, "geocode_location", return_value=(48.8, 2.3)):
+            self.assertEqual(geocode_queue.process_job(job), "stale")
+        self.pin.refresh_from_db()
+        self.assertEqual((self.pin.latitude, self.pin.geocode_status), (None, "pending"))
+        self.assertIsNone(GeocodeJob.objects.get(pin=self.pin).locked_until)
+
+        # The edit committed but enqueue() hasn't reset the job yet
+        job = self.claim()
+        Pin.objects.filter(pk=self.pin.pk).update(city="Nice")
+        with mock.patch.object(geocode_queue, "geocode_location", return_value=(45.7, 4.8)):
+            self.assertEqual(geocode_queue.process_job(job), "stale")
+        self.assertTrue(GeocodeJob.objects.filter(pin=self.pin).exists())
+
+    def test_retry_does_not_clobber_a_reset_job(self):
+        job = self.claim()
+        self.edit("Lyon")
+        with mock.patch.object(geocode_queue, "geocode_location", return_value=None):
+            self.assertEqual(geocode_queue.process_job(job), "stale")
+        fresh = GeocodeJob.objects.get(pin=self.pin)
+        self.assertEqual(fresh.attempts, 0)
+        self.assertLessEqual(fresh.run_after, timezone.now())
+
+    def test_failure_marks_failed_and_bumps_tiles(self):
+        # Still showing where it was before an edit
+        self.pin.latitude, self.pin.longitude = 48.8, 2.3
+        self.pin.save()
+        GeocodeJob.objects.update(attempts=geocode_queue.MAX_ATTEMPTS - 1)
+        job = self.claim()
+        before = TileVersion.objects.get(user=self.pin.user, z=0).version
+        with mock.patch.object(geocode_queue, "geocode_location", return_value=None), \
+                self.assertLogs("home.geocode_queue", "WARNING"):
+            self.assertEqual(geocode_queue.process_job(job), "failed")
+        self.pin.refresh_from_db()
+        self.assertEqual(self.pin.geocode_status, "failed")
+        self.assertEqual(TileVersion.objects.get(user=self.pin.user, z=0).version, before + 1)
+
+
+# ------------------------------------------------------
+# PIN CLUSTERS
+# ------------------------------------------------------
+
+class PinClusterTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user("clustered", password="x")
+
+    def snapshot(self):
+        rows = PinCluster.objects.filter(user=self.me)
+        for c in rows:
+            in_cell = set(
+                Pin.objects.filter(user=self.me, geohash__startswith=c.cell).values_list("id", flat=True)
+            )
+            self.assertTrue(c.sample_ids, c.cell)
+            self.assertLessEqual(len(c.sample_ids), clusters.SAMPLE_SIZE)
+            self.assertLessEqual(set(c.sample_ids), in_cell, c.cell)
+        return {c.cell: (c.count, round(c.lat_sum, 6), round(c.lon_sum, 6)) for c in rows}
+
+    def test_incremental_matches_rebuild(self):
+        pins = [
+            Pin.objects.create(
+                user=self.me, city=str(i), latitude=48.8 + i / 100, longitude=2.3 + i / 100,
+            )
+            for i in range(8)
+        ]
+        Pin.objects.create(user=self.me, city="Pending")  # no coordinates, no clusters
+        far = Pin.objects.create(user=self.me, city="Sydney", latitude=-33.9, longitude=151.2)
+
+        # Move one across the world and back to Europe, delete others
+        far.latitude, far.longitude = 40.7, -74.0
+        far.save()
+        pins[0].latitude, pins[0].longitude = 51.5, -0.1
+        pins[0].save()
+        for pin in pins[1:6]:  # empties some samples, which get refilled
+            pin.delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental[far.geohash[:1]][0], 1)
+        clusters.rebuild_for_user(self.me.id)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_concurrently_created_rows_get_the_sample(self):
+        first = Pin.objects.create(user=self.me, city="Paris", latitude=48.8, longitude=2.3)
+        real = PinCluster.objects.select_for_update
+        calls = []
+
+        def racing(*args, **kwargs):
+            # The first lookup misses the rows, as if another writer's insert
+            # hadn't committed yet; bulk_create then hits the constraint
+            calls.append(1)
+            return PinCluster.objects.none() if len(calls) == 1 else real(*args, **kwargs)
+
+        with mock.patch.object(PinCluster.objects, "select_for_update", racing):
+            clusters.add_pin(self.me.id, 999, first.geohash, 48.8, 2.3)
+
+        self.assertEqual(len(calls), 2)
+        for c in PinCluster.objects.filter(user=self.me):
+            self.assertEqual(c.count, 2)
+            self.assertEqual(c.sample_ids, [first.id, 999])
+
+    def test_usernames_matching_old_routes_resolve(self):
+        for name in ("clusters", "tiles"):
+            user = User.objects.create_user(name, password="x")
+            Pin.objects.create(user=user, city="Paris", latitude=48.8, longitude=2.3)
+            self.client.force_login(user)
+            response = self.client.get(f"/api/pins/{name}/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["pins"][0]["user"], name)
+
+        self.client.force_login(self.me)
+        Pin.objects.create(user=self.me, city="Paris", latitude=48.8, longitude=2.3)
+        response = self.client.get("/api/pin-clusters/?level=1")
+        self.assertEqual(response.json()["clusters"][0]["count"], 1)
+
+
+# ------------------------------------------------------
+# PIN TILES
+# ------------------------------------------------------
+
+class PinTileTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user("tiler", password="x")
+        self.client.force_login(self.me)
+
+    def tile(self, z, x, y, **headers):
+        return self.client.get(f"/api/pin-tiles/{z}/{x}/{y}/", **headers)
+
+    def test_edges_belong_to_exactly_one_tile(self):
+        corners = [(90.0, 180.0), (-90.0, -180.0), (0.0, 0.0), (90.0, -180.0), (-90.0, 180.0)]
+        for lat, lon in corners:
+            Pin.objects.create(user=self.me, city="Edge", latitude=lat, longitude=lon)
+        for z in (0, 1, 3):
+            found = []
+            for x in range(2 ** z):
+                for y in range(2 ** z):
+                    found += [(p["lat"], p["lon"]) for p in self.tile(z, x, y).json()["pins"]]
+            self.assertCountEqual(found, corners, z)
+
+    def test_rename_changes_etag(self):
+        Pin.objects.create(user=self.me, city="Paris", latitude=48.8, longitude=2.3)
+        etag = self.tile(0, 0, 0)["ETag"]
+        self.assertEqual(self.tile(0, 0, 0, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.me.last_login = timezone.now()
+        self.me.save(update_fields=["last_login"])
+        self.assertEqual(self.tile(0, 0, 0, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.me.username = "renamed"
+        self.me.save()
+        response = self.tile(0, 0, 0, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pins"][0]["user"], "renamed")
+
+    def test_enqueue_changes_etag(self):
+        pin = Pin.objects.create(user=self.me, city="Paris", latitude=48.8, longitude=2.3)
+        etag = self.tile(0, 0, 0)["ETag"]
+        geocode_queue.enqueue(pin)
+        response = self.tile(0, 0, 0, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["pins"][0]["geocodeStatus"], "pending")
+
+
+# ------------------------------------------------------
+# SPATIAL
+# Brute force against haversine: every point inside the radius must fall in
+# bounding_box() and under one of the covering cells.
+# ------------------------------------------------------
+
+def _in_box(lat, lon, box):
+    min_lat, max_lat, min_lon, max_lon = box
+    return min_lat <= lat <= max_lat and any(
+        min_lon <= lon + shift <= max_lon for shift in (-360.0, 0.0, 360.0)
+    )
+
+
+class SpatialTests(SimpleTestCase):
+    def assertCovers(self, lat, lon, radius_km, points):
+        box = spatial.bounding_box(lat, lon, radius_km)
+        cells = spatial.covering_cells(lat, lon, radius_km)
+        for p_lat, p_lon in points:
+            if spatial.haversine_km(lat, lon, p_lat, p_lon) > radius_km:
+                continue
+            self.assertTrue(_in_box(p_lat, p_lon, box), (lat, lon, radius_km, p_lat, p_lon, box))
+            if cells:
+                geohash = spatial.encode(p_lat, p_lon)
+                self.assertTrue(any(geohash.startswith(c) for c in cells), (lat, lon, radius_km, p_lat, p_lon))
+
+    def test_reported_high_latitude_cases(self):
+        self.assertCovers(58.04, -179.57, 2500, [(68.07, -134.21)])
+        self.assertCovers(84.5, 10, 550, [(87, 65)])
+
+    def test_random_circles(self):
+        rng = random.Random(4)
+        for _ in range(300):
+            lat, lon = rng.uniform(-89, 89), rng.uniform(-180, 180)
+            radius = rng.choice([1, 50, 500, 2500])
+            # Points scattered around the centre, out to ~2x the radius
+            spread = min(180.0, 2 * radius / 111.0)
+            points = [
+                (max(-90.0, min(90.0, lat + rng.uniform(-spread, spread))),
+                 (lon + rng.uniform(-180, 180) + 180) % 360 - 180)
+                for _ in range(200)
+            ]
+            self.assertCovers(lat, lon, radius, points)
+
+    def test_antimeridian(self):
+        box = spatial.bounding_box(0.0, 179.9, 100)
+        self.assertGreater(box[3], 180.0)
+        self.assertCovers(0.0, 179.9, 100, [(0.0, -179.5), (0.5, 179.5)])
+        self.assertCovers(-40.0, -179.8, 300, [(-41.0, 178.5), (-39.0, -177.0)])
+
+    def test_near_poles(self):
+        self.assertEqual(spatial.bounding_box(89.5, 0, 100)[2:], (-180.0, 180.0))
+        self.assertEqual(spatial.bounding_box(-88.0, 45, 500)[2:], (-180.0, 180.0))
+        self.assertCovers(89.5, 0, 100, [(89.6, 180.0), (89.2, -90.0)])
+        self.assertCovers(-85.0, 120, 400, [(-87.5, 170.0), (-83.0, 140.0)])
+
+
+# ------------------------------------------------------
+# CURSOR PAGINATION
+# ------------------------------------------------------
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = User.objects.create_user("paged", password="x")
+        for i in range(7):
+            Pin.objects.create(user=cls.me, city=f"City {i}", latitude=10.0 + i, longitude=20.0)
+        # Ties on created_at: only the id tells these apart
+        moment = timezone.now()
+        tied = Pin.objects.filter(user=cls.me).order_by("id").values_list("id", flat=True)[1:5]
+        Pin.objects.filter(id__in=list(tied)).update(created_at=moment)
+        cls.expected = list(
+            Pin.objects.filter(user=cls.me).order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.me)
+
+    def test_pages_cover_every_pin_once_in_order(self):
+        for limit in (1, 2, 3, 7, 50):
+            seen, cursor = [], None
+            while True:
+                url = f"/api/my-pins/?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+                page = self.client.get(url).json()
+                self.assertLessEqual(len(page["pins"]), limit)
+                seen += [pin["id"] for pin in page["pins"]]
+                cursor = page["next"]
+                if cursor is None:
+                    break
+            self.assertEqual(seen, self.expected, limit)
+
+    def test_in_memory_pages_match(self):
+        pins = list(Pin.objects.filter(user=self.me).order_by("-created_at", "-pk"))
+        cursor = None
+        while True:
+            rows, next_db = pagination.paginate(Pin.objects.filter(user=self.me), cursor, 3)
+            listed, next_list = pagination.paginate_list(pins, cursor, 3)
+            self.assertEqual(rows, listed)
+            self.assertEqual(next_db, next_list)
+            if next_db is None:
+                break
+            cursor = pagination.decode_cursor(next_db)
+
+    def test_invalid_cursor_or_limit_is_400(self):
+        for query in ("cursor=garbage", "cursor=W10", "cursor=%5B%5D", "limit=ten"):
+            response = self.client.get(f"/api/my-pins/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json()["error"], "Invalid cursor")
+        self.assertEqual(len(self.client.get("/api/my-pins/?limit=0").json()["pins"]), 1)
+
+
+# ------------------------------------------------------
+# REACTION COUNTERS
+# ------------------------------------------------------
+
+class ReactionCounterTests(TestCase):
+    def setUp(self):
+        self.owner, self.a, self.b = (
+            User.objects.create_user(name, password="x") for name in ("owner", "ra", "rb")
+        )
+        self.pin = Pin.objects.create(user=self.owner, city="Paris", latitude=48.8, longitude=2.3)
+
+    def counts(self):
+        return reactions.stats_counts(self.pin.id)
+
+    def test_set_change_and_delete(self):
+        reactions.set_reaction(self.pin, self.a, "like")
+        reactions.set_reaction(self.pin, self.b, "like")
+        self.assertEqual(self.counts(), {"like": 2, "love": 0, "laugh": 0, "wow": 0})
+
+        reactions.set_reaction(self.pin, self.a, "love")
+        reactions.set_reaction(self.pin, self.a, "love")  # unchanged: no double count
+        self.assertEqual(self.counts(), {"like": 1, "love": 1, "laugh": 0, "wow": 0})
+
+        Reaction.objects.get(user=self.b).delete()
+        self.assertEqual(self.counts(), {"like": 0, "love": 1, "laugh": 0, "wow": 0})
+
+        # The view answers from the counters, with the viewer's own emoji
+        self.client.force_login(self.a)
+        data = self.client.get(f"/api/react/{self.pin.id}/").json()
+        self.assertEqual((data["reaction_counts"]["love"], data["user_reaction"]), (1, "love"))
+
+    def test_reconcile_repairs_drift(self):
+        reactions.set_reaction(self.pin, self.a, "like")
+        reactions.set_reaction(self.pin, self.b, "laugh")
+        other = Pin.objects.create(user=self.owner, city="Lyon", latitude=45.7, longitude=4.8)
+        # Writes that went around set_reaction()
+        PinReactionStats.objects.filter(pk=self.pin.pk).update(like=7, wow=3)
+        Reaction.objects.bulk_create([Reaction(pin=other, user=self.a, emoji="wow")])
+
+        out = io.StringIO()
+        call_command("reconcile_reactions", "--dry-run", stdout=out)
+        self.assertIn("1 missing rows, 1 drifted rows.", out.getvalue())
+        self.assertEqual(self.counts()["like"], 7)
+
+        call_command("reconcile_reactions", stdout=io.StringIO())
+        self.assertEqual(self.counts(), {"like": 1, "love": 0, "laugh": 1, "wow": 0})
+        self.assertEqual(reactions.stats_counts(other.id)["wow"], 1)
+
+        out = io.StringIO()
+        call_command("reconcile_reactions", stdout=out)
+        self.assertIn("0 missing rows, 0 drifted rows.", out.getvalue())
+
+
+# ------------------------------------------------------
+# FRIEND GRAPH
+# ------------------------------------------------------
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b = (User.objects.create_user(name, password="x") for name in ("ga", "gb"))
+
+    def test_cached_after_first_read(self):
+        with self.assertNumQueries(1):
+            friend_graph.get(self.a.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_graph.friend_ids(self.a.id), [])
+
+    def test_writes_invalidate_both_sides_on_commit(self):
+        for user in (self.a, self.b):
+            friend_graph.get(user.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            request = Friendship.objects.create(from_user=self.a, to_user=self.b)
+        # Not before the commit: a reader could re-cache the old rows
+        self.assertEqual(friend_graph.get(self.a.id).outgoing, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual([e.user_id for e in friend_graph.get(self.a.id).outgoing], [self.b.id])
+        self.assertEqual([e.pk for e in friend_graph.get(self.b.id).incoming], [request.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request.status = "accepted"
+            request.save()
+        self.assertEqual(friend_graph.friend_ids(self.a.id), [self.b.id])
+        self.assertEqual(friend_graph.friend_ids(self.b.id), [self.a.id])
+        self.assertEqual(friend_graph.get(self.b.id).incoming, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request.delete()
+        self.assertEqual(friend_graph.friend_ids(self.a.id), [])
+        self.assertEqual(friend_graph.friend_ids(self.b.id), [])
+
+
+# ------------------------------------------------------
+# FRIENDS FEED
+# ------------------------------------------------------
+
+@override_settings(FRIENDS_FEED_STRATEGY="write")
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b, self.c = (
+            User.objects.create_user(name, password="x") for name in ("fa", "fb", "fc")
+        )
+        self.a_pins = [
+            Pin.objects.create(user=self.a, city=f"A{i}", latitude=10.0 + i, longitude=10.0)
+            for i in range(2)
+        ]
+        self.b_pin = Pin.objects.create(user=self.b, city="B", latitude=20.0, longitude=20.0)
+        Pin.objects.create(user=self.c, city="C", latitude=30.0, longitude=30.0)
+
+    def feed_of(self, user):
+        return set(FeedEntry.objects.filter(owner=user).values_list("pin_id", flat=True))
+
+    def befriend(self, a, b):
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship = Friendship.objects.create(from_user=a, to_user=b)
+        self.assertFalse(FeedEntry.objects.filter(owner=b, author=a).exists())  # pending: nothing yet
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship.status = "accepted"
+            friendship.save()
+        return friendship
+
+    def test_link_fan_out_and_unlink(self):
+        friendship = self.befriend(self.a, self.b)
+        self.assertEqual(self.feed_of(self.b), {p.id for p in self.a_pins})
+        self.assertEqual(self.feed_of(self.a), {self.b_pin.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Pin.objects.create(user=self.a, city="A new", latitude=12.0, longitude=10.0)
+        self.assertIn(new.id, self.feed_of(self.b))
+        self.assertNotIn(new.id, self.feed_of(self.c))
+
+        # The page matches fan-out-on-read, newest first
+        self.client.force_login(self.b)
+        written = [p["id"] for p in self.client.get("/api/friends-pins/").json()["pins"]]
+        with override_settings(FRIENDS_FEED_STRATEGY="read"):
+            read = [p["id"] for p in self.client.get("/api/friends-pins/").json()["pins"]]
+        self.assertEqual(written, read)
+        self.assertEqual(written[0], new.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship.delete()
+        self.assertEqual(self.feed_of(self.a), set())
+        self.assertEqual(self.feed_of(self.b), set())
+
+    def test_rebuild_repairs_drift(self):
+        self.befriend(self.a, self.b)
+        self.befriend(self.c, self.b)
+        expected = {user.id: self.feed_of(user) for user in (self.a, self.b, self.c)}
+
+        # Writes that bypassed the signals
+        FeedEntry.objects.filter(owner=self.b, author=self.a).delete()
+        Friendship.objects.filter(from_user=self.c).update(status="pending")
+        Pin.objects.bulk_create([Pin(user=self.a, city="Bulk", latitude=1.0, longitude=1.0)])
+        bulk = Pin.objects.get(city="Bulk")
+        expected[self.b.id] = (expected[self.b.id] | {bulk.id}) - set(
+            Pin.objects.filter(user=self.c).values_list("id", flat=True)
+        )
+        expected[self.c.id] = set()
+
+        call_command("rebuild_feed", stdout=io.StringIO())
+        self.assertEqual({user.id: self.feed_of(user) for user in (self.a, self.b, self.c)}, expected)
+
+
+# ------------------------------------------------------
+# RESPONSE CACHE
+# ------------------------------------------------------
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = User.objects.create_user("cached", password="x")
+        cls.pin = Pin.objects.create(user=cls.me, city="Paris", latitude=48.8, longitude=2.3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.me)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get("/api/my-pins/")
+        self.assertEqual(first["X-Response-Cache"], "miss")
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/api/my-pins/")
+        self.assertEqual(second["X-Response-Cache"], "hit")
+        self.assertEqual(second.content, first.content)
+        self.assertFalse([q for q in ctx.captured_queries if '"home_' in q["sql"]])
+
+    def test_etag_revalidates_with_304(self):
+        etag = self.client.get("/api/my-pins/")["ETag"]
+        response = self.client.get("/api/my-pins/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_pin_write_invalidates(self):
+        etag = self.client.get(f"/api/pins/{self.me.username}/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pin.caption = "updated"
+            self.pin.save()
+
+        response = self.client.get(f"/api/pins/{self.me.username}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Response-Cache"], "miss")
+        self.assertEqual(response.json()["pins"][0]["caption"], "updated")
+
+    def test_version_in_another_process_expires(self):
+        # Two workers, each with its own LocMemCache: a write in one can't
+        # reach the other, whose pages must still go stale after the TTL
+        workers = [
+            LocMemCache(f"worker-{n}", {"TIMEOUT": None, "OPTIONS": {}}) for n in range(2)
+        ]
+
+        def get(worker, etag=None, when=None):
+            headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+            with mock.patch.object(response_cache, "cache", worker), \
+                    mock.patch.object(response_cache, "_store", return_value=worker), \
+                    mock.patch("django.core.cache.backends.locmem.time") as clock:
+                clock.time.return_value = when or time.time()
+                return self.client.get("/api/my-pins/", **headers)
+
+        etag = get(workers[1])["ETag"]
+        with mock.patch.object(response_cache, "cache", workers[0]), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.pin.caption = "updated"
+            self.pin.save()
+
+        self.assertEqual(get(workers[1], etag).status_code, 304)
+        later = time.time() + settings.RESPONSE_CACHE_TTL + 1
+        response = get(workers[1], etag, when=later)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pins"][0]["caption"], "updated")
+
+    def test_pages_are_cached_separately(self):
+        Pin.objects.create(user=self.me, city="Lyon", latitude=45.7, longitude=4.8)
+        first = self.client.get("/api/my-pins/?limit=1").json()
+        second = self.client.get(f"/api/my-pins/?limit=1&cursor={first['next']}").json()
+        self.assertNotEqual(first["pins"][0]["id"], second["pins"][0]["id"])
+
+
+# ------------------------------------------------------
+# SQL INSTRUMENTATION
+# ------------------------------------------------------
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("inst", password="x")
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get("/api/my-pins/")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=')
+
+    @override_settings(SQL_QUERY_BUDGETS={"my_pins": 1}, SQL_QUERY_BUDGETS_STRICT=True)
+    def test_budget_exceeded_raises_when_strict(self):
+        with self.assertRaises(instrumentation.QueryBudgetExceeded):
+            self.client.get("/api/my-pins/")
+
+    @override_settings(SQL_DUPLICATE_THRESHOLD=2)
+    def test_repeated_query_is_logged(self):
+        for _ in range(3):
+            Pin.objects.create(user=self.user, city="Paris", latitude=48.8, longitude=2.3)
+
+        def n_plus_one(request):
+            for pin in Pin.objects.all():
+                User.objects.get(pk=pin.user_id)
+            return HttpResponse()
+
+        middleware = instrumentation.SQLInstrumentationMiddleware(n_plus_one)
+        with self.assertLogs("home.instrumentation", "WARNING") as logs:
+            middleware(RequestFactory().get("/"))
+        self.assertIn("repeated 3 times", logs.output[0])
+
+    def test_fingerprint_folds_literals_and_in_lists(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) AND "x" = 5'),
+            instrumentation.fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "x" = 7'),
+        )
+
+
+# ------------------------------------------------------
+# IMAGE VARIANTS
+# ------------------------------------------------------
+
+def _jpeg(width, height, orientation=None):
+    img = Image.new("RGB", (width, height), "red")
+    exif = Image.Exif()
+    exif[0x010F] = "TestCam"  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    out = BytesIO()
+    img.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+class ThumbnailTests(TestCase):
+    def test_widths_orientation_and_metadata(self):
+        # Orientation 6: stored landscape, displayed portrait
+        rendered = thumbnails.render_variants(_jpeg(800, 400, orientation=6), [320, 640, 1280], 80)
+        self.assertEqual(sorted(rendered), [320])  # 400 wide once rotated; never upscaled
+
+        for fmt, payload in rendered[320].items():
+            with Image.open(BytesIO(payload)) as img:
+                self.assertEqual(img.format, thumbnails.FORMATS[fmt])
+                self.assertEqual(img.size, (320, 640))
+                self.assertFalse(img.getexif())
+
+    def test_small_image_keeps_its_size(self):
+        rendered = thumbnails.render_variants(_jpeg(100, 50), [320, 640], 80)
+        self.assertEqual(sorted(rendered), [100])
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, IMAGE_VARIANT_WIDTHS=[64, 128])
+    def test_build_many_stores_by_content_and_skips_bad_files(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            good = SimpleUploadedFile("a.jpg", _jpeg(300, 200), "image/jpeg")
+            bad = SimpleUploadedFile("b.jpg", b"not an image", "image/jpeg")
+            with self.assertLogs("home.thumbnails", "WARNING"):
+                variants, broken = thumbnails.build_many([good, bad])
+
+            self.assertEqual(broken, {})
+            self.assertEqual(sorted(variants), ["128", "64"])
+            self.assertTrue(variants["64"]["webp"].endswith(".webp"))
+            self.assertEqual(good.tell(), 0)
+
+            again = SimpleUploadedFile("copy.jpg", _jpeg(300, 200), "image/jpeg")
+            self.assertEqual(thumbnails.build_many([again]), [variants])
+
+            request = RequestFactory().get("/")
+            urls = serialization.MediaUrls(request)
+            sets = urls.srcsets(variants)
+            self.assertRegex(sets["jpeg"], r"\.jpg 64w, .*\.jpg 128w$")
+            self.assertIsNone(urls.srcsets({}))
+
+
+# ------------------------------------------------------
+# CONTENT-ADDRESSED STORAGE
+# ------------------------------------------------------
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.pin = Pin.objects.create(
+            user=User.objects.create_user("cas", password="x"), city="Paris", latitude=48.8, longitude=2.3,
+        )
+
+    def upload(self, name):
+        return PinPhoto.objects.create(
+            pin=self.pin, image=SimpleUploadedFile(name, b"same bytes", "image/jpeg"),
+        )
+
+    def test_same_bytes_are_stored_once_and_counted(self):
+        first, second = self.upload("a.JPG"), self.upload("b.jpg")
+        name = first.image.name
+        self.assertEqual(name, second.image.name)
+        self.assertRegex(name, r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, IMAGE_VARIANT_WIDTHS=[64])
+    def test_replacing_the_cover_rebuilds_its_variants(self):
+        self.pin.image = SimpleUploadedFile("a.jpg", _jpeg(100, 50), "image/jpeg")
+        self.pin.save()
+        old = storage.variant_names(self.pin.image_variants)
+        self.assertEqual(len(old), 2)
+
+        # The admin form sets only the image
+        self.pin.image = SimpleUploadedFile("b.jpg", _jpeg(100, 100), "image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pin.save()
+        self.pin.refresh_from_db()
+        new = storage.variant_names(self.pin.image_variants)
+        self.assertEqual(len(new), 2)
+        self.assertFalse(set(old) & set(new))
+        self.assertFalse(MediaBlob.objects.filter(name__in=old).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pin.image = None
+            self.pin.save(update_fields=["image"])
+        self.pin.refresh_from_db()
+        self.assertEqual(self.pin.image_variants, {})
+        self.assertFalse(MediaBlob.objects.filter(name__in=new).exists())
+
+    def test_dedupe_hit_refreshes_mtime(self):
+        name = self.upload("a.jpg").image.name
+        path = default_storage.path(name)
+        os.utime(path, (0, 0))
+        self.upload("b.jpg")
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+
+class MediaGCTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.root = media.name
+
+    def file(self, name, age_hours=48):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 10)
+        stamp = time.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command("media_gc", *args, stdout=out)
+        return out.getvalue()
+
+    def test_only_old_unreferenced_files_go(self):
+        user = User.objects.create_user("gc", password="x")
+        pin = Pin.objects.create(user=user, city="Paris", latitude=48.8, longitude=2.3)
+        photo = PinPhoto.objects.create(pin=pin, image=SimpleUploadedFile("a.jpg", b"photo", "image/jpeg"))
+        used = default_storage.path(photo.image.name)
+        os.utime(used, (0, 0))
+
+        orphan = self.file("pin_photos/gone.jpg")
+        young = self.file("pin_photos/new.jpg", age_hours=1)
+        # Counted, but the upload's row isn't committed yet
+        in_flight, dead = storage.blob_name("ab" * 32, ".jpg"), storage.blob_name("ef" * 32, ".jpg")
+        MediaBlob.objects.create(name=in_flight, size=10, refs=1)
+        MediaBlob.objects.create(name=dead, size=10, refs=0)
+        in_flight, dead_blob = self.file(in_flight), self.file(dead)
+
+        self.assertIn("Found 2 orphans", self.gc())
+        self.assertTrue(os.path.exists(orphan))
+
+        self.assertIn("Deleted 2 orphans", self.gc("--delete"))
+        for path in (used, young, in_flight):
+            self.assertTrue(os.path.exists(path), path)
+        for path in (orphan, dead_blob):
+            self.assertFalse(os.path.exists(path), path)
+        self.assertFalse(os.path.isdir(os.path.dirname(dead_blob)))
+        self.assertFalse(MediaBlob.objects.filter(refs=0).exists())
+
+
+# ------------------------------------------------------
+# MEDIA SERVING
+# ------------------------------------------------------
+
+class MediaServingTests(TestCase):
+    DATA = b"0123456789"
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.name = default_storage.save("pin_photos/x.jpg", ContentFile(self.DATA))
+        self.url = "/media/" + self.name
+
+    def test_blob_is_immutable_and_revalidates(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), self.DATA)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # Stale If-Range: whole file
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_parse_range_edges(self):
+        self.assertEqual(media_serving.parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(media_serving.parse_range("bytes=-30", 10), (0, 9))
+        self.assertEqual(media_serving.parse_range("bytes=0-99", 10), (0, 9))
+        self.assertIsNone(media_serving.parse_range("bytes=0-1,4-5", 10))
+        for header in ("bytes=-0", "bytes=10-"):
+            self.assertEqual(media_serving.parse_range(header, 10), "unsatisfiable")
+        # Empty file: no byte range can be satisfied
+        for header in ("bytes=-5", "bytes=0-", "bytes=0-0"):
+            self.assertEqual(media_serving.parse_range(header, 0), "unsatisfiable")
+
+        name = default_storage.save("pin_photos/empty.jpg", ContentFile(b""))
+        response = self.client.get("/media/" + name, HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */0")
+
+    def test_traversal_and_missing(self):
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/blobs/nope.jpg").status_code, 404)
+
+    @override_settings(MEDIA_ACCEL="nginx")
+    def test_nginx_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.name)
+        self.assertEqual(response.content, b"")
+
+
+# ------------------------------------------------------
+# GAZETTEER
+# Against the bundled home/data/gazetteer.tsv.
+# ------------------------------------------------------
+
+class GazetteerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gaz = gazetteer.Gazetteer.from_file(gazetteer.DEFAULT_PATH)
+
+    def where(self, *parts):
+        """(name, country code, admin1 code) of the resolved row, or None."""
+        row = self.gaz.resolve(parts)
+        if row is None:
+            return None
+        codes = self.gaz.codes
+        return self.gaz.names[row], codes[self.gaz.country[row]], codes[self.gaz.admin1[row]]
+
+    def test_index_is_sorted_and_finds_every_name(self):
+        self.assertEqual(self.gaz._keys, sorted(self.gaz._keys))
+        for key in (self.gaz._keys[0], self.gaz._keys[-1], "paris", "sao paulo"):
+            rows = list(self.gaz._exact(key))
+            self.assertTrue(rows, key)
+            self.assertEqual(len(rows), self.gaz._keys.count(key))
+        self.assertEqual(list(self.gaz._exact("parisx")), [])
+
+    def test_folding_and_alternate_names(self):
+        self.assertEqual(self.where("São Paulo")[1], "BR")
+        self.assertEqual(self.where("sao  paulo")[1], "BR")
+        self.assertEqual(self.where("München")[0], "Munich")
+        self.assertEqual(self.where("Zürich", "Switzerland")[0], "Zurich")
+
+    def test_ambiguous_names_prefer_the_most_populous(self):
+        self.assertEqual(self.where("Paris")[1], "FR")
+        self.assertEqual(self.where("Springfield")[2], "MO")
+        self.assertEqual(self.where("Portland")[2], "OR")
+
+    def test_country_and_admin1_qualifiers(self):
+        self.assertEqual(self.where("Paris", "France")[1], "FR")
+        self.assertEqual(self.where("Paris", "USA")[1:], ("US", "TX"))
+        self.assertEqual(self.where("Paris", "Texas")[1:], ("US", "TX"))
+        self.assertEqual(self.where("paris", "tx")[1:], ("US", "TX"))
+        self.assertEqual(self.where("Springfield", "IL")[2], "IL")
+        self.assertEqual(self.where("Springfield", "Massachusetts", "United States")[2], "MA")
+        self.assertEqual(self.where("Portland", "Maine")[2], "ME")
+        # "CA" is Canada first; no San Jose there, so California
+        self.assertEqual(self.where("San Jose", "CA")[1:], ("US", "CA"))
+
+    def test_unmatched_qualifiers_miss(self):
+        self.assertIsNone(self.where("Paris", "Atlantis"))
+        self.assertIsNone(self.where("Austin", "France"))
+        self.assertIsNone(self.where("Austin", "Maine", "United States"))
+        self.assertIsNone(self.where("Austin", "Texas", "United States", "Earth"))
+        self.assertIsNone(self.where("Nowhere"))
+        self.assertIsNone(self.where("", None))
+
+    def test_suggest(self):
+        rows = self.gaz.suggest("spring")
+        names = [(self.gaz.names[r], self.gaz.codes[self.gaz.admin1[r]]) for r in rows]
+        self.assertEqual(names, [("Springfield", "MO"), ("Springfield", "MA"), ("Springfield", "IL")])
+        self.assertEqual(self.gaz.suggest("  "), [])
+
+    def test_geocoder_takes_normalized_queries(self):
+        with mock.patch.object(gazetteer, "_gazetteer", self.gaz):
+            lat, lon = gazetteer.GazetteerGeocoder().geocode(geocoding.normalize_query("Paris", "TX", None))
+        self.assertAlmostEqual(lat, 33.66, places=2)
+        self.assertIsNone(gazetteer.GazetteerGeocoder().geocode("nowhere"))
+
+
+# ------------------------------------------------------
+# GEOCODING CACHE
+# ------------------------------------------------------
+
+class _FakeGeocoder(geocoding.BaseGeocoder):
+    def __init__(self, answer, local=False):
+        self.answer, self.local, self.calls = answer, local, []
+
+    def geocode(self, query):
+        self.calls.append(query)
+        return self.answer(query) if callable(self.answer) else self.answer
+
+
+class GeocodingCacheTests(TestCase):
+    def setUp(self):
+        geocoding.clear_memory_cache()
+        geocoding.stats.reset()
+        self.addCleanup(geocoding.clear_memory_cache)
+
+    def use(self, local=(), remote=()):
+        self.enterContext(mock.patch.object(geocoding, "_backends", (list(local), list(remote))))
+
+    def test_memory_then_db_tier(self):
+        remote = _FakeGeocoder((48.85, 2.35))
+        self.use(remote=[remote])
+
+        self.assertEqual(geocoding.geocode_location(" Paris ", None, "FRANCE"), (48.85, 2.35))
+        self.assertEqual(geocoding.geocode_location("paris", "", "France"), (48.85, 2.35))
+        self.assertEqual(remote.calls, ["paris, france"])
+        self.assertTrue(GeocodeCacheEntry.objects.get(query="paris, france").found)
+
+        # Another worker: empty LRU, shared table
+        geocoding.clear_memory_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual(geocoding.geocode_location("Paris", None, "France"), (48.85, 2.35))
+        self.assertEqual(len(remote.calls), 1)
+        snapshot = geocoding.stats.snapshot()
+        self.assertEqual((snapshot["misses"], snapshot["memory_hits"], snapshot["db_hits"]), (1, 1, 1))
+
+    def test_negative_results_are_cached_for_negative_ttl(self):
+        remote = _FakeGeocoder(geocoding.NOT_FOUND)
+        self.use(remote=[remote])
+
+        self.assertIsNone(geocoding.geocode_location("Atlantis", None, None))
+        self.assertIsNone(geocoding.geocode_location("Atlantis", None, None))
+        self.assertEqual(len(remote.calls), 1)
+        entry = GeocodeCacheEntry.objects.get(query="atlantis")
+        self.assertFalse(entry.found)
+        ttl = (entry.expires_at - timezone.now()).total_seconds()
+        self.assertAlmostEqual(ttl, geocoding.NEGATIVE_TTL, delta=60)
+        self.assertEqual(geocoding.stats.snapshot()["negative_hits"], 1)
+
+    def test_expired_entries_are_refetched(self):
+        remote = _FakeGeocoder((1.0, 2.0))
+        self.use(remote=[remote])
+        GeocodeCacheEntry.objects.create(
+            query="lyon", found=True, latitude=45.7, longitude=4.8,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(geocoding.geocode_location("Lyon", None, None), (1.0, 2.0))
+        self.assertEqual(remote.calls, ["lyon"])
+
+    def test_unavailable_is_not_cached(self):
+        remote = _FakeGeocoder(None)
+        self.use(remote=[remote])
+        self.assertIsNone(geocoding.geocode_location("Paris", None, None))
+        self.assertIsNone(geocoding.geocode_location("Paris", None, None))
+        self.assertEqual(len(remote.calls), 2)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_backend_order(self):
+        local = _FakeGeocoder(lambda q: (1.0, 1.0) if q == "known" else geocoding.NOT_FOUND, local=True)
+        empty = _FakeGeocoder(geocoding.NOT_FOUND)
+        down = _FakeGeocoder(None)
+        found = _FakeGeocoder((2.0, 2.0))
+
+        # Local answers skip the caches and the remote backends
+        self.use(local=[local], remote=[found])
+        with self.assertNumQueries(0):
+            self.assertEqual(geocoding.geocode_location("Known", None, None), (1.0, 1.0))
+        self.assertEqual(found.calls, [])
+
+        # Remote backends in order until one finds it
+        self.use(local=[local], remote=[empty, found])
+        self.assertEqual(geocoding.geocode_location("Other", None, None), (2.0, 2.0))
+        self.assertEqual((empty.calls, found.calls), (["other"], ["other"]))
+
+        # Not found anywhere, but one backend was down: retry later, no cache
+        self.use(remote=[down, empty])
+        self.assertIsNone(geocoding.geocode_location("Elsewhere", None, None))
+        self.assertFalse(GeocodeCacheEntry.objects.filter(query="elsewhere").exists())
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = geocoding.LRUCache(2)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        lru.get("a")
+        lru.set("c", 3, 60)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+        self.assertEqual(len(lru), 2)
+
+    def test_ttl(self):
+        lru = geocoding.LRUCache(2)
+        with mock.patch("home.geocoding.time.monotonic", return_value=100.0):
+            lru.set("a", 1, 10)
+        with mock.patch("home.geocoding.time.monotonic", return_value=109.0):
+            self.assertEqual(lru.get("a"), 1)
+        with mock.patch("home.geocoding.time.monotonic", return_value=110.0):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight, release, calls = geocoding.SingleFlight(), threading.Event(), []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)  # let the others queue up behind the leader
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("value", False)] + [("value", True)] * 4)
+        # Finished calls aren't remembered
+        self.assertEqual(flight.do("k", lambda: "again"), ("again", False))
+
+
+# ------------------------------------------------------
+# GEOCODER HTTP CLIENT
+# Against a local stub server that replays scripted statuses.
+# ------------------------------------------------------
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        status = server.script.pop(0) if server.script else 200
+        time.sleep(server.delay)
+        body = json.dumps(server.body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server.hits += 1
+
+    def log_message(self, *args):
+        pass
+
+
+class GeocoderClientTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.script, self.server.connections, self.server.hits = [], set(), 0
+        self.server.delay = 0
+        self.server.body = {"results": [{"geometry": {"lat": 48.85, "lng": 2.35}}]}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/geocode"
+
+    def make_client(self, **kwargs):
+        client = geocoder_client.GeocoderClient(backoff_base=0, **kwargs)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_connections_are_reused(self):
+        client = self.make_client()
+        for _ in range(3):
+            client.get_json(self.url)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(client.metrics()["attempts"], 3)
+        self.assertIsNotNone(client.metrics()["p95_ms"])
+
+    def test_retries_transient_errors(self):
+        self.server.script = [503, 429]
+        client = self.make_client(retries=2)
+        self.assertIn("results", client.get_json(self.url))
+        self.assertEqual(client.metrics()["retries"], 2)
+
+        # Client errors aren't retried
+        self.server.script = [400, 401, 404]
+        for error in (
+            geocoder_client.RequestRejected, geocoder_client.AccessDenied, geocoder_client.UpstreamError,
+        ):
+            with self.assertRaises(error):
+                client.get_json(self.url)
+        self.assertEqual(self.server.hits, 6)
+
+    def test_query_errors_dont_trip_the_breaker(self):
+        now = [0.0]
+        client = self.make_client(retries=0, breaker_threshold=2, breaker_cooldown=10)
+        client.breaker.clock = lambda: now[0]
+
+        self.server.script = [400, 422, 400]
+        for _ in range(3):
+            with self.assertRaises(geocoder_client.RequestRejected):
+                client.get_json(self.url)
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual((client.metrics()["rejected"], client.metrics()["failures"]), (3, 0))
+
+        # ...and count as the provider answering: they close a half-open breaker
+        self.server.script = [500, 500, 400]
+        for _ in range(2):
+            with self.assertRaises(geocoder_client.UpstreamError):
+                client.get_json(self.url)
+        now[0] = 11
+        with self.assertRaises(geocoder_client.RequestRejected):
+            client.get_json(self.url)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_key_and_quota_errors_are_outages(self):
+        for status in (401, 402, 403):
+            client = self.make_client(retries=0, breaker_threshold=2, breaker_cooldown=10)
+            self.server.script = [status, status]
+            for _ in range(2):
+                with self.assertRaises(geocoder_client.AccessDenied):
+                    client.get_json(self.url)
+            self.assertEqual(client.breaker.state, "open", status)
+
+    def test_key_and_quota_errors_are_never_cached(self):
+        backend = geocoding.OpenCageGeocoder(client=self.make_client(retries=0), url=self.url)
+        geocoding.clear_memory_cache()
+        self.addCleanup(geocoding.clear_memory_cache)
+        with mock.patch.object(geocoding, "_backends", ([], [backend])):
+            for status in (401, 402, 403):
+                self.server.script = [status]
+                with self.assertLogs("home.geocoding", "WARNING"):
+                    self.assertIsNone(geocoding.geocode_location("Paris", None, "France"))
+                self.assertFalse(GeocodeCacheEntry.objects.exists(), status)
+
+            # The key works again: the next lookup goes upstream and is cached
+            self.assertEqual(geocoding.geocode_location("Paris", None, "France"), (48.85, 2.35))
+        self.assertTrue(GeocodeCacheEntry.objects.get(query="paris, france").found)
+
+    def test_breaker_opens_and_recovers(self):
+        now = [0.0]
+        client = self.make_client(retries=0, breaker_threshold=2, breaker_cooldown=10)
+        client.breaker.clock = lambda: now[0]
+
+        self.server.script = [500, 500]
+        for _ in range(2):
+            with self.assertRaises(geocoder_client.UpstreamError):
+                client.get_json(self.url)
+        with self.assertRaises(geocoder_client.CircuitOpen):
+            client.get_json(self.url)
+        self.assertEqual(self.server.hits, 2)
+
+        now[0] = 11
+        self.assertEqual(client.breaker.state, "half-open")
+        client.get_json(self.url)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_in_flight_limit(self):
+        self.server.delay = 0.3
+        client = self.make_client(max_in_flight=1, queue_timeout=0.05)
+        slow = threading.Thread(target=client.get_json, args=(self.url,))
+        slow.start()
+        time.sleep(0.1)
+        with self.assertRaises(geocoder_client.Saturated):
+            client.get_json(self.url)
+        slow.join()
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_opencage_backend(self):
+        backend = geocoding.OpenCageGeocoder(client=self.make_client(retries=0), url=self.url)
+        self.assertEqual(backend.geocode("paris, france"), (48.85, 2.35))
+        self.server.body = {"results": []}
+        self.assertEqual(backend.geocode("nowhere"), geocoding.NOT_FOUND)
+        self.server.script = [500]
+        self.assertIsNone(backend.geocode("paris, france"))
+        self.server.script = [400]
+        with self.assertLogs("home.geocoding", "WARNING"):
+            self.assertEqual(backend.geocode("?"), geocoding.NOT_FOUND)
+
+
+# ------------------------------------------------------
+# BULK IMPORT
+# ------------------------------------------------------
+
+class PinImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = User.objects.create_user("importer", password="x")
+
+    def setUp(self):
+        self.client.force_login(self.me)
+
+    def upload(self, name, text, **extra):
+        return self.client.post(
+            "/api/import-pins/", {"file": SimpleUploadedFile(name, text.encode()), **extra}
+        )
+
+    def test_csv(self):
+        text = (
+            "City,Country,Caption,lat,lon,date\n"
+            "Paris,France,one,,,2023-05-01\n"
+            "paris , FRANCE,two,,,\n"
+            ",,coords,10.5,20.25,\n"
+            ",,bad,abc,1,\n"
+        )
+        with self.assertNoLogs("home.instrumentation", "WARNING"):
+            response = self.upload("trips.csv", text)
+        summary = response.json()
+        self.assertEqual(summary["created"], 3)
+        self.assertEqual(summary["invalid"], 1)
+        self.assertEqual(summary["places"], 1)
+        self.assertEqual(summary["errors"][0]["row"], 5)
+
+        pins = list(Pin.objects.filter(user=self.me).order_by("id"))
+        self.assertEqual([p.caption for p in pins], ["one", "two", "coords"])
+        self.assertEqual(pins[0].created_at.date().isoformat(), "2023-05-01")
+        self.assertEqual((pins[0].latitude, pins[0].longitude), (pins[1].latitude, pins[1].longitude))
+        self.assertTrue(all(p.geohash for p in pins))
+        self.assertEqual(
+            PinCluster.objects.get(user=self.me, level=1, cell=pins[0].geohash[0]).count, 2
+        )
+
+    def test_geojson_streams_features(self):
+        features = [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [2.35, 48.85]},
+             "properties": {"caption": f"p{i}", "city": "Paris"}}
+            for i in range(300)
+        ]
+        doc = json.dumps({"type": "FeatureCollection", "features": features})
+        with mock.patch.object(pin_import, "READ_SIZE", 97):  # items span many reads
+            summary = pin_import.import_pins(self.me, io.StringIO(doc), "geojson", chunk_size=64)
+        self.assertEqual(summary["created"], 300)
+        self.assertEqual(summary["places"], 0)
+
+    def test_failed_chunk_still_refreshes_committed_ones(self):
+        text = "lat,lon\n10,20\n-30,140\n"
+        real = Pin.objects.bulk_create
+        calls = []
+
+        def flaky(pins, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise IntegrityError("disk full")
+            return real(pins, *args, **kwargs)
+
+        cache.clear()
+        self.assertEqual(self.client.get("/api/my-pins/").json()["pins"], [])
+        etag = self.client.get("/api/pin-tiles/0/0/0/")["ETag"]
+        with mock.patch.object(Pin.objects, "bulk_create", flaky), \
+                self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+            pin_import.import_pins(self.me, io.StringIO(text), "csv", chunk_size=1)
+
+        (pin,) = Pin.objects.filter(user=self.me)
+        self.assertEqual(PinCluster.objects.get(user=self.me, level=1).sample_ids, [pin.id])
+        response = self.client.get("/api/pin-tiles/0/0/0/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.client.get("/api/my-pins/").json()["pins"]), 1)
+
+    def test_upload_queues_unknown_places(self):
+        text = "city,country\nParis,France\nNowhereville,Atlantis\nnowhereville,ATLANTIS\n"
+        with mock.patch.object(geocoding, "geocode_location", side_effect=AssertionError("inline")):
+            summary = self.upload("trips.csv", text).json()
+        self.assertEqual((summary["created"], summary["queued"], summary["unresolved"]), (3, 2, 0))
+
+        paris, *pending = Pin.objects.filter(user=self.me).order_by("id")
+        self.assertEqual(paris.geocode_status, "resolved")
+        self.assertEqual({(p.geocode_status, p.latitude, p.geohash) for p in pending}, {("pending", None, "")})
+        self.assertEqual(
+            set(GeocodeJob.objects.values_list("pin_id", flat=True)), {p.id for p in pending}
+        )
+
+    def test_rejects_bad_files(self):
+        self.assertEqual(self.upload("trips.geojson", '{"type": "Feature"}').status_code, 400)
+        self.assertEqual(self.upload("trips.txt", "city\nParis\n").status_code, 400)
+        with override_settings(PIN_IMPORT_MAX_ROWS=1):
+            self.assertEqual(self.upload("trips.csv", "city\nParis\nLyon\n").status_code, 400)
+        self.assertFalse(Pin.objects.filter(user=self.me).exists())
+
+
+# ------------------------------------------------------
+# EXPORT
+# ------------------------------------------------------
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = User.objects.create_user("exporter", password="x")
+        for i in range(5):
+            Pin.objects.create(user=cls.me, city="Paris", caption=f"p{i}", latitude=48.8, longitude=2.3 + i)
+        Pin.objects.create(user=cls.me, city="Lyon", caption="pending", geocode_status="pending")
+        PinPhoto.objects.create(pin=Pin.objects.get(caption="p0"), image="pin_photos/x.jpg")
+
+    def setUp(self):
+        self.client.force_login(self.me)
+
+    def lines(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_ndjson_resumes_from_cursor(self):
+        with mock.patch.object(export, "CHUNK_SIZE", 2):
+            records = self.lines("/api/export/pins.ndjson")
+            self.assertEqual([r["caption"] for r in records], ["p0", "p1", "p2", "p3", "p4", "pending"])
+            self.assertEqual(len(records[0]["photos"]), 1)
+
+            rest = self.lines(f"/api/export/pins.ndjson?since={records[2]['cursor']}")
+        self.assertEqual([r["caption"] for r in rest], ["p3", "p4", "pending"])
+
+    def test_geojson_gzip(self):
+        response = self.client.get("/api/export/pins.geojson", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        doc = json.loads(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(len(doc["features"]), 6)
+        self.assertEqual(doc["features"][1]["geometry"]["coordinates"], [3.3, 48.8])
+        self.assertIsNone(doc["features"][-1]["geometry"])
+
+    def test_bad_since(self):
+        self.assertEqual(self.client.get("/api/export/pins.ndjson?since=yesterday").status_code, 400)
+        self.assertEqual(len(self.lines("/api/export/pins.ndjson?since=2000-01-01")), 6)
+
+
+# ------------------------------------------------------
+# COUNTRY STATS
+# ------------------------------------------------------
+
+# Rendering pages needs static URLs; the manifest only exists after collectstatic
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class CountryStatsTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user("counter", password="x")
+        self.friend = User.objects.create_user("reactor", password="x")
+
+    def stats(self):
+        return {
+            c: (p, r) for c, p, r in CountryStats.objects.exclude(pin_count=0, reaction_count=0)
+            .values_list("country", "pin_count", "reaction_count")
+        }
+
+    def test_signals_keep_rollups_exact(self):
+        pin = Pin.objects.create(user=self.me, country="France", latitude=48.8, longitude=2.3)
+        Pin.objects.create(user=self.me, country="France", latitude=45.7, longitude=4.8)
+        Pin.objects.create(user=self.me, latitude=0, longitude=0)
+        reactions.set_reaction(pin, self.friend, "love")
+        reactions.set_reaction(pin, self.friend, "wow")  # a change, not a new reaction
+        reactions.set_reaction(pin, self.me, "like")
+        self.assertEqual(self.stats(), {"France": (2, 2), "": (1, 0)})
+
+        pin.country = "Japan"
+        pin.save()
+        self.assertEqual(self.stats(), {"France": (1, 0), "Japan": (1, 2), "": (1, 0)})
+
+        pin.delete()
+        self.assertEqual(self.stats(), {"France": (1, 0), "": (1, 0)})
+        call_command("rebuild_country_stats", "--verify", stdout=io.StringIO())
+
+    def test_rebuild_and_dashboard(self):
+        Pin.objects.bulk_create([Pin(user=self.me, country="Peru") for _ in range(3)])
+        with self.assertRaises(CommandError):
+            call_command("rebuild_country_stats", "--verify", stdout=io.StringIO())
+        call_command("rebuild_country_stats", stdout=io.StringIO())
+        self.assertEqual(self.stats(), {"Peru": (3, 0)})
+
+        self.me.is_staff = True
+        self.me.save()
+        self.client.force_login(self.me)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/admin/popularity/")
+        self.assertEqual(response.context["country_stats"][0]["pin_count"], 3)
+        self.assertFalse([q for q in ctx.captured_queries if '"home_pin"' in q["sql"]])
@@ -0,0 +1,83 @@
+# home/textures.py
+# Resolution tiers for the globe textures.
+#
+# The source textures are several MB (FINALGLOBE.jpeg is 5400x2700), and
+# every visitor used to download them before the globe appeared.
+# `manage.py build_textures` renders each one at TIER_WIDTHS as WebP and
+# JPEG into home/static/home/textures/tiers/. Run it before collectstatic;
+# the output is checked in. WhiteNoise then serves them under hashed,
+# immutable names.
+#
+# globe_textures() is a context processor that puts the tier URLs into
+# every page (see base.html). main.js loads the smallest tier first and
+# swaps in the one that fits the screen and the GPU's max texture size.
+
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from PIL import Image
+
+TIER_WIDTHS = [1024, 2048, 4096]
+SOURCES = ["FINALGLOBE.jpeg", "CartoonEarth.png", "CartoonEarthClouds.png"]
+QUALITY = 82
+
+SOURCE_DIR = "home/textures"
+TIER_DIR = "home/textures/tiers"
+
+
+def tier_path(source, width, fmt):
+    stem = os.path.splitext(source)[0]
+    return f"{TIER_DIR}/{stem}_{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def tiers_for(source_width):
+    # Never upscale: a source narrower than a tier stops the list there
+    return [w for w in TIER_WIDTHS if w <= source_width] or [source_width]
+
+
+def render_tiers(static_root, source):
+    """Writes every tier of one source texture; returns the paths written."""
+    written = []
+    with Image.open(os.path.join(static_root, SOURCE_DIR, source)) as img:
+        img = img.convert("RGB")
+        for width in tiers_for(img.width):
+            height = round(img.height * width / img.width)
+            resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+            for fmt, options in (
+                ("webp", {"quality": QUALITY, "method": 6}),
+                ("jpeg", {"quality": QUALITY, "optimize": True, "progressive": True}),
+            ):
+                path = os.path.join(static_root, tier_path(source, width, fmt))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                resized.save(path, fmt.upper(), **options)
+                written.append(path)
+    return written
+
+
+def _tier_urls(source):
+    tiers = []
+    for width in TIER_WIDTHS:
+        if not finders.find(tier_path(source, width, "jpeg")):
+            continue
+        tiers.append({
+            "width": width,
+            "webp": static(tier_path(source, width, "webp")),
+            "jpeg": static(tier_path(source, width, "jpeg")),
+        })
+    return {"original": static(f"{SOURCE_DIR}/{source}"), "tiers": tiers}
+
+
+_urls = None
+
+
+def globe_textures(request):
+    global _urls
+    # Static URLs only change on deploy (new manifest, new process)
+    if _urls is None or settings.DEBUG:
+        _urls = {
+            "earth": _tier_urls("FINALGLOBE.jpeg"),
+            "pinSprite": static(f"{SOURCE_DIR}/pin_sprite.png"),
+        }
+    return {"globe_textures": _urls}
@@ -0,0 +1,159 @@
+# home/thumbnails.py
+# Resized WebP + JPEG derivatives of pin images, so cards and popups don't
+# download full-size phone photos.
+#
+# Uploads are rendered before the row is saved: EXIF orientation applied,
+# metadata dropped, one file per IMAGE_VARIANT_WIDTHS entry (never upscaled)
+# and format. Rendering is CPU-bound Pillow work, so it runs in a small
+# process pool (IMAGE_VARIANT_WORKERS; 0 renders inline). Files go through
+# default_storage (content-addressed, see home/storage.py), and the stored
+# names are kept in the model's image_variants as
+# {"320": {"webp": name, "jpeg": name}, ...}. APIs turn that into srcset
+# strings with serialization.MediaUrls.srcsets().
+#
+# Existing images are backfilled with `manage.py build_thumbnails`.
+
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+RENDER_TIMEOUT = 60
+
+
+def _widths():
+    return getattr(settings, "IMAGE_VARIANT_WIDTHS", [320, 640, 1280])
+
+
+def _quality():
+    return getattr(settings, "IMAGE_VARIANT_QUALITY", 80)
+
+
+# ------------------------------------------------------
+# RENDERING (runs in the worker processes)
+# ------------------------------------------------------
+
+def render_variants(data, widths, quality):
+    """
+    Original image bytes -> {width: {format: bytes}}. Images narrower than
+    every width get one variant at their own size, still re-encoded.
+    """
+    with Image.open(BytesIO(data)) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+
+        targets = sorted({w for w in widths if w < img.width}) or [img.width]
+        out = {}
+        for width in targets:
+            height = max(1, round(img.height * width / img.width))
+            resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+
+            # Nothing from original.info is passed on: no EXIF (GPS!), no comments
+            webp = BytesIO()
+            resized.save(webp, FORMATS["webp"], quality=quality, method=4)
+            jpeg = BytesIO()
+            resized.convert("RGB").save(jpeg, FORMATS["jpeg"], quality=quality, optimize=True, progressive=True)
+            out[width] = {"webp": webp.getvalue(), "jpeg": jpeg.getvalue()}
+        return out
+
+
+# ------------------------------------------------------
+# PROCESS POOL
+# ------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    workers = getattr(settings, "IMAGE_VARIANT_WORKERS", 2)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: forking a threaded server process isn't safe
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def _render_all(blobs):
+    widths, quality = _widths(), _quality()
+    pool = _get_pool()
+    if pool is None:
+        futures = None
+    else:
+        futures = [pool.submit(render_variants, data, widths, quality) for data in blobs]
+
+    results = []
+    for i, data in enumerate(blobs):
+        try:
+            if futures is None:
+                results.append(render_variants(data, widths, quality))
+            else:
+                results.append(futures[i].result(timeout=RENDER_TIMEOUT))
+        except Exception as e:  # corrupt upload, unsupported format, bomb, timeout
+            logger.warning("Could not render image variants: %s", e)
+            results.append(None)
+    return results
+
+
+# ------------------------------------------------------
+# STORAGE
+# ------------------------------------------------------
+
+def _store(digest, rendered):
+    variants = {}
+    for width, formats in rendered.items():
+        entry = variants[str(width)] = {}
+        for fmt, payload in formats.items():
+            name = f"variants/{digest[:2]}/{digest}_{width}.{EXTENSIONS[fmt]}"
+            # Same bytes uploaded twice -> same names; keep the first copy.
+            # (Content-addressed storage dedupes by itself, counting references)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(payload))
+            entry[fmt] = name
+    return variants
+
+
+def _read(f):
+    f.open("rb")
+    try:
+        f.seek(0)
+        data = f.read()
+    finally:
+        # Uploaded files are saved afterwards; leave them rewound for that
+        f.seek(0)
+    return data
+
+
+def build_many(files):
+    """
+    image_variants dicts for uploaded files (or FieldFiles), in order.
+    {} for anything Pillow couldn't render; clients then fall back to the
+    original URL.
+    """
+    blobs = [_read(f) for f in files]
+    variants = []
+    for data, rendered in zip(blobs, _render_all(blobs)):
+        if rendered is None:
+            variants.append({})
+        else:
+            variants.append(_store(hashlib.sha256(data).hexdigest(), rendered))
+    return variants
+
@@ -0,0 +1,118 @@
+# home/tiles.py
+# Tile addressing for /api/pin-tiles/<z>/<x>/<y>/.
+#
+# Tiles are a plain lat/lon quadtree (not Web Mercator, so the poles are
+# covered like everything else): zoom z splits the globe into 2^z x 2^z
+# tiles, x counting east from -180 and y counting south from +90.
+#
+# Each (user, tile) has a TileVersion counter for zooms 0..MAX_VERSIONED_ZOOM.
+# Deeper tiles borrow the counter of their ancestor at MAX_VERSIONED_ZOOM,
+# which changes whenever anything inside them does.
+
+import hashlib
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import Pin, TileVersion
+
+MAX_ZOOM = 18
+MAX_VERSIONED_ZOOM = getattr(settings, "PIN_TILE_MAX_VERSIONED_ZOOM", 8)
+
+
+def tile_for(lat, lon, z):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((90.0 - lat) / 180.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(z, x, y):
+    """(min_lat, max_lat, min_lon, max_lon) of a tile."""
+    n = 2 ** z
+    w, h = 360.0 / n, 180.0 / n
+    return 90.0 - (y + 1) * h, 90.0 - y * h, -180.0 + x * w, -180.0 + (x + 1) * w
+
+
+def is_valid(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def versioned_tile(z, x, y):
+    """The tile whose counter covers (z, x, y)."""
+    if z <= MAX_VERSIONED_ZOOM:
+        return z, x, y
+    shift = z - MAX_VERSIONED_ZOOM
+    return MAX_VERSIONED_ZOOM, x >> shift, y >> shift
+
+
+def bump(user_id, lat, lon):
+    """Invalidates every versioned tile containing (lat, lon) for this user."""
+    if lat is None or lon is None:
+        return
+
+    keys = [(z, *tile_for(lat, lon, z)) for z in range(MAX_VERSIONED_ZOOM + 1)]
+
+    # Create-if-missing then increment: concurrent writers can't lose a bump
+    TileVersion.objects.bulk_create(
+        [TileVersion(user_id=user_id, z=z, x=x, y=y) for z, x, y in keys],
+        ignore_conflicts=True,
+    )
+    match = Q()
+    for z, x, y in keys:
+        match |= Q(z=z, x=x, y=y)
+    TileVersion.objects.filter(match, user_id=user_id).update(version=F("version") + 1)
+
+
+def bump_many(user_id, points):
+    """
+    bump() for a whole batch of (lat, lon) (bulk imports). One UPDATE over
+    the x/y ranges touched at each zoom; that can also bump a few untouched
+    tiles, which only costs them a cache miss.
+    """
+    deepest = {
+        tile_for(lat, lon, MAX_VERSIONED_ZOOM)
+        for lat, lon in points if lat is not None and lon is not None
+    }
+    if not deepest:
+        return
+    # Every ancestor of a tile is the same (x, y) shifted down a level
+    keys = {
+        (z, x >> (MAX_VERSIONED_ZOOM - z), y >> (MAX_VERSIONED_ZOOM - z))
+        for x, y in deepest
+        for z in range(MAX_VERSIONED_ZOOM + 1)
+    }
+
+    TileVersion.objects.bulk_create(
+        [TileVersion(user_id=user_id, z=z, x=x, y=y) for z, x, y in keys],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    match = Q()
+    for z in range(MAX_VERSIONED_ZOOM + 1):
+        xs = [x for kz, x, _ in keys if kz == z]
+        ys = [y for kz, _, y in keys if kz == z]
+        match |= Q(z=z, x__range=(min(xs), max(xs)), y__range=(min(ys), max(ys)))
+    TileVersion.objects.filter(match, user_id=user_id).update(version=F("version") + 1)
+
+
+def bump_user(user_id):
+    """Invalidates all of a user's tiles (every pin in them shows the username)."""
+    bump_many(
+        user_id, Pin.objects.filter(user_id=user_id).values_list("latitude", "longitude").distinct()
+    )
+
+
+def etag(viewer_id, user_ids, z, x, y):
+    """
+    Strong validator for a tile as seen by viewer_id: changes when any of the
+    users' pins in the tile change, or the set of users does.
+    """
+    vz, vx, vy = versioned_tile(z, x, y)
+    versions = dict(
+        TileVersion.objects.filter(user_id__in=user_ids, z=vz, x=vx, y=vy)
+        .values_list("user_id", "version")
+    )
+    parts = [f"{viewer_id}:{z}/{x}/{y}"]
+    parts += [f"{uid}={versions.get(uid, 0)}" for uid in sorted(set(user_ids))]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
@@ -2,9 +2,6 @@ from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
-from django.conf import settings
-from django.conf.urls.static import static
-
 urlpatterns = [
     path("", views.index, name="index"),           
     path("map/", views.map_view, name="map"),      
@@ -16,8 +13,14 @@ urlpatterns = [
     path("api/my-pins/", views.my_pins, name="my_pins"),
     path("api/search/", views.search_location, name="search_location"),
     path("api/add-pin/", views.add_pin, name="add_pin"),
+    path("api/import-pins/", views.import_pins, name="import_pins"),
+    path("api/export/pins.ndjson", views.export_pins, {"fmt": "ndjson"}, name="export_pins_ndjson"),
+    path("api/export/pins.geojson", views.export_pins, {"fmt": "geojson"}, name="export_pins_geojson"),
 
     path("api/pin/<int:pin_id>/", views.get_pin, name="get_pin"),
+    path("api/pin-clusters/", views.pin_clusters, name="pin_clusters"),
+    path("api/pin-tiles/<int:z>/<int:x>/<int:y>/", views.pin_tile, name="pin_tile"),
+    path("api/pin/<int:pin_id>/geocode-status/", views.pin_geocode_status, name="pin_geocode_status"),
 
     path("gallery/", views.gallery_view, name="gallery"),
     path("api/my-photos/", views.my_photos, name="my_photos"),
@@ -39,11 +42,10 @@ urlpatterns = [
 
     # === REACTION API ===
     path("api/react/<int:pin_id>/", views.react_to_pin, name="react_to_pin"),
+    path("api/reactions/batch/", views.reactions_batch, name="reactions_batch"),
 
     # === View MANY OF YOUR FRIENDS' Pins ==
     path("api/friends-pins/", views.friends_pins, name="friends_pins"),
     
 
 ]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
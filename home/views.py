@@ -2,15 +2,16 @@
 
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib import messages
 from django import forms
 from django.http import JsonResponse
 from django.conf import settings
-from django.db.models import Q, Count
+from django.db.models import Q
 from datetime import datetime
-import requests
+import csv
+import io
 import json
 from django.views.decorators.csrf import csrf_exempt
 from .models import Profile
@@ -18,11 +19,22 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 
 from .forms import SignUpForm, PinForm
-from .models import Pin, PinPhoto, Friendship, Reaction
+from .models import Pin, PinPhoto, Friendship, GeocodeJob
+from . import (
+    clusters, country_stats, export, feed, friend_graph, geocoder_client, geocoding, geocode_queue,
+    instrumentation, pagination, pin_import, reactions, response_cache, serialization, spatial,
+    thumbnails, tiles,
+)
+from .geocoding import geocode_location
 
 User = get_user_model()
 MAX_PIN_PHOTOS = 5
 
+# search_location: default radius roughly matches the old ±5° box
+SEARCH_RADIUS_KM = 550
+SEARCH_MAX_RADIUS_KM = 2500
+SEARCH_MAX_RESULTS = 100
+
 
 # =====================================================================
 # AUTH VIEWS
@@ -92,59 +104,24 @@ def map_view(request):
 
 @login_required
 def my_pins(request):
-    pins_qs = (
-        Pin.objects.filter(user=request.user)
-        .select_related("user")
-        .prefetch_related("photos")
+    return response_cache.cached_json(
+        request, "my_pins", request.user.id, lambda: _pins_page(request, user=request.user)
     )
 
-    data = []
-    for pin in pins_qs:
-        cover = request.build_absolute_uri(pin.image.url) if pin.image else None
-        extra = [request.build_absolute_uri(p.image.url) for p in pin.photos.all()]
-
-        data.append({
-            "id": pin.id,
-            "lat": pin.latitude,
-            "lon": pin.longitude,
-            "caption": pin.caption or "",
-            "imageUrl": cover,
-            "photos": extra,
-            "photoCount": (1 if cover else 0) + len(extra),
-            "user": pin.user.username,
-            "city": pin.city,
-            "state": pin.state,
-            "country": pin.country,
-        })
-
-    return JsonResponse({"pins": data})
-
-
-def geocode_location(city, state, country):
-    parts = [p.strip() for p in [city, state, country] if p]
-    if not parts:
-        return None
-
-    # FIXED API URL (vv1 → v1)
-    url = "https://api.opencagedata.com/geocode/v1/json"
-    params = {
-        "q": ", ".join(parts),
-        "key": settings.OPENCAGE_API_KEY,
-        "limit": 1
-    }
 
+def _pins_page(request, **filters):
+    """One cursor page of the filtered pins, for my_pins / user_pins."""
     try:
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
-    except Exception as e:
-        print("❌ GEOCODE ERROR:", e)
-        return None
+        cursor, limit = pagination.page_params(request)
+    except pagination.InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
 
-    if not data.get("results"):
-        return None
+    rows, next_cursor = pagination.paginate(
+        serialization.project(Pin.objects.filter(**filters)), cursor, limit
+    )
+    data = serialization.pins_payload(request, rows)
+    return serialization.json_response({"pins": data, "next": next_cursor})
 
-    g = data["results"][0]["geometry"]
-    return float(g["lat"]), float(g["lng"])
 
 @login_required
 def search_location(request):
@@ -152,35 +129,36 @@ def search_location(request):
     if not query:
         return JsonResponse({"error": "Missing 'q' parameter"}, status=400)
 
+    try:
+        radius_km = float(request.GET.get("radius_km", SEARCH_RADIUS_KM))
+        limit = int(request.GET.get("limit", SEARCH_MAX_RESULTS))
+    except ValueError:
+        return JsonResponse({"error": "Invalid 'radius_km' or 'limit'"}, status=400)
+    radius_km = min(max(radius_km, 1.0), SEARCH_MAX_RADIUS_KM)
+    limit = min(max(limit, 1), SEARCH_MAX_RESULTS)
+
     geo = geocode_location(query, "", "")
     if not geo:
         return JsonResponse({"error": "Location not found"}, status=404)
 
     lat, lon = geo
-    pins = Pin.objects.filter(
-        latitude__gte=lat - 5,
-        latitude__lte=lat + 5,
-        longitude__gte=lon - 5,
-        longitude__lte=lon + 5,
-    )
 
-    return JsonResponse({
+    # Nearest-first ids from the geohash index, then one query for the rows
+    ranked = spatial.nearest(Pin.objects.all(), lat, lon, radius_km, limit)
+    rows = {
+        row["id"]: row
+        for row in serialization.project(Pin.objects.filter(id__in=[pin_id for pin_id, _ in ranked]).order_by())
+    }
+    distances = {pin_id: d for pin_id, d in ranked}
+    pins = serialization.pins_payload(request, [rows[pin_id] for pin_id, _ in ranked if pin_id in rows])
+    for pin in pins:
+        pin["distanceKm"] = round(distances[pin["id"]], 2)
+
+    return serialization.json_response({
         "query": query,
         "center": [lat, lon],
-        "pins": [
-            {
-                "id": p.id,
-                "lat": p.latitude,
-                "lon": p.longitude,
-                "caption": p.caption or "",
-                "imageUrl": request.build_absolute_uri(p.image.url) if p.image else None,
-                "user": p.user.username,
-                "city": p.city,
-                "state": p.state,
-                "country": p.country,
-            }
-            for p in pins
-        ],
+        "radiusKm": radius_km,
+        "pins": pins,
     })
 
 
@@ -268,38 +246,48 @@ def friend_reject(request, friendship_id):
 def friend_list(request):
     """
     Returns MUST include friendship_id so Unfriend works.
+    Friends are paginated (?cursor=, ?limit=); pending requests only come
+    with the first page.
     """
-    accepted = Friendship.objects.filter(
-        Q(from_user=request.user) | Q(to_user=request.user),
-        status="accepted"
+    try:
+        cursor, limit = pagination.page_params(request)
+    except pagination.InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    graph = friend_graph.get(request.user.id)
+    page, next_cursor = pagination.paginate_list(graph.friends, cursor, limit)
+    pending_in = graph.incoming if cursor is None else []
+    pending_out = graph.outgoing if cursor is None else []
+
+    # One username lookup for everyone on this page
+    names = dict(
+        User.objects.filter(
+            id__in={e.user_id for e in (*page, *pending_in, *pending_out)}
+        ).values_list("id", "username")
     )
 
-    def other_side(f):
-        return f.to_user if f.from_user == request.user else f.from_user
-
     friends = [
         {
-            "username": other_side(f).username,
-            "friendship_id": f.id,   # <<< CRUCIAL FIX
+            "username": names[e.user_id],
+            "friendship_id": e.pk,   # <<< CRUCIAL FIX
         }
-        for f in accepted
+        for e in page if e.user_id in names
     ]
-
     incoming = [
-        { "id": fr.id, "from_user": fr.from_user.username }
-        for fr in Friendship.objects.filter(to_user=request.user, status="pending")
+        { "id": e.pk, "from_user": names[e.user_id] }
+        for e in pending_in if e.user_id in names
     ]
-
     outgoing = [
-        { "id": fr.id, "to_user": fr.to_user.username }
-        for fr in Friendship.objects.filter(from_user=request.user, status="pending")
+        { "id": e.pk, "to_user": names[e.user_id] }
+        for e in pending_out if e.user_id in names
     ]
 
     return JsonResponse({
         "friends": friends,
         "incoming_requests": incoming,
         "outgoing_requests": outgoing,
-        "friend_count": len(friends),
+        "friend_count": len(graph.friends),
+        "next": next_cursor,
     })
 
 
@@ -324,32 +312,102 @@ def friend_remove(request, friendship_id):
 @login_required
 def user_pins(request, username):
     target = get_object_or_404(User, username=username)
+    return response_cache.cached_json(
+        request, "user_pins", target.id,
+        lambda: _pins_page(request, user=target, latitude__isnull=False),
+    )
 
-    pins = Pin.objects.filter(user=target).select_related("user").prefetch_related("photos")
 
-    payload = []
-    for pin in pins:
-        cover = request.build_absolute_uri(pin.image.url) if pin.image else None
-        extra = [
-            request.build_absolute_uri(photo.image.url)
-            for photo in pin.photos.all()
-        ]
+# =====================================================================
+# PIN CLUSTERS (GLOBE LEVEL-OF-DETAIL)
+# =====================================================================
 
-        payload.append({
-            "id": pin.id,
-            "lat": pin.latitude,
-            "lon": pin.longitude,
-            "caption": pin.caption or "",
-            "imageUrl": cover,
-            "photos": extra,
-            "user": target.username,
-            "city": pin.city,
-            "state": pin.state,
-            "country": pin.country,
-            "isOwner": (request.user == target),
-        })
+def _scope_user_ids(request):
+    """Whose pins a cluster/tile request covers: ?scope=mine|friends or ?username=."""
+    username = request.GET.get("username")
+    if username:
+        return [get_object_or_404(User, username=username).id]
+    if request.GET.get("scope") == "friends":
+        return friend_graph.friend_ids(request.user.id)
+    return [request.user.id]
 
-    return JsonResponse({"pins": payload})
+
+def _parse_bbox(raw):
+    """
+    "minLon,minLat,maxLon,maxLat" -> (min_lat, max_lat, min_lon, max_lon).
+    minLon > maxLon means the box crosses the antimeridian.
+    """
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in raw.split(","))
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bad latitude range")
+    if max_lon < min_lon:
+        max_lon += 360
+    return min_lat, max_lat, min_lon, max_lon
+
+
+@login_required
+def pin_clusters(request):
+    """
+    ?level=1..6   geohash precision of the cells to return
+    ?bbox=...     optional visible area, minLon,minLat,maxLon,maxLat
+    ?scope=mine|friends, or ?username=<friend> for one user's pins
+    """
+    try:
+        level = int(request.GET.get("level", 1))
+        bbox = _parse_bbox(request.GET["bbox"]) if request.GET.get("bbox") else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid 'level' or 'bbox'"}, status=400)
+
+    user_ids = _scope_user_ids(request)
+
+    return JsonResponse({
+        "level": max(1, min(level, clusters.MAX_LEVEL)),
+        "maxLevel": clusters.MAX_LEVEL,
+        "clusters": clusters.clusters_for(user_ids, level, bbox),
+    })
+
+
+# =====================================================================
+# PIN TILES
+# =====================================================================
+
+def _tile_etag(request, z, x, y):
+    if not request.user.is_authenticated or not tiles.is_valid(z, x, y):
+        return None
+    request.tile_user_ids = _scope_user_ids(request)
+    return tiles.etag(request.user.id, request.tile_user_ids, z, x, y)
+
+
+@login_required
+@condition(etag_func=_tile_etag)
+def pin_tile(request, z, x, y):
+    """
+    Pins inside one tile (see home/tiles.py for the addressing). Same
+    ?scope= / ?username= options as pin_clusters. Responses carry a strong
+    ETag, so a client revalidating an unchanged tile gets a 304 without any
+    pin rows being read.
+    """
+    if not tiles.is_valid(z, x, y):
+        return JsonResponse({"error": "Invalid tile"}, status=404)
+
+    min_lat, max_lat, min_lon, max_lon = tiles.tile_bounds(z, x, y)
+    # Half-open like tile_for(), except the first row (lat 90) and the last
+    # column (lon 180), which have no neighbour to own their edge
+    lat_max = {"latitude__lte" if y == 0 else "latitude__lt": max_lat}
+    lon_max = {"longitude__lte" if x == 2 ** z - 1 else "longitude__lt": max_lon}
+    rows = serialization.project(
+        Pin.objects.filter(
+            spatial.cell_filter(spatial.bbox_cells(min_lat, max_lat, min_lon, max_lon)),
+            user_id__in=request.tile_user_ids,
+            latitude__gte=min_lat, longitude__gte=min_lon, **lat_max, **lon_max,
+        )
+    )
+    data = serialization.pins_payload(request, rows)
+
+    response = serialization.json_response({"tile": [z, x, y], "pins": data})
+    # Per-user data: browsers may keep it but must revalidate (cheap 304s)
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # =====================================================================
@@ -359,35 +417,26 @@ def user_pins(request, username):
 @login_required
 def get_pin(request, pin_id):
     pin = get_object_or_404(
-        Pin.objects.select_related("user").prefetch_related("photos"),
+        reactions.with_reactions(
+            Pin.objects.select_related("user").prefetch_related("photos"), request.user
+        ),
         id=pin_id
     )
 
-    cover_url = request.build_absolute_uri(pin.image.url) if pin.image else None
+    urls = serialization.MediaUrls(request)
+    cover_url = urls.url(pin.image.name)
     extra_photos = [
         {
             "id": photo.id,
-            "url": request.build_absolute_uri(photo.image.url),
+            "url": urls.url(photo.image.name),
+            "srcset": urls.srcsets(photo.image_variants),
         }
         for photo in pin.photos.all()
     ]
 
-    # --- Reaction aggregation ---
-    reaction_rows = (
-        Reaction.objects
-        .filter(pin=pin)
-        .values("emoji")
-        .annotate(c=Count("id"))
-    )
-
-    reaction_counts = {row["emoji"]: row["c"] for row in reaction_rows}
-
-    # Optional: ensure all emojis exist in the dict
-    for k in ["like", "love", "laugh", "wow"]:
-        reaction_counts.setdefault(k, 0)
-
-    user_reaction_obj = Reaction.objects.filter(pin=pin, user=request.user).first()
-    user_reaction = user_reaction_obj.emoji if user_reaction_obj else None
+    # --- Reactions (denormalized counters, loaded with the pin) ---
+    reaction_counts = reactions.counts_for(pin)
+    user_reaction = pin.my_reaction
 
     return JsonResponse({
         "id": pin.id,
@@ -395,6 +444,7 @@ def get_pin(request, pin_id):
         "lon": pin.longitude,
         "caption": pin.caption or "",
         "imageUrl": cover_url,
+        "imageSrcset": urls.srcsets(pin.image_variants) if cover_url else None,
         "photos": extra_photos,
         "user": pin.user.username,
         "city": pin.city,
@@ -410,102 +460,87 @@ logger = logging.getLogger(__name__)
 
 @login_required
 def add_pin(request):
-    # =============================================
-    # DEBUG SECTION – LOG REQUEST DETAILS
-    # =============================================
-    print("\n===== ADD PIN DEBUG =====")
-    print("Request method:", request.method)
-    print("Headers:", dict(request.headers))
-    print("GET params:", request.GET)
-    print("POST params:", request.POST.dict())
-    print("FILES:", request.FILES)
-    print("=========================\n")
+    # Timings/outcome go to Server-Timing and the sampled request log
+    # (home/instrumentation.py)
 
     # If NOT POST → reject
     if request.method != "POST":
-        print("❌ DEBUG: Request was NOT POST — returning error")
         return JsonResponse({"error": "POST required"}, status=405)
 
-    print("✅ DEBUG: Request IS POST, continuing")
-
     # =============================================
     # FORM VALIDATION
     # =============================================
     form = PinForm(request.POST, request.FILES)
-    print("Form valid?", form.is_valid())
-    print("Form errors:", form.errors)
 
     if not form.is_valid():
-        print("❌ DEBUG: Form validation failed — returning 400")
+        instrumentation.annotate(request, outcome="invalid_form", form_errors=list(form.errors))
         return JsonResponse({"errors": form.errors}, status=400)
 
-    print("✅ DEBUG: Form is valid — saving base pin (commit=False)")
     temp_pin = form.save(commit=False)
 
     # =============================================
     # GEOCODING
     # =============================================
-    geo = geocode_location(temp_pin.city, temp_pin.state, temp_pin.country)
-    print("Geo result:", geo)
-
-    if not geo:
-        print("❌ DEBUG: Geocode failed — returning 400")
+    # Deferred mode only geocodes inline when the local gazetteer knows the
+    # place; anything else is saved as pending for the geocode worker.
+    deferred = getattr(settings, "GEOCODE_DEFERRED", False)
+    with instrumentation.span(request, "geocode"):
+        if deferred:
+            geo = geocoding.geocode_local(temp_pin.city, temp_pin.state, temp_pin.country)
+        else:
+            geo = geocode_location(temp_pin.city, temp_pin.state, temp_pin.country)
+
+    if not geo and not deferred:
+        instrumentation.annotate(request, outcome="geocode_failed")
         return JsonResponse(
             {"errors": {"location": ["Location not found"]}},
             status=400,
         )
 
-    lat, lon = geo
-    temp_pin.latitude = lat
-    temp_pin.longitude = lon
+    if geo:
+        temp_pin.latitude, temp_pin.longitude = geo
     temp_pin.user = request.user
 
-    temp_pin.save()
-    print(f"✅ DEBUG: Pin saved successfully — ID: {temp_pin.id}")
+    with instrumentation.span(request, "save"):
+        temp_pin.save()
+        if not geo:
+            geocode_queue.enqueue(temp_pin)
 
     # =============================================
     # MULTIPLE PHOTO HANDLING
     # =============================================
     extra_files = request.FILES.getlist("photos")
-    print("Extra uploaded photo files:", extra_files)
 
-    from home.models import PinPhoto
+    # WebP/JPEG variants are rendered in the thumbnail process pool first
+    with instrumentation.span(request, "thumbnails"):
+        variants = thumbnails.build_many(extra_files)
 
-    for f in extra_files:
-        PinPhoto.objects.create(pin=temp_pin, image=f)
-        print(f"📸 DEBUG: Saved extra photo: {f}")
-
-    print("===== END ADD PIN DEBUG =====\n")
+    with instrumentation.span(request, "photos"):
+        photos = [
+            PinPhoto.objects.create(pin=temp_pin, image=f, image_variants=v)
+            for f, v in zip(extra_files, variants)
+        ]
 
-    # Ensuring that after add_pin is executed we receive the image on the front end
-    cover = request.build_absolute_uri(temp_pin.image.url) if temp_pin.image else None
-    extra = [request.build_absolute_uri(p.image.url) for p in temp_pin.photos.all()]
+    instrumentation.annotate(
+        request, outcome="saved", pin_id=temp_pin.id, photos=len(extra_files),
+        geocode_status=temp_pin.geocode_status,
+    )
 
     # =============================================
     # SUCCESS RESPONSE
     # =============================================
-    return JsonResponse({
-        "success": True,
-        "id": temp_pin.id,
-        "city": temp_pin.city,
-        "state": temp_pin.state,
-        "country": temp_pin.country,
-        "caption": temp_pin.caption or "",
-        "lat": temp_pin.latitude,
-        "lon": temp_pin.longitude,
-
-        # ✅ ADD THESE so the frontend can render immediately
-        "user": request.user.username,
-        "imageUrl": cover,
-        "photos": extra,          # list of strings is fine
-        "photoCount": (1 if cover else 0) + len(extra),
-        "isOwner": True,
-    })
+    # Same payload as the pin lists, so the frontend can render immediately
+    rows = serialization.attach_photos([serialization.row_from_instance(temp_pin)], photos)
+    payload = serialization.pin_payload(rows[0], serialization.MediaUrls(request), request.user.id)
+    return serialization.json_response(
+        {"success": True, **payload},
+        status=202 if temp_pin.geocode_status == "pending" else 200,
+    )
 
 
 @login_required
 def edit_pin(request, pin_id):
-    pin = get_object_or_404(Pin, id=pin_id, user=request.user)
+    pin = get_object_or_404(Pin.objects.select_related("user"), id=pin_id, user=request.user)
 
     if request.method != "POST":
         return JsonResponse({"error": "POST required"}, status=405)
@@ -518,14 +553,30 @@ def edit_pin(request, pin_id):
 
     updated = form.save(commit=False)
 
-    if (updated.city != old_city or updated.state != old_state or updated.country != old_country):
-        geo = geocode_location(updated.city, updated.state, updated.country)
-        if not geo:
-            return JsonResponse({"errors": {"location": ["Invalid location"]}}, status=400)
-        updated.latitude, updated.longitude = geo
+    location_changed = (
+        updated.city != old_city or updated.state != old_state or updated.country != old_country
+    )
+    deferred = location_changed and getattr(settings, "GEOCODE_DEFERRED", False)
+
+    if location_changed:
+        if deferred:
+            geo = geocoding.geocode_local(updated.city, updated.state, updated.country)
+        else:
+            geo = geocode_location(updated.city, updated.state, updated.country)
+            if not geo:
+                return JsonResponse({"errors": {"location": ["Invalid location"]}}, status=400)
+        if geo:
+            # Resolved inline, so drop any job left over from an earlier edit
+            updated.latitude, updated.longitude = geo
+            updated.geocode_status = "resolved"
+            GeocodeJob.objects.filter(pin=updated).delete()
 
     updated.save()
 
+    # Keeps the old coordinates on the globe until the worker moves the pin
+    if location_changed and not geo:
+        geocode_queue.enqueue(updated)
+
     to_delete = request.POST.get("photos_to_delete", "").strip()
     if to_delete:
         ids = [int(x) for x in to_delete.split(",") if x.strip().isdigit()]
@@ -535,27 +586,73 @@ def edit_pin(request, pin_id):
     current_count = (1 if updated.image else 0) + updated.photos.count()
     remaining = MAX_PIN_PHOTOS - current_count
 
-    for f in extra_files[:remaining]:
-        PinPhoto.objects.create(pin=updated, image=f)
+    new_files = extra_files[:max(remaining, 0)]
+    for f, v in zip(new_files, thumbnails.build_many(new_files)):
+        PinPhoto.objects.create(pin=updated, image=f, image_variants=v)
 
-    cover = request.build_absolute_uri(updated.image.url) if updated.image else None
-    extra = [request.build_absolute_uri(p.image.url) for p in updated.photos.all()]
+    rows = serialization.attach_photos(
+        [serialization.row_from_instance(updated)], updated.photos.order_by("id")
+    )
+    payload = serialization.pin_payload(rows[0], serialization.MediaUrls(request), request.user.id)
+    return serialization.json_response(
+        {"updated": True, **payload},
+        status=202 if updated.geocode_status == "pending" else 200,
+    )
 
+
+@login_required
+def pin_geocode_status(request, pin_id):
+    """Polled by the client after add_pin / edit_pin answered 202."""
+    pin = get_object_or_404(
+        Pin.objects.only("id", "latitude", "longitude", "geocode_status"),
+        id=pin_id,
+        user=request.user,
+    )
     return JsonResponse({
-        "id": updated.id,
-        "lat": updated.latitude,
-        "lon": updated.longitude,
-        "caption": updated.caption or "",
-        "imageUrl": cover,
-        "photos": extra,
-        "city": updated.city,
-        "state": updated.state,
-        "country": updated.country,
-        "updated": True,
-        "isOwner": True,
+        "id": pin.id,
+        "geocodeStatus": pin.geocode_status,
+        "lat": pin.latitude,
+        "lon": pin.longitude,
     })
 
 
+# =====================================================================
+# BULK IMPORT / EXPORT (see home/pin_import.py, home/export.py)
+# =====================================================================
+
+@login_required
+@require_http_methods(["POST"])
+def import_pins(request):
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"error": "Missing 'file'"}, status=400)
+
+    fmt = request.POST.get("format") or pin_import.guess_format(upload.name)
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        summary = pin_import.import_pins(
+            request.user, text, fmt,
+            max_rows=getattr(settings, "PIN_IMPORT_MAX_ROWS", 5_000), defer=True,
+        )
+    except (pin_import.ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    finally:
+        text.detach()
+
+    instrumentation.annotate(request, outcome="imported", pins_created=summary["created"])
+    return JsonResponse(summary)
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_pins(request, fmt):
+    """All of the user's pins as a stream; see home/export.py."""
+    try:
+        return export.response(request, request.user, fmt, since=request.GET.get("since") or None)
+    except export.InvalidSince as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
 # =====================================================================
 # GALLERY
 # =====================================================================
@@ -567,36 +664,67 @@ def gallery_view(request):
 
 @login_required
 def my_photos(request):
-    pins = Pin.objects.filter(user=request.user).prefetch_related("photos")
+    """
+    Cover images and extra photos, newest first, one page at a time. The two
+    sources share one cursor: covers rank before photos taken at the same
+    instant (see pagination.after).
+    """
+    try:
+        cursor, limit = pagination.page_params(request, default=60)
+    except pagination.InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    covers = (
+        Pin.objects.filter(user=request.user, image__isnull=False)
+        .exclude(image="")
+        .order_by("-created_at", "-pk")
+    )
+    photos = (
+        PinPhoto.objects.filter(pin__user=request.user)
+        .select_related("pin")
+        .order_by("-created_at", "-pk")
+    )
+    if cursor is not None:
+        covers = covers.filter(pagination.after(cursor, rank=0))
+        photos = photos.filter(pagination.after(cursor, rank=1))
+
+    # (created_at, rank, id, payload) from both sources, merged newest first
+    urls = serialization.MediaUrls(request)
+    entries = []
+    for pin in covers[: limit + 1]:
+        entries.append((pin.created_at, 0, pin.id, {
+            "id": f"cover-{pin.id}",
+            "pin_id": pin.id,
+            "imageUrl": urls.url(pin.image.name),
+            "srcset": urls.srcsets(pin.image_variants),
+            "caption": pin.caption or "",
+            "city": pin.city,
+            "country": pin.country,
+            "createdAt": pin.created_at,
+        }))
 
-    payload = []
+    for photo in photos[: limit + 1]:
+        pin = photo.pin
+        entries.append((photo.created_at, 1, photo.id, {
+            "id": photo.id,
+            "pin_id": pin.id,
+            "imageUrl": urls.url(photo.image.name),
+            "srcset": urls.srcsets(photo.image_variants),
+            "caption": pin.caption or "",
+            "city": pin.city,
+            "country": pin.country,
+            "createdAt": photo.created_at,
+        }))
 
-    for pin in pins:
-        if pin.image:
-            payload.append({
-                "id": f"cover-{pin.id}",
-                "pin_id": pin.id,
-                "imageUrl": request.build_absolute_uri(pin.image.url),
-                "caption": pin.caption or "",
-                "city": pin.city,
-                "country": pin.country,
-                "createdAt": pin.created_at,
-            })
-
-        for photo in pin.photos.all():
-            payload.append({
-                "id": photo.id,
-                "pin_id": pin.id,
-                "imageUrl": request.build_absolute_uri(photo.image.url),
-                "caption": pin.caption or "",
-                "city": pin.city,
-                "country": pin.country,
-                "createdAt": photo.created_at,
-            })
-
-    payload.sort(key=lambda p: p["createdAt"], reverse=True)
-
-    return JsonResponse({"photos": payload})
+    entries.sort(key=lambda e: (e[0], -e[1], e[2]), reverse=True)
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        created_at, rank, pk, _ = entries[-1]
+        next_cursor = pagination.encode_cursor(created_at, pk, rank)
+
+    return JsonResponse({"photos": [e[3] for e in entries], "next": next_cursor})
 
 # =====================================================================
 # ADMIN POPULARITY DASHBOARD
@@ -608,49 +736,31 @@ def is_staff(user):
 
 @user_passes_test(is_staff)
 def popularity_dashboard(request):
-    # 1) Top countries by pin count
-    country_qs = (
-        Pin.objects
-        .values("country")
-        .annotate(pin_count=Count("id"))
-        .order_by("-pin_count")
-    )
+    # Reads the CountryStats rollup (home/country_stats.py), not Pin / Reaction
+    total_pins, top_countries, by_reactions = country_stats.dashboard(top=10)
+    total_pins = total_pins or 1  # avoid div by zero
 
-    total_pins = sum(row["pin_count"] for row in country_qs) or 1  # avoid div by zero
-
-    country_stats = []
-    for row in country_qs[:10]:  # Top 10
-        country = row["country"] or "Unknown"
-        pin_count = row["pin_count"]
-        percent = round(100 * pin_count / total_pins * 100) / 100  # round to 2 decimals
-        country_stats.append({
-            "country": country,
-            "pin_count": pin_count,
-            "percent": percent,
+    # 1) Top countries by pin count
+    country_stats_rows = []
+    for row in top_countries:
+        country_stats_rows.append({
+            "country": row.country or "Unknown",
+            "pin_count": row.pin_count,
+            "percent": round(100 * row.pin_count / total_pins * 100) / 100,  # round to 2 decimals
         })
 
     # 2) OPTIONAL: reactions per country
-    reaction_qs = (
-        Reaction.objects
-        .values("pin__country")
-        .annotate(reaction_count=Count("id"))
-        .order_by("-reaction_count")
-    )
-
-    reaction_stats = []
-    for row in reaction_qs:
-        country = row["pin__country"] or "Unknown"
-        reaction_stats.append({
-            "country": country,
-            "reaction_count": row["reaction_count"],
-        })
+    reaction_stats = [
+        {"country": row.country or "Unknown", "reaction_count": row.reaction_count}
+        for row in by_reactions
+    ]
 
     # Data for Chart.js
-    chart_labels = [row["country"] for row in country_stats]
-    chart_data = [row["pin_count"] for row in country_stats]
+    chart_labels = [row["country"] for row in country_stats_rows]
+    chart_data = [row["pin_count"] for row in country_stats_rows]
 
     context = {
-        "country_stats": country_stats,
+        "country_stats": country_stats_rows,
         "reaction_stats": reaction_stats,
         "total_pins": total_pins,
         "chart_labels": json.dumps(chart_labels),
@@ -659,6 +769,12 @@ def popularity_dashboard(request):
     return render(request, "admin/popularity_dashboard.html", context)
 
 
+@user_passes_test(is_staff)
+def geocode_stats(request):
+    """Hit/miss counters for this worker's geocode cache, plus its HTTP client."""
+    return JsonResponse({**geocoding.stats.snapshot(), "http": geocoder_client.get_client().metrics()})
+
+
 @login_required
 @csrf_exempt
 def edit_profile(request):
@@ -692,33 +808,22 @@ def edit_profile(request):
 @login_required
 @require_http_methods(["GET", "POST"])
 def react_to_pin(request, pin_id):
-    pin = get_object_or_404(Pin, id=pin_id)
-
-    valid = {"like", "love", "laugh", "wow"}
+    valid = set(reactions.EMOJIS)
 
     # ----------------------------
-    # GET = return current counts + this user's reaction
+    # GET = return current counts + this user's reaction (one query)
     # ----------------------------
     if request.method == "GET":
-        reaction_rows = (
-            Reaction.objects
-            .filter(pin=pin)
-            .values("emoji")
-            .annotate(c=Count("id"))
-        )
-        reaction_counts = {row["emoji"]: row["c"] for row in reaction_rows}
-        for k in valid:
-            reaction_counts.setdefault(k, 0)
-
-        user_obj = Reaction.objects.filter(pin=pin, user=request.user).first()
-        user_reaction = user_obj.emoji if user_obj else None
+        pin = get_object_or_404(reactions.with_reactions(Pin.objects.all(), request.user), id=pin_id)
 
         return JsonResponse({
             "pin_id": pin.id,
-            "reaction_counts": reaction_counts,
-            "user_reaction": user_reaction,
+            "reaction_counts": reactions.counts_for(pin),
+            "user_reaction": pin.my_reaction,
         })
 
+    pin = get_object_or_404(Pin, id=pin_id)
+
     # ----------------------------
     # POST = set/update user's reaction
     # Supports FormData OR JSON body
@@ -735,23 +840,9 @@ def react_to_pin(request, pin_id):
     if emoji not in valid:
         return JsonResponse({"error": "Invalid emoji"}, status=400)
 
-    # Update or create the user's reaction for this pin
-    Reaction.objects.update_or_create(
-        pin=pin,
-        user=request.user,
-        defaults={"emoji": emoji}
-    )
-
-    # Recompute counts after update
-    reaction_rows = (
-        Reaction.objects
-        .filter(pin=pin)
-        .values("emoji")
-        .annotate(c=Count("id"))
-    )
-    reaction_counts = {row["emoji"]: row["c"] for row in reaction_rows}
-    for k in valid:
-        reaction_counts.setdefault(k, 0)
+    # Update or create the user's reaction for this pin (counters included)
+    reactions.set_reaction(pin, request.user, emoji)
+    reaction_counts = reactions.stats_counts(pin.id)
 
     return JsonResponse({
         "ok": True,
@@ -761,6 +852,40 @@ def react_to_pin(request, pin_id):
     })
 
 
+REACTIONS_BATCH_MAX = 500
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def reactions_batch(request):
+    """
+    Counts + the caller's reaction for many pins at once:
+      GET  /api/reactions/batch/?ids=1,2,3
+      POST /api/reactions/batch/  {"ids": [1, 2, 3]}
+    Unknown ids are left out of the response.
+    """
+    if request.method == "GET":
+        raw = [part for part in request.GET.get("ids", "").split(",") if part.strip()]
+    else:
+        try:
+            raw = json.loads(request.body.decode("utf-8")).get("ids") or []
+        except (ValueError, AttributeError):
+            return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    try:
+        pin_ids = {int(part) for part in raw}
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "ids must be integers"}, status=400)
+
+    if len(pin_ids) > REACTIONS_BATCH_MAX:
+        return JsonResponse(
+            {"error": f"At most {REACTIONS_BATCH_MAX} ids per request"}, status=400
+        )
+
+    results = reactions.batch(pin_ids, request.user) if pin_ids else {}
+    return JsonResponse({"reactions": {str(pin_id): r for pin_id, r in results.items()}})
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def profile_api(request):
@@ -842,43 +967,12 @@ def edit_profile(request):
 
 @login_required
 def friends_pins(request):
-    # 1) get accepted friendships involving me
-    accepted = Friendship.objects.filter(
-        Q(from_user=request.user) | Q(to_user=request.user),
-        status="accepted"
-    ).select_related("from_user", "to_user")
-
-    # 2) collect friend user objects
-    friend_users = []
-    for f in accepted:
-        other = f.to_user if f.from_user == request.user else f.from_user
-        friend_users.append(other)
-
-    # 3) fetch all pins from those friends
-    pins_qs = (
-        Pin.objects.filter(user__in=friend_users)
-        .select_related("user")
-        .prefetch_related("photos")
-    )
-
-    data = []
-    for pin in pins_qs:
-        cover = request.build_absolute_uri(pin.image.url) if pin.image else None
-        extra = [request.build_absolute_uri(p.image.url) for p in pin.photos.all()]
-
-        data.append({
-            "id": pin.id,
-            "lat": pin.latitude,
-            "lon": pin.longitude,
-            "caption": pin.caption or "",
-            "imageUrl": cover,
-            "photos": extra,
-            "photoCount": (1 if cover else 0) + len(extra),
-            "user": pin.user.username,
-            "city": pin.city,
-            "state": pin.state,
-            "country": pin.country,
-            "isOwner": False,
-        })
-
-    return JsonResponse({"pins": data})
\ No newline at end of file
+    try:
+        cursor, limit = pagination.page_params(request)
+    except pagination.InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    # Read- or write-time fan-out, per FRIENDS_FEED_STRATEGY (see home/feed.py)
+    rows, next_cursor = feed.page(request.user, cursor, limit)
+    data = serialization.pins_payload(request, rows)
+    return serialization.json_response({"pins": data, "next": next_cursor})
\ No newline at end of file